@@ -0,0 +1,41 @@
+#  BigIntegerTelegramBenchmark.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  Measures the cost of a debugger step with big values: parsing the
+#  telegram, computing the stacktrace diff and encoding the update for
+#  the client. The cost per digit shall stay flat, i.e. it shall be linear
+#  in the number of digits. For comparison, the telegrams are also parsed
+#  by json.loads() with conversion of all values to int.
+
+import sys, json
+import bench_common
+from Debugger import Debugger
+from StackDiff import diff_stacktraces
+
+def _telegram(digits, line):
+    value = "7" * (digits - 1) + str(line % 10)
+    return ('2 ' + str(line) + ' -1 [{"file":"/somefolder/test123.lw","line":' + str(line)
+            + ',"macro":"root","bindings":[{"VarType":"input","Ident":"n","Val":19},'
+            + '{"VarType":"output","Ident":"x","Val":' + value + '},'
+            + '{"VarType":"auxiliary","Ident":"y","Val":' + value + '}]}]# Stepped.')
+
+def _step(old_telegram, new_telegram):
+    old = Debugger.parse_debugger_output(old_telegram).data
+    new = Debugger.parse_debugger_output(new_telegram).data
+    return json.dumps(diff_stacktraces(old, new))
+
+if __name__ == '__main__':
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0)
+    for digits in [1000, 10000, 100000]:
+        old_telegram, new_telegram = _telegram(digits, 6), _telegram(digits, 7)
+        number = max(1, 1000000 // digits)
+        t = bench_common.report("step, " + str(digits) + " digits",
+                                lambda: _step(old_telegram, new_telegram), number)
+        print("{:<50} {:>12.4f} ns/digit".format("", t / digits * 1e9))
+        json_str = new_telegram[new_telegram.index("["):new_telegram.index("#")]
+        t = bench_common.report("json.loads() with int, " + str(digits) + " digits",
+                                lambda: json.loads(json_str), max(1, number // 10), repeat=3)
+        print("{:<50} {:>12.4f} ns/digit".format("", t / digits * 1e9))
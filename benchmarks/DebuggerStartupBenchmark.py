@@ -0,0 +1,52 @@
+#  DebuggerStartupBenchmark.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  Measures the time to start a debugger session (spawn lwre and connect
+#  to it) and to close it again.
+#  Programs with syntax errors are measured separately, since lwre
+#  terminates immediately instead of connecting. They are compared to
+#  rejecting the program with LoopWhileParser, as /start_debug_session does.
+
+import bench_common
+import os, time
+
+from SessionManager import SessionManager
+from Debugger import Debugger
+from LoopWhileParser import check_program
+
+ITERATIONS = 20
+
+_next_session = 0
+def _next_session_id():
+    global _next_session
+    _next_session += 1
+    return "benchrun_" + str(_next_session)
+
+def bench_startup(sess_man, code, expect_failure=False):
+    start_times = []
+    for i in range(ITERATIONS):
+        start = time.perf_counter()
+        d = Debugger(code, _next_session_id(), sess_man)
+        start_times.append(time.perf_counter() - start)
+        if d.is_failed() != expect_failure:
+            raise RuntimeError("unexpected debugger state: " + d.poll_user_output())
+        d.close()
+    return start_times
+
+if __name__ == '__main__':
+    os.makedirs("user_src", exist_ok=True)
+    sess_man = SessionManager("user_src", 20, 20)
+    with open("test_programs/simple.lw", "r") as input_file:
+        code = input_file.read()
+    bad_code = "in: x;\nout: y;\ny := x +;\n"
+    try:
+        for name, program, expect_failure in [("", code, False), (", syntax error", bad_code, True)]:
+            times = sorted(bench_startup(sess_man, program, expect_failure))
+            print("{:<50} {:>9.2f} ms median, {:>9.2f} ms max".format(
+                  "debugger startup" + name, times[len(times)//2] * 1e3, times[-1] * 1e3))
+        bench_common.report("syntax error, rejected by LoopWhileParser",
+                            lambda: check_program(bad_code), 1000)
+    finally:
+        sess_man.shutdown()
@@ -0,0 +1,20 @@
+#  DebuggerTelegramBenchmark.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  Compares the regex-based fast path of Debugger.parse_debugger_output()
+#  with the generic lexer-based parser.
+
+import bench_common
+from Debugger import Debugger
+
+_stepped = """2 6 -1 [{"file":"/somefolder/test123.lw","line":6,"macro":"multiply","bindings":[{"VarType":"input","Ident":"x","Val":5},{"VarType":"input","Ident":"y","Val":2},{"VarType":"output","Ident":"z","Val":2}]},{"file":"/somefolder/test123.lw","line":13,"macro":"root","bindings":[{"VarType":"input","Ident":"i0","Val":5},{"VarType":"output","Ident":"o0","Val":0}]}]# Stepped."""
+_breakpoint_set = """1 7 1# Breakpoint 1 set."""
+
+if __name__ == '__main__':
+    for name, telegram in [("STEPPED", _stepped), ("BREAKPOINT_SET", _breakpoint_set)]:
+        bench_common.report("lexer parser, " + name,
+                            lambda: Debugger._parse_debugger_output_lexer(telegram), 10000)
+        bench_common.report("fast path parser, " + name,
+                            lambda: Debugger.parse_debugger_output(telegram), 10000)
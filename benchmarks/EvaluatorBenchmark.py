@@ -0,0 +1,56 @@
+#  EvaluatorBenchmark.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  Measures running a short program without input variables with lwre
+#  (write the source file, spawn lwre and read its output), compared to
+#  evaluating it in process with Evaluator, directly and in the worker
+#  pool used by /run. The program is run with 10 and with 100 iterations
+#  of the while loop (a few hundred and about 15000 evaluator steps).
+
+import bench_common
+import os, subprocess
+
+import Session
+import Evaluator
+
+SOURCE_TEMPLATE = """def multiply
+  in: x, y;
+  out: z;
+  loop x do
+    z := z + y;
+  enddo
+enddef;
+
+out: o0;
+aux: i;
+i := {};
+while i != 0 do
+  o0 := multiply(i, o0);
+  o0 := o0 mod 1000003;
+  i := i - 1;
+enddo;
+"""
+
+def run_lwre(path, source):
+    with open(path, "w") as program_file:
+        program_file.write(source)
+    return subprocess.run([Session._executable_path, path], stdout=subprocess.PIPE).stdout.decode()
+
+if __name__ == '__main__':
+    os.makedirs("user_src", exist_ok=True)
+    path = "user_src/benchrun_evaluator.lw"
+    Evaluator.set_workers(1)
+    try:
+        for iterations in [10, 100]:
+            source = SOURCE_TEMPLATE.format(iterations)
+            if Evaluator.run(source) != run_lwre(path, source):
+                raise RuntimeError("unexpected output: " + str(Evaluator.run(source)))
+            name = ", " + str(iterations) + " iterations"
+            bench_common.report("lwre process" + name, lambda: run_lwre(path, source), 20)
+            bench_common.report("Evaluator.evaluate()" + name, lambda: Evaluator.evaluate(source), 20)
+            bench_common.report("Evaluator.run(), 1 worker" + name, lambda: Evaluator.run(source), 20)
+    finally:
+        Evaluator.shutdown()
+        os.remove(path)
@@ -0,0 +1,92 @@
+#  LexerBenchmark.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  Measures the lexer on Loop/While programs with 10k lines, compared to
+#  the previous implementation, that compiled its rules in each constructor
+#  and matched one token per call of token().
+
+import bench_common
+import re
+
+from external_libs.lexer import Lexer, Token
+from SourceCodeView import Tokenizer, _lexer_rules
+import Debugger
+
+LINES = 10000
+PROGRAM_FILE = "test_programs/structure.lw"
+
+
+# the implementation of Lexer before the rules were cached
+class _OldLexer:
+    def __init__(self, rules, skip_whitespace=True):
+        regex_parts = []
+        self.group_type = {}
+        for idx, (regex, type) in enumerate(rules, 1):
+            groupname = 'GROUP%s' % idx
+            regex_parts.append('(?P<%s>%s)' % (groupname, regex))
+            self.group_type[groupname] = type
+        self.regex = re.compile('|'.join(regex_parts))
+        self.skip_whitespace = skip_whitespace
+        self.re_ws_skip = re.compile('\S')
+
+    def input(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def token(self):
+        if self.pos >= len(self.buf):
+            return None
+        if self.skip_whitespace:
+            m = self.re_ws_skip.search(self.buf, self.pos)
+            if m:
+                self.pos = m.start()
+            else:
+                return None
+        m = self.regex.match(self.buf, self.pos)
+        if m:
+            groupname = m.lastgroup
+            tok = Token(self.group_type[groupname], m.group(groupname), self.pos)
+            self.pos = m.end()
+            return tok
+        raise Exception(self.pos)
+
+    def tokens(self):
+        while 1:
+            tok = self.token()
+            if tok is None: break
+            yield tok
+
+def tokenize(lexer_class, source, tuples=False):
+    lexer = lexer_class(_lexer_rules, False)
+    lexer.input(source)
+    for token in (lexer.tuples() if tuples else lexer.tokens()):
+        pass
+
+# reads type, line number, breakpoint number and message of a telegram
+# as Debugger._parse_debugger_output_lexer() does
+def parse_telegram(lexer_class, telegram):
+    lexer = lexer_class(Debugger._lexer_rules, True)
+    lexer.input(telegram)
+    for i in range(4):
+        lexer.token()
+
+if __name__ == '__main__':
+    with open(PROGRAM_FILE) as f:
+        lines = f.read().splitlines()
+    source = "\n".join(lines[i % len(lines)] for i in range(LINES))
+    bench_common.report("old lexer, 10k lines",
+                        lambda: tokenize(_OldLexer, source), 1)
+    bench_common.report("lexer, 10k lines",
+                        lambda: tokenize(Lexer, source), 1)
+    bench_common.report("lexer, 10k lines as tuples",
+                        lambda: tokenize(Lexer, source, tuples=True), 1)
+    bench_common.report("SourceCodeView.Tokenizer, 10k lines",
+                        lambda: list(Tokenizer(source)), 1)
+
+    telegram = "1 7 1# Breakpoint 1 set."
+    bench_common.report("old lexer, telegram",
+                        lambda: parse_telegram(_OldLexer, telegram), 1000)
+    bench_common.report("lexer, telegram",
+                        lambda: parse_telegram(Lexer, telegram), 1000)
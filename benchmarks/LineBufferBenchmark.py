@@ -0,0 +1,83 @@
+#  LineBufferBenchmark.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  Measures IOTools.LineBuffer for telegrams of 1 MB, that arrive in many
+#  chunks, compared to the previous str-based implementation.
+
+import bench_common
+import socket
+
+from IOTools import LineBuffer, ConnectionClosed
+
+TELEGRAM_SIZE = 1024*1024
+
+
+# Stream, that returns data in chunks of chunk_size bytes as a
+# non-blocking socket would
+class _ChunkedStream:
+    def __init__(self, data, chunk_size):
+        self._data = memoryview(data)
+        self._pos = 0
+        self._chunk_size = chunk_size
+
+    def setblocking(self, flag):
+        pass
+
+    def _next_chunk(self, size):
+        if self._pos >= len(self._data):
+            raise BlockingIOError()
+        chunk = self._data[self._pos:self._pos + min(size, self._chunk_size)]
+        self._pos += len(chunk)
+        return chunk
+
+    def recv(self, size):
+        return bytes(self._next_chunk(size))
+
+    def recv_into(self, buffer):
+        chunk = self._next_chunk(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+# the implementation of LineBuffer before it was based on bytearray
+class _StrLineBuffer:
+    def __init__(self, stream, delimiter = "\n"):
+        self._line_buffer = ""
+        self.DELIMITER = delimiter
+        self._conn = stream
+        self._conn.setblocking(0)
+        self._closed = False
+
+    def poll_line(self):
+        nl_pos = self._line_buffer.find(self.DELIMITER)
+        while not self._closed:
+            try:
+                response = self._conn.recv(1024).decode()
+                self._line_buffer += response
+                nl_pos = self._line_buffer.find(self.DELIMITER)
+                if response == "":
+                    self._closed = True
+                    break
+            except socket.error:
+                break
+        if nl_pos != -1:
+            first_line = self._line_buffer[:nl_pos]
+            self._line_buffer = self._line_buffer[nl_pos+len(self.DELIMITER):]
+            return first_line
+        elif self._closed:
+            raise ConnectionClosed()
+        return None
+
+def read_telegram(buffer_class, data, chunk_size):
+    line = buffer_class(_ChunkedStream(data, chunk_size)).poll_line()
+    assert len(line) == len(data) - 1
+
+if __name__ == '__main__':
+    data = b"2 6 -1 [" + b"1" * (TELEGRAM_SIZE - 14) + b"]# Stepped.\n"
+    for chunk_size in [1024, 65536]:
+        bench_common.report("str line buffer, 1 MB in " + str(chunk_size) + " B chunks",
+                            lambda: read_telegram(_StrLineBuffer, data, chunk_size), 2, repeat=3)
+        bench_common.report("bytearray line buffer, 1 MB in " + str(chunk_size) + " B chunks",
+                            lambda: read_telegram(LineBuffer, data, chunk_size), 20, repeat=3)
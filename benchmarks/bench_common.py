@@ -0,0 +1,12 @@
+import sys, os
+if "src" not in sys.path:
+    sys.path.append(os.path.abspath("src"))
+
+import timeit
+
+# Runs stmt (a callable) repeat times number times and prints the best
+# result as time per call
+def report(name, stmt, number, repeat=5):
+    best = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("{:<50} {:>12.2f} us/call".format(name, best / number * 1e6))
+    return best / number
@@ -0,0 +1,6 @@
+#!/bin/bash
+for bench in benchmarks/*Benchmark.py
+do
+    echo "== $bench =="
+    python3 "$bench"
+done
@@ -0,0 +1,80 @@
+#  BreakpointCondition.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module provides conditions and hit counts for breakpoints, that
+#  are evaluated by the debugger session on the stacktrace of each hit.
+#  Hits that do not match are resumed without involving the client.
+#
+#  A condition consists of comparisons "<ident> <op> <ident or number>",
+#  where <op> is one of ==, !=, <, <=, >, >=, that can be combined with
+#  "and" and "or" ("and" binds stronger), e.g. "i0 == 37 or tmp > i1".
+
+import re
+import operator
+
+from DebuggerExceptions import DebuggingException
+
+_comparison_regex = re.compile(r'\s*([a-zA-Z_]\w*)\s*(==|!=|<=|>=|<|>)\s*([a-zA-Z_]\w*|\d+)\s*$')
+
+_operators = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+              "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+class BreakpointCondition:
+    # condition is a string as described above or None, the breakpoint
+    # only pauses the execution from the hit_count-th hit on.
+    # Raises a DebuggingException, if condition is invalid.
+    def __init__(self, condition=None, hit_count=None):
+        self.condition = condition
+        self.hit_count = hit_count
+        # list of alternatives, each a list of comparisons (ident, op, operand)
+        self._alternatives = []
+        if condition is not None:
+            for alternative in re.split(r'\bor\b', condition):
+                comparisons = []
+                for comparison in re.split(r'\band\b', alternative):
+                    m = _comparison_regex.match(comparison)
+                    if m is None:
+                        raise DebuggingException("Invalid breakpoint condition: " + condition)
+                    operand = m.group(3)
+                    comparisons.append((m.group(1), _operators[m.group(2)],
+                                        int(operand) if operand.isdigit() else operand))
+                self._alternatives.append(comparisons)
+        if hit_count is not None and hit_count < 1:
+            raise DebuggingException("Invalid hit count: " + str(hit_count))
+        # number of times the breakpoint has been reached
+        self.hits = 0
+        # number of hits, that have been resumed since they did not match
+        self.filtered = 0
+
+    def reset_counters(self):
+        self.hits = 0
+        self.filtered = 0
+
+    # Counts a hit and returns True, if the execution shall be paused for
+    # the given stacktrace (innermost frame first).
+    def hit(self, stacktrace):
+        self.hits += 1
+        if self._matches(stacktrace):
+            return True
+        self.filtered += 1
+        return False
+
+    def _matches(self, stacktrace):
+        if self.hit_count is not None and self.hits < self.hit_count:
+            return False
+        if len(self._alternatives) == 0:
+            return True
+        values = {binding["Ident"]: binding["Val"] for binding in stacktrace[0]["bindings"]}
+        try:
+            for comparisons in self._alternatives:
+                if all(op(values[ident], values[operand] if isinstance(operand, str) else operand)
+                       for ident, op, operand in comparisons):
+                    return True
+        except (KeyError, TypeError):
+            # unknown variables, e.g. if the condition refers to another
+            # macro, or big values, that are only available as previews
+            # (see Stacktrace.PREVIEW_DIGITS), so do not filter this hit
+            return True
+        return False
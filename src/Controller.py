@@ -9,11 +9,12 @@ import traceback
 import re
 
 from SessionManager import SessionManager
-from IOTools import read_timeout
 from DebuggerView import DebuggerView
 from Debugger import Debugger, DebuggerState
 from InterpreterView import InterpreterView
 from Interpreter import Interpreter
+from LoopWhileParser import check_program
+import Evaluator
 import Logging
 
 # String constants
@@ -38,12 +39,22 @@ class Controller(TGController):
 
 
 	# this function is implementing the /run side, that receives the program the user wants to execute
-	# and returns a unique session id
+	# and returns a unique session id. If the program is invalid, it returns a tuple "FAIL,<ERROR_MESSAGE>"
+	# with the error message of lwre, without creating a session. If the program is evaluated in
+	# process (see Evaluator), it returns a tuple "DONE,<OUTPUT>" with the output of lwre
     @expose(content_type="text/plain")
     def run(self, **kw):
         try:
             logger.debug("run() called")
             program_code = kw[PROGRAM_CODE]
+            error = check_program(program_code)
+            if error is not None:
+                logger.debug("run(): program rejected: " + error)
+                return "FAIL," + error
+            output = Evaluator.run(program_code)
+            if output is not None:
+                logger.debug("run(): evaluated in process")
+                return "DONE," + output
             session = self._sess_man.create(Interpreter, program_code, request.client_addr)
             logger.debug("run(): new session_id=" + str(session.get_id()))
             return str(session.get_id());
@@ -116,7 +127,13 @@ class Controller(TGController):
             session_id = kw[SESSION_ID]
             logger.debug("set_breakpoint() called, session_id=" + str(session_id) + ", line=" + str(line_no))
             session = self._sess_man.get_session(session_id)
-            session.set_breakpoint(int(line_no))
+            condition = kw.get("condition", "")
+            hit_count = kw.get("hit_count", "")
+            if condition == "" and hit_count == "":
+                session.set_breakpoint(int(line_no))
+            else:
+                session.set_conditional_breakpoint(int(line_no), condition if condition != "" else None,
+                                                   int(hit_count) if hit_count != "" else None)
             return "OK"
         except Exception as e:
             logger.error("set_breakpoint(): Exception: " + traceback.format_exc())
@@ -135,6 +152,42 @@ class Controller(TGController):
         except Exception as e:
             logger.error("remove_breakpoint(): Exception: " + traceback.format_exc())
 
+    # /sync_breakpoints sets breakpoints exactly in the lines given as comma
+    # separated list and returns the lines, in which breakpoints are set now.
+    @expose(content_type="text")
+    def sync_breakpoints(self, **kw):
+        try:
+            lines = kw["lines"]
+            session_id = kw[SESSION_ID]
+            logger.debug("sync_breakpoints() called, session_id=" + str(session_id) + ", lines=" + str(lines))
+            session = self._sess_man.get_session(session_id)
+            line_nos = [int(line_no) for line_no in lines.split(",") if line_no != ""]
+            session.sync_breakpoints(line_nos)
+            return ",".join(str(line_no) for line_no in sorted(session.get_breakpoints()))
+        except KeyError as e:
+            logger.info("sync_breakpoints(): KeyError (invalid session id):" + str(e))
+        except Exception as e:
+            logger.error("sync_breakpoints(): Exception: " + traceback.format_exc())
+        return "FAIL"
+
+    # /debugger_value returns the full value of a variable in the current
+    # stacktrace as decimal string, since big values are sent as previews
+    @expose(content_type="text")
+    def debugger_value(self, **kw):
+        try:
+            session_id = kw[SESSION_ID]
+            frame_index = int(kw["frame"])
+            ident = kw["ident"]
+            logger.debug("debugger_value() called, session_id=" + str(session_id) + ", frame="
+                         + str(frame_index) + ", ident=" + ident)
+            session = self._sess_man.get_session(session_id)
+            return session.get_binding_value(frame_index, ident)
+        except KeyError as e:
+            logger.info("debugger_value(): KeyError:" + str(e))
+        except Exception as e:
+            logger.error("debugger_value(): Exception: " + traceback.format_exc())
+        return "FAIL"
+
     # (deprecated with introduction of WebSockets)
     @expose(content_type="text")
     def debugger_poll_state(self, **kw):
@@ -149,9 +202,9 @@ class Controller(TGController):
             elif state is DebuggerState.NOTSTARTED:
                 return "RESTARTED"
             else:
-                #return "line" + str(session.last_stacktrace()[0]["line"])
-                st = str(session.pop_last_stacktrace()).replace("\'", "\"")
-                logger.debug(st)
+                st = session.pop_last_stacktrace_json()
+                if st is None:
+                    return "None"
                 return st
         except KeyError as e:
             logger.info("debugger_poll_state(): KeyError (invalid session id):" + str(e))
@@ -181,6 +234,23 @@ class Controller(TGController):
                 session.step_out()
             elif action == "stepover":
                 session.step_over()
+            elif action == "stepn":
+                if not session.step_n(int(kw["count"])):
+                    return "FAIL"
+            elif action == "runtoline":
+                session.run_to_line(int(kw["line_no"]))
+            elif action == "rununtilchanged":
+                if not session.run_until_variable_changes(kw["variable"]):
+                    return "FAIL"
+            elif action == "rununtiliteration":
+                if not session.run_until_iteration(int(kw["count"])):
+                    return "FAIL"
+            elif action == "stepback":
+                if not session.step_back():
+                    return "FAIL"
+            elif action == "jump":
+                if not session.jump_to_step(int(kw["step"])):
+                    return "FAIL"
             elif action == "close":
                 self._sess_man.shutdown_session(session)
             elif action == "start":
@@ -202,15 +272,33 @@ class Controller(TGController):
         logger.debug("debugger(): using session_id=" + sess_id)
         session = self._sess_man.get_session(sess_id)
 
-        return DebuggerView(session.get_program_code(), self.get_ws_host())
+        # a reused session keeps its breakpoints, see _reuse_debug_session()
+        breakpoints = set(session.get_breakpoints())
+        trace_recording = session.get_trace_position() is not None
+        structure = session.get_program_structure()
+        if structure is None:
+            return DebuggerView(session.get_program_code(), self.get_ws_host(), breakpoints=breakpoints,
+                                trace_recording=trace_recording)
+        return DebuggerView(structure.source, self.get_ws_host(), structure.breakpoint_lines, breakpoints,
+                            trace_recording)
 
     # /start_debug_session starts a debugger session and returns a tuple "OK,<SESSION_ID>",
     # if the debugger process could be successfully started. If an error occurs, it returns
-    # a tuple "FAIL,<ERROR_MESSAGE>" with an appropriate error message
+    # a tuple "FAIL,<ERROR_MESSAGE>" with an appropriate error message. Invalid programs
+    # are rejected before a session is created. The client may send the id of its previous
+    # debugger session, which is reused for the same program
     @expose(content_type="text")
     def start_debug_session(self, **kw):
         logger.debug("start_debug_session() called")
         program_code = kw[PROGRAM_CODE]
+        error = check_program(program_code)
+        if error is not None:
+            logger.debug("start_debug_session(): program rejected: " + error)
+            return "FAIL," + error
+        session = self._reuse_debug_session(kw.get(SESSION_ID, ""), program_code, request.client_addr)
+        if session is not None:
+            logger.debug("start_debug_session(): reusing session_id=" + str(session.get_id()))
+            return "OK," + session.get_id()
         session = self._sess_man.create(Debugger, program_code, request.client_addr)
         logger.debug("start_debug_session(): new session_id=" + str(session.get_id()))
         if session.is_failed():
@@ -222,6 +310,24 @@ class Controller(TGController):
             return "FAIL," + terminal_output
         return "OK," + session.get_id()
 
+    # Returns the debugger session session_id after resetting it to the start of
+    # the program, if it belongs to client_addr and debugs the same program.
+    # Otherwise, or if there is no such session, returns None
+    def _reuse_debug_session(self, session_id, program_code, client_addr):
+        try:
+            session = self._sess_man.get_session(session_id)
+        except KeyError:
+            return None
+        if not (isinstance(session, Debugger) and session.get_client_addr() == client_addr
+                and session.get_program_hash() == Debugger.program_hash(program_code)):
+            return None
+        try:
+            if session.reset() and self._sess_man.renew_session(session):
+                return session
+        except Exception:
+            logger.error("_reuse_debug_session(): Exception: " + traceback.format_exc())
+        return None
+
     @expose('templates/interpreter.xhtml', content_type="text/html")
     def index(self, **kw):
         return self.interpreter()
@@ -6,19 +6,31 @@
 #  This module encapsulates the connection to the debugger
 
 import json
+import re
 from enum import Enum
+from collections import deque
+from select import select
 import threading
 import Logging
-import socket
 import time
+import socket
+import os, fcntl
+import traceback
+import functools
+import hashlib
 
-from external_libs.lexer import Lexer
-from IOTools import read_timeout, LineBuffer, ConnectionClosed
+from external_libs.lexer import Lexer, LexerError
+from IOTools import LineBuffer, ConnectionClosed, LineTooLong
 from DebuggerExceptions import DebuggerErrorMessage, CompilerErrorMessage, DebuggingException
-from SocketManager import SocketManager
-from SessionManager import SessionManager
+import DebuggerTransport
 from Session import Session
-from SourceCodeView import Tokenizer
+from ProgramStructure import ProgramStructure
+from BreakpointCondition import BreakpointCondition
+import ReportGenerator
+from ReportGenerator import Histogram
+from StackDiff import diff_stacktraces
+from Stacktrace import LazyStacktrace, binding_value
+from TraceRecorder import TraceRecorder, DEFAULT_MAX_BYTES as DEFAULT_TRACE_MAX_BYTES
 
 _lexer_rules = [
     ('\d\d\d\d/\d\d/\d\d \d\d:\d\d:\d\d',                      'DATE_TIME'),
@@ -28,6 +40,26 @@ _lexer_rules = [
     ('(\w| |\d|,)+',                                           'STR'),
 ]
 
+# Fast path for telegrams sent by the debugger process, e.g.
+# "2 6 -1 [{...}]# Stepped." or "1 7 1# Breakpoint 1 set.". The groups are
+# the telegram type, line number, breakpoint number and the JSON stacktrace.
+_telegram_regex = re.compile(r'(\d+) (-?\d+) (-?\d+) ?(\[.+\])?#')
+
+#
+#  name: _load_stacktrace
+#  @param
+#    json_str JSON encoded stacktrace sent by the debugger process
+#  @return tuple (stacktrace, json_str or None, big_values)
+#
+#  Big values are replaced by previews in the returned stacktrace, so the
+#  returned JSON string is None in this case. big_values is a dict mapping
+#  (frame index, identifier) to the full decimal string of each big value,
+#  that is filled as the frames are decoded (see LazyStacktrace).
+#
+def _load_stacktrace(json_str):
+    stacktrace = LazyStacktrace(json_str)
+    return stacktrace, None if stacktrace.has_big_values else json_str, stacktrace.big_values
+
 _debugger_cmd_timeout = 15.0
 
 class TelegramType(Enum):
@@ -37,11 +69,16 @@ class TelegramType(Enum):
     STACKTRACE = 3
 
 class DebuggerTelegram:
-    def __init__(self, ttype, line_no, breakpoint_no, data):
+    # raw_data is the JSON text data has been parsed from, if available,
+    # big_values contains the full values of all big values in data (see
+    # _load_stacktrace())
+    def __init__(self, ttype, line_no, breakpoint_no, data, raw_data=None, big_values=None):
         self.ttype = ttype
         self.line_no = line_no
         self.breakpoint_no = breakpoint_no
         self.data = data
+        self.raw_data = raw_data
+        self.big_values = big_values if big_values is not None else {}
 
     def __str__(self):
         return str(self.ttype) + " " + str(self.line_no) + " " + str(self.breakpoint_no) + " " + str(self.data)
@@ -52,73 +89,251 @@ class DebuggerState(Enum):
     PAUSED = 2
     DIED = 3
 
-_socket_manager = SocketManager(10000, 20000)
 DEBUGGER_TIMEOUT = 15*60
 DEBUGGER_ACCEPT_TIMEOUT = 0.75
+# maximal time to wait for the response to a command, e.g. setbreakpoint
+DEBUGGER_RESPONSE_TIMEOUT = 2.0
 logger = Logging.get_logger(__name__)
 
+# maximal number of steps executed by a single multi-step command
+MAX_MULTI_STEPS = 100000
+
+# memory limit (in bytes) for the execution trace of each debugger session,
+# 0 disables trace recording
+_trace_max_bytes = 0
+
+def set_trace_memory(max_bytes):
+    global _trace_max_bytes
+    if max_bytes < 0:
+        raise ValueError("Invalid trace memory limit: " + str(max_bytes))
+    _trace_max_bytes = max_bytes
+
+# A command sent to the debugger process, that is waiting for its response
+class _PendingCommand:
+    def __init__(self, command):
+        self.command = command
+        self.sent_time = time.monotonic()
+        # the received DebuggerTelegram or an Exception
+        self.response = None
+
+
+# A method call, that has been posted to the session thread of a Debugger
+class _SessionCommand:
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+    def execute(self, debugger):
+        try:
+            self.result = self.method(debugger, *self.args, **self.kwargs)
+        except Exception as e:
+            self.exception = e
+        self.done.set()
+
+# Decorator for all Debugger methods, that change the state of the session
+# or communicate with the debugger process. They are executed by the
+# session thread, the calling thread waits for the result.
+def _session_command(method):
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        return self._call_in_session_thread(method, args, kwargs)
+    return call
+
 
 class Debugger(Session):
     def __init__(self, code, sess_id, session_manager, client_addr=None):
         super().__init__(sess_id, session_manager, client_addr)
         # set of line numbers (int) on which breakpoints are set
         self._breakpoints = set()
+        # maps line numbers of conditional breakpoints to BreakpointCondition objects
+        self._conditions = {}
+        # number of hits of conditional breakpoints in all runs of the session
+        # and the number of those, that have been resumed since their
+        # condition did not match, written to the report when closing
+        self._conditional_hits = 0
+        self._filtered_hits = 0
 
         # _lock is now provided by superclass session
         #self._lock = threading.Lock() 
 
         self._last_state = DebuggerState.NOTSTARTED
         self._last_stacktrace = None
+        # JSON encoding of _last_stacktrace, None if not encoded yet
+        self._last_stacktrace_json = None
+        # the stacktrace of the current state, that is not reset by
+        # pop_last_stacktrace(), and the full values of its big values
+        # (None, if they are not available)
+        self._current_stacktrace = None
+        self._current_big_values = None
+
+        # last stacktrace that has been sent to the client as a diff
+        self._client_stacktrace = None
+
+        # Each session is driven by a single session thread, that owns the
+        # connection to the debugger process: it receives all telegrams and
+        # executes all commands posted by other threads in the order they
+        # were posted (see _session_command). The published state, e.g.
+        # _last_state and _last_stacktrace, is read by other threads under
+        # _cond, that also wakes up threads waiting for new states.
+        self._cond = threading.Condition()
+        self._session_thread = None
+        # posted _SessionCommand objects, the session thread is woken up
+        # via the command pipe
+        self._commands = deque()
+        self._command_r, self._command_w = os.pipe()
+        # set by the session thread, if the debugger process closed the
+        # connection, i.e. the program terminated
+        self._connection_lost = False
+        # commands waiting for a response, in the order they were sent
+        self._pending = deque()
+        # time the last step command was sent, for latency statistics
+        self._step_sent_time = None
+        # histograms of the response latencies of the debugger process, one
+        # per command, written to the report when closing
+        self._latencies = {}
+        self._closed = False
+
+        # recorder for the stacktraces of all steps, None if disabled
+        self._trace = None
+        # step of the trace that is displayed instead of the current state
+        # of the debugger process, None if the current state is displayed
+        self._trace_pos = None
+        if _trace_max_bytes > 0:
+            self.enable_trace_recording(_trace_max_bytes)
+
+        # The session thread writes to this pipe whenever new telegrams have
+        # been processed, so observers can wait for updates via select().
+        self._notify_r, self._notify_w = os.pipe()
+        for fd in (self._notify_r, self._notify_w, self._command_r, self._command_w):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        # identifies the debugged program, see reset()
+        self._program_hash = Debugger.program_hash(code)
+
+        # index of the program structure, None if code can not be tokenized
+        try:
+            self._structure = ProgramStructure(code)
+        except LexerError:
+            self._structure = None
 
-        # socket to listen for debugger process
-        self._socket = _socket_manager.create_socket()
-        self._socket.settimeout(DEBUGGER_ACCEPT_TIMEOUT)
+        # connection setup to the debugger process
+        self._transport = DebuggerTransport.create_transport(DEBUGGER_ACCEPT_TIMEOUT)
 
         # debugger process self._proc
-        self._create_process(code, True, self._socket.get_port_no())
+        try:
+            self._create_process(code, self._transport)
+        except Exception:
+            self._transport.close()
+            for fd in (self._notify_r, self._notify_w, self._command_r, self._command_w):
+                os.close(fd)
+            raise
 
         # source file containing the users code
         self._input_file_name = self._sess_man.get_input_filename(sess_id)
 
         # if debugger is started via "start" command, execution is halted
         # at the first line of the root macro, so we need a temporary breakpoint
-        # that will be deleted as soon as execution reaches the first line
-        self._start_line = -1
-
-        # connection to the debugger process
-        self._conn = None
-        try:
-            self._conn, _ = self._socket.accept()
-        except socket.timeout:
-            # timeout happens normally in case of syntax errors, where
-            # the interpreter process terminates immediately
+        # that will be deleted as soon as execution is paused the next time.
+        # The same applies to run_to_line().
+        self._temp_breakpoint = -1
+
+        # True, while a multi-step command (e.g. step_n()) is executed.
+        # Intermediate states are not reported to observers in the meantime.
+        self._multi_step_active = False
+        # tuple (stop condition, remaining steps, step command) of the
+        # running multi-step command, only used by the session thread
+        self._multi_step = None
+
+        # connection to the debugger process, None in case of syntax errors,
+        # where the interpreter process terminates immediately
+        self._conn = self._transport.accept(self._proc)
+        if self._conn is None:
+            self._close_command_pipe()
             return
 
         self._line_buffer = LineBuffer(self._conn)
-
-    def _restart(self):
-        with self._lock:
+        self._session_thread = threading.Thread(target=self._run_session, daemon=True)
+        self._session_thread.start()
+
+    def _close_command_pipe(self):
+        with self._cond:
+            if self._command_r is not None:
+                os.close(self._command_r)
+                os.close(self._command_w)
+                self._command_r = self._command_w = None
+
+    # shuts down the connection, such that the session thread terminates
+    def _close_conn(self):
+        if self._conn is not None:
+            try:
+                self._conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self._conn.close()
             self._conn = None
-            self._proc.kill()
-            # wait to remove zombies
-            self._proc.wait(5)
 
-            self._last_stacktrace = None
-
-            self._create_process(None, True, self._socket.get_port_no(), reuse_input_file=True)
-            self._last_state = DebuggerState.NOTSTARTED
-            try:
-                self._conn, _ = self._socket.accept()
-            except socket.timeout:
+    # Restarts the debugger process, called by the session thread
+    def _restart(self):
+        with self._lock:
+            self._connection_lost = False
+            if self._closed:
                 return
-            self._line_buffer = LineBuffer(self._conn)
+            self._stop_multi_step()
+            # observers must stop using the old file descriptors before they get closed
+            self._sess_man.notify_session_restarting(self)
+            try:
+                self._close_conn()
+                self._proc.kill()
+                # wait to remove zombies
+                self._proc.wait(5)
+
+                self._set_last_stacktrace(None)
+                with self._cond:
+                    self._client_stacktrace = None
+                    self._current_stacktrace = None
+                    if self._trace is not None:
+                        self._trace.clear()
+                    self._trace_pos = None
+                    for condition in self._conditions.values():
+                        condition.reset_counters()
+
+                self._create_process(None, self._transport, reuse_input_file=True)
+                self._last_state = DebuggerState.NOTSTARTED
+                self._conn = self._transport.accept(self._proc)
+                if self._conn is None:
+                    return
+                self._line_buffer = LineBuffer(self._conn)
+            finally:
+                self._sess_man.notify_session_restarted(self)
 
             # transfer all breakpoints to new debugger process
             old_breakpoints = self._breakpoints
             self._breakpoints = set()
-            for bp in old_breakpoints:
-                self.set_breakpoint(bp)
+            for line_no, error in self.set_breakpoints(sorted(old_breakpoints)).items():
+                if error is not None:
+                    logger.info("_restart(): can not set breakpoint in line " + str(line_no) + ": " + str(error))
+
+    # Restarts the debugger process for a new run of the same program, e.g.
+    # if the user starts debugging again without changing the program.
+    # Breakpoints are kept. Returns False, if the session can not be reused.
+    @_session_command
+    def reset(self):
+        if self._closed or self._conn is None:
+            return False
+        self._restart()
+        return self._conn is not None
+
+    @staticmethod
+    def program_hash(code):
+        return hashlib.sha256(code.encode()).hexdigest()
+
+    def get_program_hash(self):
+        return self._program_hash
 
     # returns True, if the debugger process failed, e.g. in case of a syntax error
     # in the given program
@@ -141,14 +356,32 @@ class Debugger(Session):
     def kill(self):
         with self._lock:
             if self._proc is not None:
-                self._socket.close()
-                try:
-                    self._conn.close()
-                except:
-                    # in case of syntax errors, the debugger process terminates
-                    # right after termination, so no connection exists.
-                    pass
+                self._closed = True
+                self._transport.close()
+                statistics = self.get_breakpoint_statistics()
+                if statistics["hits"] > 0:
+                    ReportGenerator.logBreakpointHits(self._sess_id, statistics["hits"], statistics["filtered"])
+                latencies = self.get_response_latencies()
+                if len(latencies) > 0:
+                    ReportGenerator.logResponseLatencies(self._sess_id, latencies)
+                # in case of syntax errors, the debugger process terminates
+                # right after termination, so no connection exists.
+                self._close_conn()
+                self._fail_pending(DebuggingException("Debugger session has been closed."))
                 self._kill()
+                with self._cond:
+                    self._multi_step = None
+                    self._multi_step_active = False
+                    self._cond.notify_all()
+                    # the session thread must not write to a reused fd
+                    os.close(self._notify_r)
+                    os.close(self._notify_w)
+                    self._notify_r = self._notify_w = None
+
+    # Returns the ProgramStructure of the debugged program, or None if the
+    # program can not be tokenized
+    def get_program_structure(self):
+        return self._structure
 
     # Returns a set with the line numbers of all set breakpoints
     def get_breakpoints(self):
@@ -161,195 +394,692 @@ class Debugger(Session):
         self._conn.send(to_write)
         #self._conn.flush()
 
-    # waits for a response and returns parsed response object
-    # returns None if no response is available
-    def _poll_response(self):
-        response = self._line_buffer.poll_line()
-        if response is not None:
-            return self.parse_debugger_output(response)
-        return None
-
-    # Reads all debugger telegrams from the debugger and processes them.
-    # This method will not block, so after a call, there might be new
-    # unprocessed telegrams.
-    # Additionally, one can specify a several type of Telegram in parameter
-    # ttype, such that the least processed telegram of that type will be returned.
-    def _process_telegrams(self, ttype=None):
-        last_tgram = None
+    # Sends a command, that is answered by the debugger process with a
+    # BREAKPOINT_SET telegram or an error message, and waits for the response.
+    # Raises the error message as exception, or a DebuggingException if no
+    # response arrives within timeout seconds.
+    def _send_cmd_and_wait(self, cmd, timeout=DEBUGGER_RESPONSE_TIMEOUT):
+        response = self._send_cmds_and_wait([cmd], timeout)[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    # Like _send_cmd_and_wait(), but writes all commands at once and waits
+    # for all responses. Returns the list of responses in the order of cmds,
+    # where each response is either a DebuggerTelegram or an Exception.
+    def _send_cmds_and_wait(self, cmds, timeout=DEBUGGER_RESPONSE_TIMEOUT):
+        pendings = [_PendingCommand(cmd.split(" ")[0]) for cmd in cmds]
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Responses are assigned to the pending commands in the order the
+            # commands were sent
+            self._pending.extend(pendings)
+        try:
+            self._send_cmd("\n".join(cmds))
+        except Exception:
+            with self._cond:
+                for pending in pendings:
+                    self._pending.remove(pending)
+            raise
+        self._receive_until(lambda: all(pending.response is not None for pending in pendings), deadline)
+        for pending in pendings:
+            if pending.response is None:
+                # pending stays in the queue, so a late response is not
+                # mistaken for the response to another command
+                pending.response = DebuggingException("No response to command \"" + pending.command
+                                                      + "\" within " + str(timeout) + " seconds.")
+        return [pending.response for pending in pendings]
+
+    # The keys of the histograms are the upper bounds of the buckets in
+    # milliseconds. Must be called with _cond held.
+    def _record_latency(self, command, seconds):
+        bucket = 1
+        while bucket < seconds * 1000:
+            bucket *= 2
+        if command not in self._latencies:
+            self._latencies[command] = Histogram()
+        self._latencies[command].increment(bucket)
+
+    # Returns a dict that maps commands to dicts {bucket_ms: count}
+    def get_response_latencies(self):
+        with self._cond:
+            return {cmd: dict(hist.data_map) for cmd, hist in self._latencies.items()}
+
+    # hands response over to the oldest pending command
+    def _complete_pending(self, response):
+        with self._cond:
+            if len(self._pending) == 0:
+                logger.info("_complete_pending(): unexpected response from debugger process: " + str(response))
+                return
+            pending = self._pending.popleft()
+            if pending.response is None:
+                pending.response = response
+                self._record_latency(pending.command, time.monotonic() - pending.sent_time)
+            self._cond.notify_all()
+
+    # lets all pending commands fail with exception
+    def _fail_pending(self, exception):
+        with self._cond:
+            while len(self._pending) > 0:
+                self._pending.popleft().response = exception
+            self._step_sent_time = None
+            self._cond.notify_all()
+
+    # Executes method in the session thread and returns its result. If the
+    # session has no session thread (anymore), method is executed directly.
+    def _call_in_session_thread(self, method, args, kwargs):
+        with self._cond:
+            thread = self._session_thread
+            if thread is not None and thread is not threading.current_thread():
+                command = _SessionCommand(method, args, kwargs)
+                self._commands.append(command)
+                try:
+                    os.write(self._command_w, b"\0")
+                except BlockingIOError:
+                    # pipe is full, so the session thread is woken up anyway
+                    pass
+        if thread is None or thread is threading.current_thread():
+            return method(self, *args, **kwargs)
+        command.done.wait()
+        if command.exception is not None:
+            raise command.exception
+        return command.result
+
+    # Main loop of the session thread. Terminates, as soon as the session is
+    # closed or the debugger process could not be restarted. If the debugger
+    # process closed the connection, i.e. the program terminated, the process
+    # is restarted.
+    def _run_session(self):
+        try:
+            while not self._closed:
+                conn = self._conn
+                if conn is None:
+                    break
+                r, _, _ = select([conn, self._command_r], [], [])
+                if self._command_r in r:
+                    self._run_commands()
+                if conn in r:
+                    self._receive()
+                if self._connection_lost:
+                    self._restart()
+                    self._notify_observers()
+        except (OSError, ValueError):
+            # connection has been closed by kill()
+            pass
+        except Exception:
+            logger.error("_run_session(): " + traceback.format_exc())
+        finally:
+            with self._cond:
+                self._session_thread = None
+                commands = list(self._commands)
+                self._commands.clear()
+            self._close_command_pipe()
+            # commands posted in the meantime
+            for command in commands:
+                command.execute(self)
+
+    # executes all posted commands, called by the session thread
+    def _run_commands(self):
+        try:
+            while len(os.read(self._command_r, 4096)) > 0:
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            with self._cond:
+                if len(self._commands) == 0:
+                    return
+                command = self._commands.popleft()
+            command.execute(self)
+
+    # Processes all lines received from the debugger process and notifies
+    # the observers, called by the session thread
+    def _receive(self):
+        received = False
         while True:
             try:
-                response = self._poll_response()
-                if response is None:
-                    break
+                line = self._line_buffer.poll_line()
             except ConnectionClosed:
-                self._restart()
-                return last_tgram
+                self._connection_lost = True
+                self._fail_pending(DebuggingException("Connection to debugger process closed."))
+                break
+            except LineTooLong as e:
+                # the telegram is skipped
+                logger.error("_receive(): " + str(e))
+                self._fail_pending(DebuggingException(str(e)))
+                continue
+            if line is None:
+                break
+            received = True
+            self._process_debugger_output(line)
+        if received:
+            self._notify_observers()
+
+    # Receives telegrams until done() returns True, the deadline has passed or
+    # the connection is lost. Commands, that wait for responses of the
+    # debugger process, can only be executed by the session thread, which
+    # receives the responses itself.
+    def _receive_until(self, done, deadline):
+        while not done() and not self._connection_lost:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            conn = self._conn
+            if conn is None:
+                raise DebuggingException("Debugger session has been closed.")
+            r, _, _ = select([conn], [], [], remaining)
+            if conn in r:
+                self._receive()
+
+    # processes one line received from the debugger process
+    def _process_debugger_output(self, line):
+        try:
+            response = self.parse_debugger_output(line)
+        except (DebuggerErrorMessage, DebuggingException, CompilerErrorMessage) as e:
+            self._complete_pending(e)
+            return
+        except Exception as e:
+            logger.error("_process_debugger_output(): can not parse \"" + line + "\": " + str(e))
+            return
+
+        if response.ttype is TelegramType.BREAKPOINT_SET:
+            self._complete_pending(response)
+            return
+
+        with self._cond:
+            if self._filter_breakpoint_hit(response):
+                return
 
             # update type
             if response.ttype in [TelegramType.AT_BREAKPOINT, TelegramType.STEPPED]:
                 self._last_state = DebuggerState.PAUSED
+                if self._step_sent_time is not None:
+                    self._record_latency("step", time.monotonic() - self._step_sent_time)
+                    self._step_sent_time = None
 
             # update stacktrace
             if response.data is not None:
-                self._last_stacktrace = response.data
-            
-            if ttype is response.ttype:
-                last_tgram = response
-        if self._last_state == DebuggerState.PAUSED and self._start_line > -1:
-            self.remove_breakpoint(self._start_line)
-        return last_tgram
-
-    # waits for a response of a certain TelegramType, or an
-    # possible Exception
-    def _wait_for_debugger_response(self, ttype):
-        last_tgram = None
-        i = 0
-        while last_tgram is None and i < 10:
-            last_tgram = self._process_telegrams(ttype)
-            i += 1
-            if i == 9:
-                time.sleep(0.1)
-        return last_tgram
-        
+                # the JSON text of the telegram is served as it is
+                self._set_last_stacktrace(response.data, response.raw_data, response.big_values)
+                if self._trace is not None:
+                    self._trace.record(response.data)
+            self._cond.notify_all()
+
+        if self._last_state == DebuggerState.PAUSED and self._temp_breakpoint > -1:
+            self.remove_breakpoint(self._temp_breakpoint)
+            self._temp_breakpoint = -1
+
+        if self._multi_step is not None and self._step_sent_time is None:
+            self._continue_multi_step()
+
+    # Evaluates the condition of a reached breakpoint and resumes the
+    # execution, if it does not match. Returns True in this case.
+    # Hits during step commands are never filtered.
+    def _filter_breakpoint_hit(self, response):
+        if response.ttype is not TelegramType.AT_BREAKPOINT or response.data is None:
+            return False
+        condition = self._conditions.get(response.line_no)
+        if condition is None or self._step_sent_time is not None:
+            return False
+        self._conditional_hits += 1
+        if condition.hit(response.data):
+            return False
+        self._filtered_hits += 1
+        self._send_cmd("resume")
+        return True
+
+    def _notify_observers(self):
+        with self._cond:
+            if self._notify_w is None or self._multi_step_active:
+                return
+            try:
+                os.write(self._notify_w, b"\0")
+            except BlockingIOError:
+                # pipe is full, so observers are notified anyway
+                pass
+
+    # Clears the notifications of the session thread. Has to be called by
+    # observers waiting for the file descriptors of this session, before
+    # they process the state of this session.
+    def acknowledge_notifications(self):
+        with self._cond:
+            if self._notify_r is None:
+                return
+            try:
+                while len(os.read(self._notify_r, 4096)) > 0:
+                    pass
+            except BlockingIOError:
+                pass
 
     # returns the current state of the debugger
     def poll_state(self):
-        self._process_telegrams()
+        if self._multi_step_active:
+            return DebuggerState.RUNNING
         return self._last_state
 
-    # returns last received stacktrace
+    # returns last received stacktrace, after waiting for the response to
+    # a step command that has just been sent
     def last_stacktrace(self):
-        self._process_telegrams()
-        return self._last_stacktrace
+        with self._cond:
+            self._cond.wait_for(lambda: self._step_sent_time is None, DEBUGGER_RESPONSE_TIMEOUT)
+            return self._last_stacktrace
 
     # returns last received stacktrace and resets it to None
-    def pop_last_stacktrace(self, load_telegrams=True):
-        if load_telegrams:
-            self._process_telegrams()
-        st = self._last_stacktrace
-        self._last_stacktrace = None
+    def pop_last_stacktrace(self):
+        with self._cond:
+            st = self._last_stacktrace
+            self._set_last_stacktrace(None)
         return st
 
+    # Returns the JSON encoding (str) of last_stacktrace() or None. Each
+    # stacktrace is encoded at most once, stacktraces received from the
+    # debugger process are not encoded at all.
+    def last_stacktrace_json(self):
+        with self._cond:
+            if self._last_stacktrace is not None and self._last_stacktrace_json is None:
+                self._last_stacktrace_json = json.dumps(list(self._last_stacktrace))
+            return self._last_stacktrace_json
+
+    # Like last_stacktrace_json(), but resets the last stacktrace to None
+    def pop_last_stacktrace_json(self):
+        with self._cond:
+            encoded = self.last_stacktrace_json()
+            self._set_last_stacktrace(None)
+        return encoded
+
+    def _set_last_stacktrace(self, stacktrace, encoded=None, big_values=None):
+        with self._cond:
+            self._last_stacktrace = stacktrace
+            self._last_stacktrace_json = encoded
+            if stacktrace is not None:
+                self._current_stacktrace = stacktrace
+                self._current_big_values = big_values
+
+    # Returns the full value of variable ident in the frame with the given
+    # index (0 is the innermost frame) of the current stacktrace as decimal
+    # string. This is needed for big values, that are replaced by previews
+    # in stacktraces. Fails with a DebuggingException, if the value is not
+    # available.
+    def get_binding_value(self, frame_index, ident):
+        with self._cond:
+            stacktrace = self._current_stacktrace
+            if stacktrace is None or not 0 <= frame_index < len(stacktrace):
+                raise DebuggingException("Frame " + str(frame_index) + " is not available.")
+            value = self._binding_value(stacktrace, frame_index, ident)
+            if isinstance(value, str) and self._current_big_values is None:
+                # stacktraces of the execution trace only hold previews
+                raise DebuggingException("Full values are only available for the current step.")
+            return str(value)
+
+    # Like pop_last_stacktrace(), but returns the changes relative to the
+    # stacktrace returned by the previous call (see diff_stacktraces()), or
+    # None if no new stacktrace is available. If full is True, the diff
+    # contains the complete stacktrace, e.g. if several clients observe
+    # the session, that do not know the same stacktrace.
+    def pop_stacktrace_diff(self, full=False):
+        with self._cond:
+            if self._multi_step_active or self._last_stacktrace is None:
+                return None
+            st = self._last_stacktrace
+            self._set_last_stacktrace(None)
+            base = None if full else self._client_stacktrace
+            self._client_stacktrace = st
+        return diff_stacktraces(base, st)
+
+    # Lets the next call of pop_stacktrace_diff() return a diff that
+    # contains the complete stacktrace, e.g. if the client lost its state.
+    # Observers are notified, so the stacktrace is sent without waiting for
+    # the next step.
+    def reset_stacktrace_diff(self):
+        with self._cond:
+            if self._last_stacktrace is None:
+                self._last_stacktrace = self._client_stacktrace
+                self._last_stacktrace_json = None
+            self._client_stacktrace = None
+            if self._last_stacktrace is not None:
+                self._notify_observers()
+
     # Fails with an DebuggerErrorMessage Exception, if line_no is not valid
     def set_breakpoint(self, line_no):
-        self._send_cmd("setbreakpoint " +  str(line_no) + " " + self._input_file_name)
-        resp = self._wait_for_debugger_response(TelegramType.BREAKPOINT_SET)
-
-        assert(line_no == resp.line_no)
-        self._breakpoints.add(line_no)
+        error = self.set_breakpoints([line_no])[line_no]
+        if error is not None:
+            raise error
+
+    # Sets breakpoints in all given lines with a single write and matches the
+    # responses as they come back. Returns a dict that maps each line number
+    # to None, if the breakpoint has been set, or to the Exception otherwise.
+    @_session_command
+    def set_breakpoints(self, line_nos):
+        result = {}
+        # invalid lines are rejected without a round trip to the debugger process
+        if self._structure is not None:
+            for line_no in line_nos:
+                if not self._structure.is_breakpoint_line(line_no):
+                    result[line_no] = DebuggerErrorMessage("No Statement in line " + str(line_no))
+        line_nos = [line_no for line_no in line_nos if line_no not in result]
+        if len(line_nos) == 0:
+            return result
+        responses = self._send_cmds_and_wait(["setbreakpoint " +  str(line_no) + " " + self._input_file_name
+                                              for line_no in line_nos])
+        for line_no, resp in zip(line_nos, responses):
+            if isinstance(resp, Exception):
+                result[line_no] = resp
+            elif resp.line_no != line_no:
+                result[line_no] = DebuggingException("Breakpoint for line " + str(line_no)
+                                                     + " has been set in line " + str(resp.line_no))
+            else:
+                self._breakpoints.add(line_no)
+                result[line_no] = None
+        return result
+
+    # Sets breakpoints exactly in the given lines, i.e. removes all other
+    # breakpoints. Returns the result of set_breakpoints() for the new lines.
+    @_session_command
+    def sync_breakpoints(self, line_nos):
+        line_nos = set(line_nos)
+        for line_no in self._breakpoints - line_nos:
+            self.remove_breakpoint(line_no)
+        return self.set_breakpoints(sorted(line_nos - self._breakpoints))
 
     # In case line_no is not valid, NO Exception is thrown.
+    @_session_command
     def remove_breakpoint(self, line_no):
         if line_no in self._breakpoints:
             self._send_cmd("clearbreakpoint " + str(line_no) + " " + self._input_file_name)
             self._breakpoints.remove(line_no)
+            with self._cond:
+                self._conditions.pop(line_no, None)
+
+    # Sets a breakpoint in line_no, that only pauses the execution, if
+    # condition holds for the bindings of the current frame and it has been
+    # reached at least hit_count times (see BreakpointCondition). Other hits
+    # are resumed without notifying observers. Fails with a
+    # DebuggingException, if the condition is invalid.
+    @_session_command
+    def set_conditional_breakpoint(self, line_no, condition=None, hit_count=None):
+        breakpoint_condition = BreakpointCondition(condition, hit_count)
+        if line_no not in self._breakpoints:
+            self.set_breakpoint(line_no)
+        with self._cond:
+            if condition is None and hit_count is None:
+                self._conditions.pop(line_no, None)
+            else:
+                self._conditions[line_no] = breakpoint_condition
+
+    # Returns a dict {"hits": ..., "filtered": ...} with the number of hits
+    # of conditional breakpoints in all runs of the session and the number
+    # of those, that have been resumed since their condition did not match
+    def get_breakpoint_statistics(self):
+        with self._cond:
+            return {"hits": self._conditional_hits, "filtered": self._filtered_hits}
 
+    @_session_command
     def step_over(self):
+        self._stop_multi_step()
+        if self._replay_next_step():
+            return
         if self._last_state not in [DebuggerState.DIED, DebuggerState.NOTSTARTED]:
             self._last_state = DebuggerState.RUNNING
+            self._step_sent_time = time.monotonic()
             self._send_cmd("stepover")
 
+    @_session_command
     def step_into(self):
+        self._stop_multi_step()
+        if self._replay_next_step():
+            return
         if self._last_state not in [DebuggerState.DIED, DebuggerState.NOTSTARTED]:
             self._last_state = DebuggerState.RUNNING
+            self._step_sent_time = time.monotonic()
             self._send_cmd("stepinto")
 
+    @_session_command
     def step_out(self):
+        self._stop_multi_step()
+        if self._replay_next_step():
+            return
         if self._last_state not in [DebuggerState.DIED, DebuggerState.NOTSTARTED]:
             self._last_state = DebuggerState.RUNNING
+            self._step_sent_time = time.monotonic()
             self._send_cmd("stepout")
 
+    @_session_command
     def resume(self):
+        self._stop_multi_step()
+        self._trace_pos = None
         if self._last_state not in [DebuggerState.DIED, DebuggerState.NOTSTARTED]:
             self._last_state = DebuggerState.RUNNING
             self._send_cmd("resume")
 
+    @_session_command
     def run(self):
         if self._last_state is DebuggerState.NOTSTARTED:
             self._last_state = DebuggerState.RUNNING
             self._send_cmd("run")
 
-    class StatefulTokenizer:
-        def __init__(self, source):
-            self._lexer = Tokenizer(source).__iter__()
-            self._line = 1
-            self._token = None
-            self.consume_token()
-
-        def cur_line(self):
-            return self._line
+    # Records the stacktraces of all following steps, such that previous
+    # steps can be displayed via step_back() and jump_to_step().
+    @_session_command
+    def enable_trace_recording(self, max_bytes=DEFAULT_TRACE_MAX_BYTES):
+        with self._cond:
+            if self._trace is None:
+                self._trace = TraceRecorder(max_bytes)
+
+    @_session_command
+    def disable_trace_recording(self):
+        with self._cond:
+            self._trace = None
+            self._trace_pos = None
+
+    # Returns a tuple (displayed step, first available step, number of steps)
+    # or None, if no trace is recorded
+    def get_trace_position(self):
+        with self._cond:
+            if self._trace is None:
+                return None
+            count = len(self._trace)
+            pos = count - 1 if self._trace_pos is None else self._trace_pos
+            return (pos, self._trace.first_step(), count)
+
+    # Displays the stacktrace of the previous step from the recorded trace.
+    # Returns False, if no previous step is available.
+    @_session_command
+    def step_back(self):
+        self._stop_multi_step()
+        with self._cond:
+            position = self.get_trace_position()
+            if position is None or self._last_state is not DebuggerState.PAUSED:
+                return False
+            return self._show_recorded_step(position[0] - 1)
+
+    # Displays the stacktrace of the given step from the recorded trace.
+    # Returns False, if the step is not available.
+    @_session_command
+    def jump_to_step(self, step):
+        self._stop_multi_step()
+        with self._cond:
+            if self._trace is None or self._last_state is not DebuggerState.PAUSED:
+                return False
+            return self._show_recorded_step(step)
+
+    # If a previous step is displayed, the following step of the trace is
+    # displayed instead of sending a step command to the debugger process.
+    def _replay_next_step(self):
+        with self._cond:
+            if self._trace_pos is None:
+                return False
+            return self._show_recorded_step(self._trace_pos + 1)
+
+    def _show_recorded_step(self, step):
+        try:
+            stacktrace = self._trace.get(step)
+        except IndexError:
+            return False
+        self._trace_pos = None if step == len(self._trace) - 1 else step
+        self._set_last_stacktrace(stacktrace)
+        self._notify_observers()
+        return True
 
-        def has_token(self):
-            return self._token is not None
+    # sets a breakpoint, that is removed as soon as the execution is paused.
+    # A previous temporary breakpoint, that has not been reached, is removed.
+    def _set_temp_breakpoint(self, line_no):
+        if self._temp_breakpoint > -1 and self._temp_breakpoint != line_no:
+            self.remove_breakpoint(self._temp_breakpoint)
+            self._temp_breakpoint = -1
+        if line_no in self._breakpoints:
+            return
+        self.set_breakpoint(line_no)
+        self._temp_breakpoint = line_no
 
-        def consume_token(self):
-            cur_token = self._token
-            if self._token is not None and self._token.type == "LINEBREAK":
-                self._line += 1
+    @_session_command
+    def run_and_stop_at_first_line(self):
+        if self._structure is not None:
+            # set a temporary breakpoint in the first line of the root macro
             try:
-                self._token = self._lexer.__next__()
-            except:
-                self._token = None
-            return cur_token
-
-        def skip_whitespaces(self):
-            while self._token.type in ("SPACE", "TAB", "LINEBREAK"):
-                self.consume_token()
-
-        def consume_non_whitespace_token(self):
-            self.skip_whitespaces()
-            return self.consume_token()
-
-        def consume_until_value(self, value):
-            while self.has_token():
-                if self._token.val == value:
-                    return
-                self.consume_token()
-
-        def consume_until(self, ttype):
-            while self.has_token():
-                if self._token.type == ttype:
-                    return
-                self.consume_token()
+                self._set_temp_breakpoint(self._structure.root_first_line)
+            except DebuggerErrorMessage:
+                pass
 
-        def peek_token(self):
-            return self._token
+        # run
+        self.run()
 
-    def run_and_stop_at_first_line(self):
-        # determine first line of root macro
-        source = self.get_program_code()
-        tokenizer = self.StatefulTokenizer(source)
-
-        while tokenizer.has_token():
-            token = tokenizer.consume_non_whitespace_token()
-
-            if token.type == "ENTER_COMMENT":
-                tokenizer.consume_until("LINEBREAK")
-            if token.val == "def":
-                tokenizer.consume_until_value("enddef")
-            elif token.val in ("in", "out", "aux"):
-                tokenizer.consume_non_whitespace_token() # colon
-                tokenizer.consume_non_whitespace_token() # first parameter
-                while tokenizer.peek_token().val == ",":
-                    tokenizer.consume_non_whitespace_token() # comma
-                    tokenizer.consume_non_whitespace_token() # next parameter
-            elif token.type == "IDENTIFIER":
-                break
+    # Resumes the execution until line_no is reached, or any other breakpoint.
+    # Fails with an DebuggerErrorMessage Exception, if line_no is not valid.
+    @_session_command
+    def run_to_line(self, line_no):
+        self._stop_multi_step()
+        self._set_temp_breakpoint(line_no)
+        if self._last_state is DebuggerState.NOTSTARTED:
+            self.run()
+        else:
+            self.resume()
+
+    # Executes count step commands without reporting the intermediate states
+    @_session_command
+    def step_n(self, count, cmd="stepover"):
+        return self._start_multi_step(lambda stacktrace: False, count, cmd)
+
+    # Steps over statements, until the value of the variable ident in the
+    # current frame changes or the current frame returns.
+    @_session_command
+    def run_until_variable_changes(self, ident):
+        stacktrace = self._last_stacktrace
+        if self._last_state is not DebuggerState.PAUSED or stacktrace is None:
+            return False
+        depth = len(stacktrace)
+        value = self._binding_value(stacktrace, 0, ident)
+
+        def changed(stacktrace):
+            return len(stacktrace) < depth or (len(stacktrace) == depth and
+                                               self._binding_value(stacktrace, 0, ident) != value)
+        return self._start_multi_step(changed)
+
+    # Steps over statements, until the body of the loop, that contains the
+    # current line, has been entered count times. If the execution is paused
+    # at the head of a loop that has not been entered yet, this is iteration
+    # count of the loop. Stops as well, if the loop is left.
+    @_session_command
+    def run_until_iteration(self, count):
+        stacktrace = self._last_stacktrace
+        if self._last_state is not DebuggerState.PAUSED or stacktrace is None or self._structure is None:
+            return False
+        depth = len(stacktrace)
+        loop = self._structure.innermost_loop(stacktrace[0]["line"])
+        if loop is None or loop.first_line is None:
+            raise DebuggingException("Line " + str(stacktrace[0]["line"]) + " is not inside a loop.")
+        iterations = [0]
+
+        def reached(stacktrace):
+            if len(stacktrace) < depth:
+                return True
+            if len(stacktrace) > depth:
+                return False
+            line_no = stacktrace[0]["line"]
+            if line_no == loop.first_line:
+                iterations[0] += 1
+            return iterations[0] >= count or not loop.contains(line_no)
+        return self._start_multi_step(reached)
+
+    # Returns the full value of the variable ident in the frame with the
+    # given index, big values are compared by their full decimal strings
+    # instead of their previews (see Stacktrace.binding_value())
+    @staticmethod
+    def _binding_value(stacktrace, frame_index, ident):
+        try:
+            return binding_value(stacktrace, frame_index, ident)
+        except KeyError:
+            raise DebuggingException("Unknown variable " + ident + " in macro "
+                                     + stacktrace[frame_index]["macro"] + ".")
+
+    # Sends step commands cmd to the debugger process until
+    # stop_condition(stacktrace) is True for the stacktrace after a step, or
+    # max_steps steps have been executed. The steps are sent by the session
+    # thread as the responses arrive (see _continue_multi_step()).
+    # Returns False, if the execution is not paused.
+    def _start_multi_step(self, stop_condition, max_steps=MAX_MULTI_STEPS, cmd="stepover"):
+        self._stop_multi_step()
+        with self._cond:
+            # the live state of the debugger process is continued
+            self._trace_pos = None
+            if self._last_state is not DebuggerState.PAUSED:
+                return False
+            self._multi_step = (stop_condition, max_steps, cmd)
+            self._multi_step_active = True
+        self._continue_multi_step(first=True)
+        return True
 
-        # set a temporary breakpoint
-        self._start_line = tokenizer.cur_line()
+    # Sends the next step command of the running multi-step command, or
+    # stops it if the last step reached its end
+    def _continue_multi_step(self, first=False):
+        stop_condition, remaining, cmd = self._multi_step
+        stacktrace = self._last_stacktrace
         try:
-            self.set_breakpoint(self._start_line)
-        except DebuggerErrorMessage:
-            # if a breakpoint has already been set manually in this line,
-            # there is nothing to do in this method.
-            self._start_line = -1
+            done = (remaining == 0 or self._last_state is not DebuggerState.PAUSED or
+                    (not first and (stacktrace is None or stop_condition(stacktrace))))
+        except Exception:
+            logger.error("_continue_multi_step(): " + traceback.format_exc())
+            done = True
+        if done:
+            self._stop_multi_step()
+            return
+        self._multi_step = (stop_condition, remaining - 1, cmd)
+        with self._cond:
+            self._last_state = DebuggerState.RUNNING
+            self._step_sent_time = time.monotonic()
+        self._send_cmd(cmd)
 
-        # run
-        self.run()
+    # stops a running multi-step command, its current step is still executed
+    def _stop_multi_step(self):
+        if self._multi_step is None:
+            return
+        with self._cond:
+            self._multi_step = None
+            self._multi_step_active = False
+            self._cond.notify_all()
+        self._notify_observers()
+
+    # waits until a multi-step command has been executed completely
+    def wait_for_multi_step(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._multi_step_active, timeout)
 
     @staticmethod
     def parse_debugger_output(debugger_output):
+        m = _telegram_regex.match(debugger_output)
+        if m is None:
+            # error messages and anything unexpected
+            return Debugger._parse_debugger_output_lexer(debugger_output)
+        json_str = m.group(4)
+        if json_str is None:
+            return DebuggerTelegram(TelegramType(int(m.group(1))), int(m.group(2)), int(m.group(3)), None)
+        data, raw_data, big_values = _load_stacktrace(json_str)
+        return DebuggerTelegram(TelegramType(int(m.group(1))), int(m.group(2)), int(m.group(3)),
+                                data, raw_data, big_values)
+
+    # Generic parser for all kinds of debugger output, used if the fast path
+    # in parse_debugger_output() does not match.
+    @staticmethod
+    def _parse_debugger_output_lexer(debugger_output):
         lexer = Lexer(_lexer_rules, True)
         lexer.input(debugger_output)
         token = lexer.token()
@@ -378,11 +1108,12 @@ class Debugger(Session):
             token = lexer.token()
             if token.type == 'JSON_STR':
                 #parse json
-                json_str = token.val[:len(token.val)-1]
-                data = json.loads(json_str)
+                data, json_str, big_values = _load_stacktrace(token.val[:len(token.val)-1])
             else:
+                json_str = None
                 data = None
-            return DebuggerTelegram(ttype, line_no, breakpoint_no, data)
+                big_values = None
+            return DebuggerTelegram(ttype, line_no, breakpoint_no, data, json_str, big_values)
         elif token.type == 'STR':
             raise DebuggerErrorMessage(token.val)
         else:
@@ -399,4 +1130,4 @@ class Debugger(Session):
         return True
 
     def get_file_descriptors(self):
-        return [self._conn.fileno(), self._proc.stdout.fileno()]
+        return [self._notify_r, self._proc.stdout.fileno()]
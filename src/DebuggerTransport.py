@@ -0,0 +1,83 @@
+#  DebuggerTransport.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module provides the connection between the server and lwre
+#  debugger processes: the debugger process connects to a listening socket
+#  on a port out of the range [10000, 20000]. lwre only accepts a TCP port
+#  to connect to, so there is no transport via an inherited socket.
+#
+#  Each transport object is owned by one Debugger session and provides
+#    get_command(executable, input_file_path)  returns the command line for
+#                                              the (next) debugger process
+#    accept(proc)                              returns the connection to proc, or
+#                                              None if proc terminated or failed to
+#                                              connect in time
+#    close()                                   releases all resources
+
+import socket
+import time
+import subprocess
+from select import select
+
+from SocketManager import SocketManager
+import ReportGenerator
+
+_socket_manager = SocketManager(10000, 20000)
+
+# time a debugger process, that has written to stdout before connecting,
+# is given to terminate, before its output is considered as regular output
+_EXIT_WAIT = 0.05
+
+
+class TcpTransport:
+    def __init__(self, accept_timeout):
+        # socket to listen for debugger process
+        self._socket = _socket_manager.create_socket()
+        self._socket.settimeout(accept_timeout)
+        self._accept_timeout = accept_timeout
+
+    def get_command(self, executable, input_file_path):
+        return [executable, "-d", "-port", str(self._socket.get_port_no()), input_file_path]
+
+    # Waits for the connection and the output of proc at the same time: in
+    # case of syntax errors, the debugger process prints an error message
+    # and terminates immediately, so there is no need to wait for the timeout.
+    def accept(self, proc):
+        deadline = time.monotonic() + self._accept_timeout
+        watched = [self._socket, proc.stdout]
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            r, _, _ = select(watched, [], [], remaining)
+            if self._socket in r:
+                try:
+                    conn, _ = self._socket.accept()
+                    return conn
+                except socket.timeout:
+                    return None
+            if proc.stdout in r:
+                try:
+                    proc.wait(_EXIT_WAIT)
+                    return None
+                except subprocess.TimeoutExpired:
+                    # still running, only wait for the connection
+                    watched = [self._socket]
+
+    # returns the port number to the SocketManager and writes the occupancy
+    # of the port range to the report, may be called several times
+    def close(self):
+        if self._socket is not None:
+            _socket_manager.release_socket(self._socket)
+            self._socket = None
+            ReportGenerator.logDebugPorts(get_port_metrics())
+
+
+def create_transport(accept_timeout):
+    return TcpTransport(accept_timeout)
+
+# Returns the occupancy metrics of the port range used by the tcp transport
+def get_port_metrics():
+    return _socket_manager.get_metrics()
@@ -16,13 +16,23 @@ import Logging
 logger = Logging.get_logger(__name__)
 
 class DebuggerSourceCodeView(SourceCodeView):
+    # If breakpoint_lines is given, breakpoints can only be set in these lines.
+    # The lines in breakpoints are marked as having a breakpoint set already.
+    def __init__(self, breakpoint_lines=None, breakpoints=()):
+        self._breakpoint_lines = breakpoint_lines
+        self._breakpoints = breakpoints
+
     def begin_row_hook(self, linecount):
+        if self._breakpoint_lines is None or linecount in self._breakpoint_lines:
+            onclick = " onclick=\"breakpoint_action(&quot;dot" + str(linecount) + "&quot;);\""
+        else:
+            onclick = ""
+        dot = "reddot.png" if linecount in self._breakpoints else "transparentdot.png"
         return "<tr><td class=\"debuggerCodeViewLineNo\">&nbsp;"\
                + str(linecount) + "</td>"\
                + "<td class=\"debuggerCodeViewSide\">"\
-               + "&nbsp;<img src=\"/img/transparentdot.png\" width=\"10px\" length=\"10px\" id=\"dot"\
-               + str(linecount) + "\" onclick=\"breakpoint_action(&quot;dot"\
-               + str(linecount) + "&quot;);\" />&nbsp;</td><td id=\"line" + str(linecount)+ "\">"
+               + "&nbsp;<img src=\"/img/" + dot + "\" width=\"10px\" length=\"10px\" id=\"dot"\
+               + str(linecount) + "\"" + onclick + " />&nbsp;</td><td id=\"line" + str(linecount)+ "\">"
 
     def end_row_hook(self, linecount):
         return "</td></tr>"
@@ -35,11 +45,14 @@ class DebuggerSourceCodeView(SourceCodeView):
 
 
 class DebuggerView(dict):
-    def __init__(self, code, ws_host):
+    # trace_recording is True, if the session records an execution trace,
+    # only then the step back button is shown
+    def __init__(self, code, ws_host, breakpoint_lines=None, breakpoints=(), trace_recording=False):
         self["current_mode"] = "debugger"
         self["ws_host"] = ws_host
+        self["trace_recording"] = trace_recording
         try:
-            self["debugger_view_content"] = Markup(DebuggerSourceCodeView().get_source_code_view(code))
+            self["debugger_view_content"] = Markup(DebuggerSourceCodeView(breakpoint_lines, breakpoints).get_source_code_view(code))
         except LexerError as e:
             escaped = code[max(0,e.pos-10): min(len(code), e.pos+10)].replace("\n", " ")
             escaped = escaped.replace("\r", " ").replace("\t", " ")
@@ -0,0 +1,345 @@
+#  Evaluator.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module evaluates Loop/While programs in process, which avoids
+#  starting an lwre process for short runs. A program is compiled to a
+#  compact bytecode and executed with a budget of steps and of bits per
+#  value. Programs, that exceed the budget, need interactive input or can
+#  not be evaluated for other reasons, are left to an Interpreter session.
+#
+#  Evaluations are run in a pool of worker processes (see set_workers()),
+#  so that they neither block the server nor are limited by its GIL. The
+#  pool is disabled by default.
+
+import concurrent.futures
+import multiprocessing
+import operator
+import traceback
+
+from LoopWhileParser import (parse, ParserError, Assignment, Loop, While, If, Variable,
+                             BinaryOperation, Builtin, MacroCall)
+import Logging
+
+logger = Logging.get_logger(__name__)
+
+# maximal number of executed instructions of a program
+MAX_STEPS = 100000
+# maximal size of a value in bits. Larger values are left to lwre, since
+# Python converts integers with more than sys.get_int_max_str_digits()
+# digits not to strings (see Stacktrace.PREVIEW_DIGITS)
+MAX_BITS = 4096
+# maximal time (in seconds) to wait for the result of a worker process
+EVALUATION_TIMEOUT = 1.0
+
+# Opcodes of the bytecode. Each instruction is a tuple of an opcode and its
+# operands, variables and constants are addressed by their slot in the
+# frame of the macro.
+OP_COPY = 0         # (OP_COPY, target, source)
+OP_BINARY = 1       # (OP_BINARY, target, function, left, right)
+OP_UNARY = 2        # (OP_UNARY, target, function, operand)
+OP_CALL = 3         # (OP_CALL, target, macro index, argument slots)
+OP_JUMP_ZERO = 4    # (OP_JUMP_ZERO, slot, address), jumps if the slot is 0
+OP_JUMP = 5         # (OP_JUMP, address)
+OP_LOOP_INIT = 6    # (OP_LOOP_INIT, counter, slot), the loop count is read once
+OP_LOOP_NEXT = 7    # (OP_LOOP_NEXT, counter, address), jumps if the counter is 0,
+                    # otherwise decrements it
+
+def _sub(left, right):
+    return left - right if left > right else 0
+
+def _div(left, right):
+    return left // right if right != 0 else 0
+
+def _mod(left, right):
+    return left % right if right != 0 else 0
+
+def _compare(function):
+    return lambda left, right: 1 if function(left, right) else 0
+
+# semantics of the operators of lwre, all values are naturals
+_BINARY_FUNCTIONS = {
+    "+": operator.add,
+    "-": _sub,
+    "*": operator.mul,
+    "div": _div,
+    "mod": _mod,
+    "==": _compare(operator.eq),
+    "!=": _compare(operator.ne),
+    "<": _compare(operator.lt),
+    "<=": _compare(operator.le),
+    ">": _compare(operator.gt),
+    ">=": _compare(operator.ge),
+}
+
+_UNARY_FUNCTIONS = {
+    "succ": lambda value: value + 1,
+    "pred": lambda value: value - 1 if value > 0 else 0,
+}
+
+
+# raised, if a program can not be evaluated in process
+class NotEvaluable(Exception):
+    pass
+
+# raised, if an execution exceeds its budget
+class BudgetExceeded(NotEvaluable):
+    pass
+
+
+# Bytecode of a single macro
+class _CompiledMacro:
+    def __init__(self, macro, macro_indices):
+        self._macro_indices = macro_indices
+        self._slots = {}
+        # initial values of the slots, constants are stored in slots as well
+        self.frame = []
+        for declaration in macro.declarations():
+            self._slots.setdefault(declaration.name, len(self.frame))
+            self.frame.append(0)
+        self.input_slots = [self._slots[declaration.name] for declaration in macro.inputs]
+        # None for a macro without output variable, lwre panics when it is called
+        self.output_slot = self._slots[macro.outputs[0].name] if macro.outputs else None
+        self.max_constant_bits = 0
+        self.code = []
+        self._compile_statements(macro.body)
+
+    def _new_slot(self, value=0):
+        self.frame.append(value)
+        return len(self.frame) - 1
+
+    def _slot(self, operand):
+        if isinstance(operand, Variable):
+            return self._slots[operand.name]
+        self.max_constant_bits = max(self.max_constant_bits, operand.value.bit_length())
+        return self._new_slot(operand.value)
+
+    def _compile_statements(self, statements):
+        for statement in statements:
+            if isinstance(statement, Assignment):
+                self._compile_assignment(statement)
+            elif isinstance(statement, Loop):
+                counter = self._new_slot()
+                self.code.append((OP_LOOP_INIT, counter, self._slot(statement.variable)))
+                start = len(self.code)
+                self.code.append(None)
+                self._compile_statements(statement.body)
+                self.code.append((OP_JUMP, start))
+                self.code[start] = (OP_LOOP_NEXT, counter, len(self.code))
+            elif isinstance(statement, While):
+                self._check_condition(statement)
+                start = len(self.code)
+                self.code.append(None)
+                self._compile_statements(statement.body)
+                self.code.append((OP_JUMP, start))
+                self.code[start] = (OP_JUMP_ZERO, self._slot(statement.variable), len(self.code))
+            elif isinstance(statement, If):
+                self._check_condition(statement)
+                branch = len(self.code)
+                self.code.append(None)
+                self._compile_statements(statement.then_body)
+                if statement.else_body is not None:
+                    jump = len(self.code)
+                    self.code.append(None)
+                    self.code[branch] = (OP_JUMP_ZERO, self._slot(statement.variable), len(self.code))
+                    self._compile_statements(statement.else_body)
+                    self.code[jump] = (OP_JUMP, len(self.code))
+                else:
+                    self.code[branch] = (OP_JUMP_ZERO, self._slot(statement.variable), len(self.code))
+
+    @staticmethod
+    def _check_condition(statement):
+        # the parser accepts other values, if lwre reports no error itself
+        if statement.value != 0:
+            raise NotEvaluable("condition with value " + str(statement.value))
+
+    def _compile_assignment(self, statement):
+        target = self._slots[statement.target.name]
+        expression = statement.expression
+        if isinstance(expression, BinaryOperation):
+            self.code.append((OP_BINARY, target, _BINARY_FUNCTIONS[expression.operator],
+                              self._slot(expression.left), self._slot(expression.right)))
+        elif isinstance(expression, Builtin):
+            self.code.append((OP_UNARY, target, _UNARY_FUNCTIONS[expression.name],
+                              self._slot(expression.operand)))
+        elif isinstance(expression, MacroCall):
+            self.code.append((OP_CALL, target, self._macro_indices[expression.name],
+                              [self._slot(argument) for argument in expression.arguments]))
+        else:
+            self.code.append((OP_COPY, target, self._slot(expression)))
+
+
+# A Loop/While program compiled to bytecode
+class CompiledProgram:
+    # Raises a ParserError, if source is invalid, or NotEvaluable
+    def __init__(self, source):
+        program = parse(source)
+        if program.root is None:
+            raise NotEvaluable("program without root macro")
+        # the first definition of a macro is used, the root macro is last
+        definitions = {}
+        for macro in program.macros:
+            definitions.setdefault(macro.name, macro)
+        macros = list(definitions.values()) + [program.root]
+        macro_indices = {macro.name: i for i, macro in enumerate(macros)}
+        self._macros = [_CompiledMacro(macro, macro_indices) for macro in macros]
+        if any(self._macros[instruction[2]].output_slot is None
+               for macro in self._macros for instruction in macro.code if instruction[0] == OP_CALL):
+            raise NotEvaluable("call of a macro without output variable")
+        if self._macros[-1].output_slot is None:
+            raise NotEvaluable("root macro without output variable")
+        self._max_constant_bits = max(macro.max_constant_bits for macro in self._macros)
+        self.input_names = [declaration.name for declaration in program.root.inputs]
+        self.output_name = program.root.outputs[0].name
+
+    #
+    #  name: execute
+    #  @param
+    #    inputs values of the input variables of the root macro
+    #    max_steps maximal number of executed instructions
+    #    max_bits maximal number of bits of each value
+    #  @return the value of the output variable of the root macro
+    #
+    #  Raises BudgetExceeded, if the execution exceeds one of the limits.
+    #
+    def execute(self, inputs=(), max_steps=MAX_STEPS, max_bits=MAX_BITS):
+        if len(inputs) != len(self.input_names):
+            raise ValueError("expected " + str(len(self.input_names)) + " input values")
+        if any(value.bit_length() > max_bits for value in inputs) or self._max_constant_bits > max_bits:
+            raise BudgetExceeded("value exceeds " + str(max_bits) + " bits")
+        root = self._macros[-1]
+        macro = root
+        frame = list(root.frame)
+        for slot, value in zip(root.input_slots, inputs):
+            frame[slot] = value
+        code = macro.code
+        pc = 0
+        # (macro, frame, pc, target slot) of the calling macros
+        stack = []
+        steps = 0
+        while True:
+            if pc == len(code):
+                if not stack:
+                    return frame[macro.output_slot]
+                value = frame[macro.output_slot]
+                macro, frame, pc, target = stack.pop()
+                frame[target] = value
+                code = macro.code
+                continue
+            steps += 1
+            if steps > max_steps:
+                raise BudgetExceeded("more than " + str(max_steps) + " steps")
+            instruction = code[pc]
+            pc += 1
+            op = instruction[0]
+            if op == OP_BINARY:
+                value = instruction[2](frame[instruction[3]], frame[instruction[4]])
+                if value.bit_length() > max_bits:
+                    raise BudgetExceeded("value exceeds " + str(max_bits) + " bits")
+                frame[instruction[1]] = value
+            elif op == OP_COPY:
+                frame[instruction[1]] = frame[instruction[2]]
+            elif op == OP_LOOP_NEXT:
+                if frame[instruction[1]] == 0:
+                    pc = instruction[2]
+                else:
+                    frame[instruction[1]] -= 1
+            elif op == OP_JUMP:
+                pc = instruction[1]
+            elif op == OP_JUMP_ZERO:
+                if frame[instruction[1]] == 0:
+                    pc = instruction[2]
+            elif op == OP_UNARY:
+                value = instruction[2](frame[instruction[3]])
+                if value.bit_length() > max_bits:
+                    raise BudgetExceeded("value exceeds " + str(max_bits) + " bits")
+                frame[instruction[1]] = value
+            elif op == OP_LOOP_INIT:
+                frame[instruction[1]] = frame[instruction[2]]
+            else:
+                # OP_CALL, the arguments are passed by value
+                callee = self._macros[instruction[2]]
+                callee_frame = list(callee.frame)
+                for slot, argument in zip(callee.input_slots, instruction[3]):
+                    callee_frame[slot] = frame[argument]
+                stack.append((macro, frame, pc, instruction[1]))
+                macro, frame, code, pc = callee, callee_frame, callee.code, 0
+
+    # returns the output of lwre for the given output value
+    def format_output(self, value):
+        return self.output_name + ": " + str(value) + "\n"
+
+
+#
+#  name: evaluate
+#  @param
+#    source Loop/While source code
+#  @return the output of lwre for source, or None if source can not be
+#          evaluated in process
+#
+#  Programs with input variables are not evaluated, since lwre reads their
+#  values interactively.
+#
+def evaluate(source, max_steps=MAX_STEPS, max_bits=MAX_BITS):
+    try:
+        program = CompiledProgram(source)
+        if program.input_names:
+            return None
+        return program.format_output(program.execute((), max_steps, max_bits))
+    except (ParserError, NotEvaluable, RecursionError):
+        return None
+
+
+_pool = None
+_workers = 0
+
+# Sets the number of worker processes, 0 disables in process evaluation.
+# Should be called before the server starts, waits until the pool is
+# started, since this takes longer than EVALUATION_TIMEOUT.
+def set_workers(workers):
+    global _pool, _workers
+    if workers < 0:
+        raise ValueError("Invalid number of evaluator workers: " + str(workers))
+    shutdown()
+    _workers = workers
+    if workers > 0:
+        _pool = _create_pool()
+        _pool.submit(evaluate, "").result()
+
+def _create_pool():
+    # the worker processes are forked by a server process, which imports
+    # only this module, instead of forking the multithreaded server
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return concurrent.futures.ProcessPoolExecutor(_workers, mp_context=context)
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+#
+#  name: run
+#  @param
+#    source Loop/While source code
+#  @return the output of lwre for source, or None if source has to be run
+#          by lwre, e.g. if in process evaluation is disabled
+#
+def run(source):
+    global _pool
+    pool = _pool
+    if pool is None:
+        return None
+    try:
+        return pool.submit(evaluate, source).result(EVALUATION_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        logger.info("run(): evaluation timed out")
+    except concurrent.futures.process.BrokenProcessPool:
+        logger.error("run(): worker pool broken, creating a new one")
+        if _pool is pool:
+            _pool = _create_pool()
+    except Exception:
+        logger.error("run(): Exception: " + traceback.format_exc())
+    return None
@@ -0,0 +1,71 @@
+#  EventLog.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module provides a bounded log of sequence-numbered update messages.
+#  It enables a WebSocket client to resume the update stream of a session
+#  after its connection dropped, without losing any message.
+
+import threading
+import json
+from collections import deque
+
+# Default limits for the number of messages and the total size of all
+# messages (in bytes) that are kept in the log
+DEFAULT_MAX_EVENTS = 256
+DEFAULT_MAX_BYTES = 1024*1024
+
+class EventLog:
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS, max_bytes=DEFAULT_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._max_events = max_events
+        self._max_bytes = max_bytes
+        # deque of tuples (seq, message)
+        self._events = deque()
+        self._size = 0
+        self._next_seq = 0
+
+    # Assigns the next sequence number to event (a dict), which is stored
+    # as "seq" entry in the event. Returns the JSON encoded event as bytes.
+    def append(self, event):
+        return self.append_encoded(json.dumps(event))
+
+    # Like append(), but for an event that is already JSON encoded (a str
+    # containing a JSON object), so it does not need to be encoded again.
+    # The "seq" entry is appended to the encoded object.
+    def append_encoded(self, encoded_event):
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            body = encoded_event[:-1]
+            message = (body + ("" if body == "{" else ", ") + "\"seq\": " + str(seq) + "}").encode("UTF8")
+            self._events.append((seq, message))
+            self._size += len(message)
+            # always keep the most recent message, even if it is too big
+            while len(self._events) > 1 and (len(self._events) > self._max_events
+                                             or self._size > self._max_bytes):
+                _, dropped = self._events.popleft()
+                self._size -= len(dropped)
+            return message
+
+    # Returns a list with all logged messages having a sequence number
+    # greater than last_seq, in ascending order. If some of these messages
+    # have already been dropped from the log, only the remaining ones are
+    # returned.
+    def replay(self, last_seq):
+        with self._lock:
+            return [message for seq, message in self._events if seq > last_seq]
+
+    # Returns True, if all messages following last_seq are still in the log
+    def is_complete_since(self, last_seq):
+        with self._lock:
+            if len(self._events) == 0:
+                return last_seq >= self._next_seq - 1
+            return self._events[0][0] <= last_seq + 1
+
+    # Returns the sequence number of the last message or -1, if no message
+    # has been appended so far
+    def last_seq(self):
+        with self._lock:
+            return self._next_seq - 1
@@ -7,59 +7,150 @@
 
 from select import select
 import socket
-import os
+import codecs
+import threading
+import time
 
 
-#  
-#  name: read_timeout
-#  @param
-#    stream stream from which we want to read
-#    timeout timeout in seconds
-#  @return string
-#  
-def read_timeout(stream, timeout):
-    r1, r2, r3 = select([stream], [], [stream], timeout)
-    result = "".encode()
-    if stream in r1 + r2 + r3:
-        fileno = stream.fileno()
-        result += os.read(fileno, 512)
-    
-    return result.decode()
+# Reads the output of a child process from a non-blocking pipe (e.g. the
+# stdout of a Popen object). Data is read via readinto() into a
+# preallocated buffer and decoded by an incremental UTF-8 decoder, so
+# multi-byte characters may be split across several reads. At most
+# MAX_READ_SIZE bytes are read per call, the rest stays in the pipe, such
+# that the output of a process is not buffered faster than it is sent.
+class StreamReader:
+    BUFFER_SIZE = 65536
+    MAX_READ_SIZE = 4 * BUFFER_SIZE
+
+    def __init__(self, stream):
+        # readinto() of buffered streams does not support non-blocking IO
+        self._raw = getattr(stream, "raw", stream)
+        self._fd = stream.fileno()
+        self._buffer = memoryview(bytearray(self.BUFFER_SIZE))
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._lock = threading.Lock()
+        # True, as soon as the end of the stream has been reached
+        self.eof = False
+
+    # Returns the data available without blocking, at most MAX_READ_SIZE
+    # bytes. If timeout (in seconds)
+    # is given and no data is available, waits until data arrives or the
+    # timeout expires.
+    def read(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                text = self._drain()
+            if text != "" or self.eof or deadline is None:
+                return text
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return text
+            select([self._fd], [], [], remaining)
+
+    # reads until the pipe is empty or MAX_READ_SIZE bytes have been read,
+    # must be called with _lock held
+    def _drain(self):
+        parts = []
+        remaining = self.MAX_READ_SIZE
+        while not self.eof and remaining > 0:
+            count = self._raw.readinto(self._buffer[:min(self.BUFFER_SIZE, remaining)])
+            if count is None:
+                # EAGAIN
+                break
+            if count == 0:
+                self.eof = True
+                parts.append(self._decoder.decode(b"", final=True))
+            else:
+                parts.append(self._decoder.decode(self._buffer[:count]))
+                remaining -= count
+        return "".join(parts)
 
 class ConnectionClosed(Exception):
     def __init__(self):
         super().__init__("Try to read from a closed connection.")
 
-# NOTE: using this methods is unsafe in the sence that the methods
-# will read possibly infinitly many bytes from the sender
+class LineTooLong(Exception):
+    def __init__(self, max_line_size):
+        super().__init__("Received line exceeds the maximum size of " + str(max_line_size) + " bytes.")
+
+# maximum size of a line (in bytes, without delimiter) received by a LineBuffer
+DEFAULT_MAX_LINE_SIZE = 64*1024*1024
+
+# Reads lines from a non-blocking socket. Received bytes are collected in a
+# bytearray, that is only searched for the delimiter once, and each line is
+# decoded as a whole, such that multi-byte UTF-8 characters may be split
+# across several recv() calls.
 class LineBuffer:
-    def __init__(self, stream, delimiter = "\n"):
-        self._line_buffer = ""
+    RECV_SIZE = 65536
+
+    def __init__(self, stream, delimiter = "\n", max_line_size=DEFAULT_MAX_LINE_SIZE):
         self.DELIMITER = delimiter
+        self._delimiter = delimiter.encode()
+        self._max_line_size = max_line_size
+        # received bytes, that do not belong to a returned line yet
+        self._buffer = bytearray()
+        # _buffer does not contain the delimiter before this position
+        self._scanned = 0
+        # True, while the rest of a line exceeding max_line_size is skipped
+        self._discarding = False
+        self._chunk = memoryview(bytearray(self.RECV_SIZE))
         self._conn = stream
         self._conn.setblocking(0)
         self._closed = False
 
     # Polls the underlying stream for a entire line, ended by delimiter.
-    # Returns the line without the delimiter or None if no entire 
-    # line is available.
+    # Returns the line without the delimiter or None if no entire
+    # line is available. Raises LineTooLong once for each line exceeding
+    # max_line_size, that is skipped.
     def poll_line(self):
-        nl_pos = self._line_buffer.find(self.DELIMITER)
-        while not self._closed:
-            try:
-                response = self._conn.recv(1024).decode()
-                self._line_buffer += response
-                nl_pos = self._line_buffer.find(self.DELIMITER)
-                if response == "":
-                    # connection has been closed
-                    self._closed = True
-                    break
-            except socket.error:
-                break
-        if nl_pos != -1:
-            first_line = self._line_buffer[:nl_pos]
-            self._line_buffer = self._line_buffer[nl_pos+len(self.DELIMITER):]
-            return first_line
-        elif self._closed:
-            raise ConnectionClosed()
-        return None
+        while True:
+            line = self._next_line()
+            if line is not None:
+                return line
+            if self._closed:
+                raise ConnectionClosed()
+            if not self._receive() and not self._closed:
+                return None
+
+    # reads the available bytes, returns False if there are none
+    def _receive(self):
+        try:
+            count = self._conn.recv_into(self._chunk)
+        except socket.error:
+            return False
+        if count == 0:
+            # connection has been closed
+            self._closed = True
+            return False
+        self._buffer += self._chunk[:count]
+        return True
+
+    def _next_line(self):
+        pos = self._buffer.find(self._delimiter, self._scanned)
+        if pos == -1:
+            if self._discarding:
+                self._consume(max(0, len(self._buffer) - len(self._delimiter) + 1))
+            elif len(self._buffer) > self._max_line_size:
+                self._discarding = True
+                self._consume(len(self._buffer))
+                raise LineTooLong(self._max_line_size)
+            else:
+                self._scanned = max(0, len(self._buffer) - len(self._delimiter) + 1)
+            return None
+        if self._discarding:
+            self._discarding = False
+            self._consume(pos + len(self._delimiter))
+            return self._next_line()
+        if pos > self._max_line_size:
+            self._consume(pos + len(self._delimiter))
+            raise LineTooLong(self._max_line_size)
+        with memoryview(self._buffer) as view:
+            line = str(view[:pos], "utf-8", "replace")
+        self._consume(pos + len(self._delimiter))
+        return line
+
+    # removes the first count bytes, this is cheap for bytearrays
+    def _consume(self, count):
+        del self._buffer[:count]
+        self._scanned = 0
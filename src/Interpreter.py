@@ -24,8 +24,12 @@ class Interpreter(Session):
             if self._proc is not None:
                 self._kill()
 
+    # The session is running until the output of the terminated process has
+    # been read completely, since each read is limited (see StreamReader)
     def get_status(self):
-        if self._proc != None and self._proc.poll() is None:
+        proc = self._proc
+        reader = self._output_reader
+        if proc != None and (proc.poll() is None or (reader is not None and not reader.eof)):
             return "running"
         else:
             return "terminated"
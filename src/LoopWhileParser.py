@@ -0,0 +1,650 @@
+#  LoopWhileParser.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module provides a parser for Loop/While programs, that builds an
+#  abstract syntax tree and detects the same errors as lwre does at compile
+#  time, with messages in the same format. This allows rejecting invalid
+#  programs without starting an lwre process.
+#
+#  Programs, for which lwre itself does not report an error message (an
+#  empty program or a program without root macro), are accepted and left
+#  to lwre.
+
+import time
+
+from external_libs.lexer import Lexer, LexerError
+from DebuggerExceptions import CompilerErrorMessage
+from SourceCodeView import _lexer_rules
+
+
+# Rules that take precedence over the rules of SourceCodeView, since lwre
+# reads declarations and language constraints as a single token and
+# identifiers and numbers consist of ASCII characters only
+_parser_lexer_rules = [
+    ('//[^\n]*',                   'COMMENT'),
+    ('(in|out|aux):',              'DECLARATION'),
+    ('#(LOOP|WHILE)',              'LANGUAGE'),
+    ('[a-zA-Z_][a-zA-Z0-9_]*',     'WORD'),
+    ('[0-9]+',                     'INTEGER'),
+    ('<=|>=',                      'OPERATOR'),
+    ('\n',                         'NEWLINE'),
+    ('[ \t\r\f\v]+',               'WHITESPACE'),
+] + _lexer_rules
+
+_KEYWORDS = frozenset(("def", "enddef", "loop", "while", "do", "enddo", "if", "then",
+                       "else", "endif", "succ", "pred", "div", "mod"))
+
+# the operators of binary operations, div and mod are keywords
+_BINARY_OPERATORS = frozenset(("+", "-", "*", "div", "mod", "==", "!=", "<", "<=", ">", ">="))
+
+# token types of the rules of SourceCodeView, that lwre accepts. Any other
+# token is unrecognised
+_SYMBOL_TYPES = frozenset(('OPERATOR', 'LP', 'RP', 'SEMICOLON', 'ASSIGNMENT'))
+
+# Token types used by the parser. Keywords, operators and symbols have
+# their text as type
+IDENTIFIER = "identifier"
+INTEGER = "integer"
+DECLARATION = "declaration"
+LANGUAGE = "language constraint"
+END = "$end"
+UNRECOGNISED = "unrecognised"
+
+# hints, that lwre appends to some messages about unexpected tokens
+_COMMA_HINT = ", expected ','"
+_SEMICOLON_HINT = ", expected ';'"
+_CONDITION_HINT = ", expected condition '<identifier> != 0'"
+_LOOP_HINT = ", expected <identifier> as loop condition"
+_DO_HINT = ", expected do."
+_THEN_HINT = ", expected then"
+_ENDDEF_HINT = ", missing enddef?"
+
+# names of the kinds of declarations in error messages
+_DECLARATION_KINDS = {"in:": "input", "out:": "output", "aux:": "auxiliary"}
+
+
+class ParserError(CompilerErrorMessage):
+    #
+    #  name: ParserError
+    #  @param
+    #    msg the error message without position
+    #    line line of the error (starting at 1)
+    #    pos column of the error (starting at 1) or None, if the message
+    #        does not refer to a token
+    #    source_line the text of the line of the error or None
+    #    details further lines of the message
+    #
+    def __init__(self, msg, line=None, pos=None, source_line=None, details=()):
+        super().__init__(msg)
+        self.line = line
+        self.pos = pos
+        self.source_line = source_line
+        self.details = list(details)
+
+    # returns the lines of the message as lwre prints them, without time stamps
+    def get_lines(self):
+        if self.pos is None:
+            return [self.error_msg] + self.details
+        return [self.error_msg + " in line " + str(self.line) + ", pos " + str(self.pos) + ".",
+                self.source_line,
+                " " * (self.pos - 1) + "^ unexpected token"]
+
+    # returns the message formatted like the output of lwre
+    def get_output(self):
+        prefix = time.strftime("%Y/%m/%d %H:%M:%S ")
+        return "".join(prefix + line + "\n" for line in self.get_lines())
+
+
+# Nodes of the abstract syntax tree. Each node has the line of the token
+# it begins with, except for Declaration, which has the line of the name.
+
+class Program:
+    def __init__(self, language, macros, root):
+        # "#LOOP", "#WHILE" or None
+        self.language = language
+        # list of Macro nodes in the order of their definition
+        self.macros = macros
+        # Macro node of the root macro, None if there is none
+        self.root = root
+
+
+class Declaration:
+    def __init__(self, name, kind, line):
+        self.name = name
+        # "input", "output" or "auxiliary"
+        self.kind = kind
+        self.line = line
+
+
+class Macro:
+    def __init__(self, name, line):
+        # None for the root macro
+        self.name = name
+        self.line = line
+        self.inputs = []
+        self.outputs = []
+        self.auxiliaries = []
+        self.body = []
+
+    def declarations(self):
+        return self.inputs + self.outputs + self.auxiliaries
+
+
+class Assignment:
+    def __init__(self, target, expression, line):
+        # Variable node
+        self.target = target
+        self.expression = expression
+        self.line = line
+
+
+class Loop:
+    def __init__(self, variable, body, line):
+        self.variable = variable
+        self.body = body
+        self.line = line
+
+
+class While:
+    def __init__(self, variable, value, body, line):
+        # the condition is "variable != value"
+        self.variable = variable
+        self.value = value
+        self.body = body
+        self.line = line
+
+
+class If:
+    def __init__(self, variable, value, then_body, else_body, line):
+        self.variable = variable
+        self.value = value
+        self.then_body = then_body
+        # None, if there is no else branch
+        self.else_body = else_body
+        self.line = line
+
+
+class Variable:
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+
+
+class Constant:
+    def __init__(self, value, line):
+        self.value = value
+        self.line = line
+
+
+class BinaryOperation:
+    def __init__(self, operator, left, right, line):
+        # operator as in _BINARY_OPERATORS
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self.line = line
+
+
+class Builtin:
+    def __init__(self, name, operand, line):
+        # "succ" or "pred"
+        self.name = name
+        self.operand = operand
+        self.line = line
+
+
+class MacroCall:
+    def __init__(self, name, arguments, line):
+        self.name = name
+        # list of Variable and Constant nodes
+        self.arguments = arguments
+        # line of the "("
+        self.line = line
+
+
+# Returns the tokens of source as tuples (type, val, line, pos), where pos
+# is the column (starting at 1). The last token is either the end token or
+# the first unrecognised token.
+def _tokenize(source):
+    lexer = Lexer(_parser_lexer_rules, False)
+    lexer.input(source)
+    tokens = []
+    line = 1
+    line_start = 0
+    try:
+        for tok_type, val, pos in lexer.tuples():
+            if tok_type == 'WORD':
+                tok_type = val if val in _KEYWORDS else IDENTIFIER
+            elif tok_type == 'NEWLINE':
+                line += 1
+                line_start = pos + 1
+                continue
+            elif tok_type in ('WHITESPACE', 'COMMENT'):
+                continue
+            elif tok_type == 'INTEGER':
+                tok_type = INTEGER
+            elif tok_type == 'DECLARATION':
+                tok_type = DECLARATION
+            elif tok_type == 'LANGUAGE':
+                tok_type = LANGUAGE
+            elif tok_type in _SYMBOL_TYPES or val == ",":
+                tok_type = val
+            else:
+                tokens.append(_unrecognised(source, pos, line, line_start))
+                break
+            tokens.append((tok_type, val, line, pos - line_start + 1))
+        else:
+            tokens.append((END, "", *_end_position(source)))
+    except LexerError as e:
+        tokens.append(_unrecognised(source, e.pos, line, line_start))
+    return tokens
+
+# Returns the token for an unrecognised character at pos. lwre reads the
+# character after the longest prefix of a token beginning at pos, which
+# counts as the next line, if it is a line break.
+def _unrecognised(source, pos, line, line_start):
+    end = pos + 1
+    if source[pos] == "#":
+        for constraint in ("LOOP", "WHILE"):
+            length = 0
+            while length < len(constraint) and source.startswith(constraint[:length + 1], pos + 1):
+                length += 1
+            end = max(end, pos + 1 + length)
+    if source[pos] in "#:!=/" and source.startswith("\n", end):
+        line += 1
+    return (UNRECOGNISED, source[pos], line, pos - line_start + 1)
+
+# Returns line and column, at which lwre reports the end of source. lwre
+# counts the lines of source, but the column continues after a line break
+# at the end of source. Columns are counted in bytes.
+def _end_position(source):
+    line_start = source.rfind("\n", 0, max(len(source) - 1, 0)) + 1
+    return (source.count("\n") + 1, len(source[line_start:].encode("utf-8")) + 1)
+
+# returns the name of a token in error messages of lwre
+def _token_name(token):
+    tok_type, val = token[0], token[1]
+    if tok_type == DECLARATION:
+        return val
+    if tok_type == "div":
+        return "/"
+    if tok_type == "mod":
+        return "%"
+    return tok_type
+
+
+class _Parser:
+    def __init__(self, source):
+        self._source = source
+        self._tokens = _tokenize(source)
+        self._index = 0
+        # index of an identifier, after which lwre gives no hint for an
+        # unexpected "then"
+        self._plain_index = None
+
+    def _peek(self):
+        token = self._tokens[self._index]
+        if token[0] == UNRECOGNISED:
+            self._error(token, "Unrecognised token")
+        return token
+
+    def _next(self):
+        token = self._peek()
+        self._index += 1
+        return token
+
+    # consumes the next token, if it has the type tok_type
+    def _accept(self, tok_type):
+        if self._peek()[0] == tok_type:
+            self._index += 1
+            return True
+        return False
+
+    def _expect(self, tok_type, hint=None):
+        token = self._peek()
+        if token[0] != tok_type:
+            self._unexpected(token, hint)
+        self._index += 1
+        return token
+
+    def _error(self, token, msg):
+        line, pos = token[2], token[3]
+        if token[0] == END:
+            # lwre shows the line of the last character
+            line = self._source.count("\n", 0, max(len(self._source) - 1, 0)) + 1
+        source_line = self._source.split("\n")[line - 1]
+        if source_line.endswith("\r"):
+            source_line = source_line[:-1]
+        raise ParserError(msg, token[2], pos, source_line)
+
+    def _previous_type(self):
+        return self._tokens[self._index - 1][0] if self._index > 0 else None
+
+    # hint is appended to the message, if it is None, the hint depends on
+    # the previous token
+    def _unexpected(self, token, hint=None):
+        if hint is None:
+            previous = self._previous_type()
+            if previous == INTEGER:
+                hint = _ENDDEF_HINT if token[1] in ("in:", "out:") else _SEMICOLON_HINT
+            elif previous == IDENTIFIER and token[0] == "then" and self._plain_index != self._index - 1:
+                hint = _CONDITION_HINT
+            else:
+                hint = ""
+        self._error(token, "unexpected " + _token_name(token) + hint)
+
+    def parse(self):
+        language = None
+        if self._peek()[0] == LANGUAGE:
+            language = self._next()[1]
+        macros = []
+        while self._peek()[0] == "def":
+            macros.append(self._macro())
+        root = None
+        if self._peek()[0] == DECLARATION:
+            root = self._root()
+        self._expect(END)
+        return Program(language, macros, root)
+
+    # parses "in: a, b", returns a list of Declaration nodes
+    def _declaration(self):
+        kind = _DECLARATION_KINDS[self._next()[1]]
+        declarations = []
+        while True:
+            token = self._expect(IDENTIFIER)
+            declarations.append(Declaration(token[1], kind, token[2]))
+            if not self._accept(","):
+                break
+        self._accept(";")
+        return declarations
+
+    def _is_declaration(self, name):
+        token = self._peek()
+        return token[0] == DECLARATION and token[1] == name
+
+    def _declarations(self, macro):
+        if self._is_declaration("in:"):
+            macro.inputs = self._declaration()
+            if not self._is_declaration("out:"):
+                # a list of variables without ";" may be continued
+                token = self._peek()
+                continued = token[0] == IDENTIFIER and self._previous_type() == IDENTIFIER
+                self._unexpected(token, _COMMA_HINT if continued else None)
+        if self._is_declaration("out:"):
+            macro.outputs = self._output_declaration()
+            if self._is_declaration("aux:"):
+                macro.auxiliaries = self._declaration()
+        else:
+            self._unexpected(self._peek())
+
+    def _output_declaration(self):
+        self._next()
+        token = self._expect(IDENTIFIER)
+        if self._peek()[0] == ",":
+            self._error(self._peek(), "unexpected ,, only one output variable is allowed")
+        self._accept(";")
+        return [Declaration(token[1], "output", token[2])]
+
+    def _macro(self):
+        token = self._next()
+        macro = Macro(self._expect(IDENTIFIER)[1], token[2])
+        self._plain_index = self._index - 1
+        # a macro either is empty or has an output variable
+        if not self._accept("enddef"):
+            self._declarations(macro)
+            macro.body = self._statements(("enddef",))
+            self._expect("enddef")
+        self._accept(";")
+        return macro
+
+    def _root(self):
+        macro = Macro(None, self._peek()[2])
+        self._declarations(macro)
+        macro.body = self._statements((END,))
+        return macro
+
+    # parses statements up to a token with a type in terminators
+    def _statements(self, terminators):
+        statements = []
+        if self._peek()[0] in terminators:
+            return statements
+        statements.append(self._statement(terminators))
+        while self._peek()[0] not in terminators:
+            self._expect(";")
+            if self._peek()[0] in terminators:
+                break
+            statements.append(self._statement(terminators, True))
+        return statements
+
+    # separated is True, if the statement follows a ";"
+    def _statement(self, terminators, separated=False):
+        token = self._peek()
+        if token[0] == IDENTIFIER:
+            return self._assignment()
+        if token[0] == "loop":
+            self._index += 1
+            variable = self._variable(self._expect(IDENTIFIER, _LOOP_HINT))
+            self._expect("do", _DO_HINT if self._peek()[0] == IDENTIFIER else None)
+            body = self._statements(("enddo",))
+            self._expect("enddo")
+            return Loop(variable, body, token[2])
+        if token[0] == "while":
+            self._index += 1
+            variable, value = self._condition("while")
+            self._expect("do", _DO_HINT)
+            body = self._statements(("enddo",))
+            self._expect("enddo")
+            self._check_condition("while", value, token, terminators)
+            return While(variable, value, body, token[2])
+        if token[0] == "if":
+            self._index += 1
+            variable, value = self._condition("if")
+            self._expect("then", _THEN_HINT)
+            then_body = self._statements(("else", "endif"))
+            else_body = None
+            if self._accept("else"):
+                else_body = self._statements(("endif",))
+            self._expect("endif")
+            self._check_condition("if", value, token, terminators)
+            return If(variable, value, then_body, else_body, token[2])
+        if token[1] in ("in:", "out:") and separated:
+            self._unexpected(token, _ENDDEF_HINT)
+        self._unexpected(token)
+
+    # parses "x != 0", returns the Variable node and the value
+    def _condition(self, keyword):
+        variable = self._variable(self._expect(IDENTIFIER, _CONDITION_HINT))
+        self._expect("!=", _CONDITION_HINT if keyword == "while" and self._peek()[0] == "do" else None)
+        return variable, int(self._expect(INTEGER, _CONDITION_HINT)[1])
+
+    # lwre checks the condition, when the statement is complete, i.e. the
+    # following token may follow a statement
+    def _check_condition(self, keyword, value, token, terminators):
+        if value != 0 and self._peek()[0] in terminators + (";",):
+            raise ParserError("'" + keyword + "' condition must be of the form "
+                              "'<variable> != 0' in line " + str(token[2]) + ".")
+
+    def _variable(self, token):
+        return Variable(token[1], token[2])
+
+    def _operand(self):
+        token = self._peek()
+        if token[0] == IDENTIFIER:
+            self._index += 1
+            return self._variable(token)
+        if token[0] == INTEGER:
+            self._index += 1
+            return Constant(int(token[1]), token[2])
+        self._unexpected(token)
+
+    def _assignment(self):
+        target = self._variable(self._next())
+        self._expect(":=")
+        token = self._peek()
+        if token[0] in ("succ", "pred"):
+            self._index += 1
+            self._expect("(")
+            expression = Builtin(token[0], self._operand(), token[2])
+            self._expect(")")
+        elif token[0] == IDENTIFIER and self._tokens[self._index + 1][0] == "(":
+            self._index += 1
+            line = self._next()[2]
+            arguments = []
+            if not self._accept(")"):
+                arguments.append(self._operand())
+                while not self._accept(")"):
+                    self._expect(",")
+                    arguments.append(self._operand())
+            expression = MacroCall(token[1], arguments, line)
+        else:
+            expression = self._operand()
+            self._plain_index = self._index - 1
+            operator = self._peek()[0]
+            if operator in _BINARY_OPERATORS:
+                self._index += 1
+                expression = BinaryOperation(operator, expression, self._operand(), token[2])
+        return Assignment(target, expression, target.line)
+
+
+# yields all statements of the given statements including nested ones in
+# textual order
+def _walk(statements):
+    for statement in statements:
+        yield statement
+        if isinstance(statement, (Loop, While)):
+            yield from _walk(statement.body)
+        elif isinstance(statement, If):
+            yield from _walk(statement.then_body)
+            if statement.else_body is not None:
+                yield from _walk(statement.else_body)
+
+# yields the Variable nodes used by a statement in textual order, without
+# nested statements
+def _used_variables(statement):
+    if isinstance(statement, Assignment):
+        yield statement.target
+        expression = statement.expression
+        if isinstance(expression, BinaryOperation):
+            operands = [expression.left, expression.right]
+        elif isinstance(expression, Builtin):
+            operands = [expression.operand]
+        elif isinstance(expression, MacroCall):
+            operands = expression.arguments
+        else:
+            operands = [expression]
+        for operand in operands:
+            if isinstance(operand, Variable):
+                yield operand
+    else:
+        yield statement.variable
+
+def _macro_calls(macro):
+    for statement in _walk(macro.body):
+        if isinstance(statement, Assignment) and isinstance(statement.expression, MacroCall):
+            yield statement.expression
+
+# Checks the program as lwre does after parsing it
+def _check(program):
+    macros = program.macros + ([program.root] if program.root is not None else [])
+    if program.language == "#LOOP":
+        for macro in macros:
+            if any(isinstance(statement, While) for statement in _walk(macro.body)):
+                raise ParserError("LOOP program contains 'while' statement, aborting.")
+
+    for macro in macros:
+        declared = set(declaration.name for declaration in macro.declarations())
+        for statement in _walk(macro.body):
+            for variable in _used_variables(statement):
+                if variable.name not in declared:
+                    raise ParserError("Undeclared variable '" + variable.name + "' in line "
+                                      + str(variable.line) + ".")
+
+    for macro in macros:
+        first = {}
+        for declaration in macro.declarations():
+            other = first.setdefault(declaration.name, declaration)
+            if other is not declaration:
+                raise ParserError("Variable '" + declaration.name + "' redeclared, first as \""
+                                  + other.kind + "\" in line " + str(other.line) + " and again as \""
+                                  + declaration.kind + "\" in line " + str(declaration.line))
+
+    # the first definition of a macro is used
+    definitions = {}
+    for macro in program.macros:
+        definitions.setdefault(macro.name, macro)
+    for macro in macros:
+        for call in _macro_calls(macro):
+            definition = definitions.get(call.name)
+            if definition is None:
+                msg = "Undefined macro '"
+            elif len(call.arguments) < len(definition.inputs):
+                msg = "Too few arguments to macro '"
+            elif len(call.arguments) > len(definition.inputs):
+                msg = "Too many arguments to macro '"
+            else:
+                continue
+            raise ParserError(msg + call.name + "' in line " + str(call.line))
+
+    _check_cycles(program.macros, definitions)
+
+# Searches the macro definitions for a cyclic dependency as lwre does: the
+# macros called by each macro, that has not been reached before, are
+# searched depth first, and any macro that is reached twice within one
+# search counts as a cycle, even if it is not on the current path.
+def _check_cycles(macros, definitions):
+    callees = {}
+    for name, macro in definitions.items():
+        callees[name] = list(dict.fromkeys(call.name for call in _macro_calls(macro)))
+
+    resolved = set()
+    for macro in macros:
+        if macro.name in resolved:
+            continue
+        visited = set([macro.name])
+        path = [macro.name]
+        iterators = [iter(callees[macro.name])]
+        while iterators:
+            callee = next(iterators[-1], None)
+            if callee is None:
+                iterators.pop()
+                path.pop()
+            elif callee in resolved:
+                continue
+            elif callee in visited:
+                cycle = path[path.index(callee) + 1 if callee in path else 0:] + [callee]
+                raise ParserError("Found cyclic dependency in macro definitions, aborting:",
+                                  details=[" -> ".join(cycle + cycle[:1])])
+            else:
+                visited.add(callee)
+                path.append(callee)
+                iterators.append(iter(callees[callee]))
+        resolved |= visited
+
+
+#
+#  name: parse
+#  @param
+#    source string with a Loop/While program
+#  @return the Program node of source
+#
+#  Raises a ParserError with the message lwre reports for source, if
+#  source is invalid.
+#
+def parse(source):
+    program = _Parser(source).parse()
+    _check(program)
+    return program
+
+# Returns None, if source is a valid Loop/While program, otherwise the
+# error message formatted like the output of lwre
+def check_program(source):
+    try:
+        parse(source)
+    except ParserError as e:
+        return e.get_output()
+    except RecursionError:
+        # the program is nested too deeply for the parser, lwre decides
+        pass
+    return None
@@ -23,7 +23,8 @@ if __name__ == '__main__':
     try:
         arg_parser = ArgParser(sys.argv[1:], ["--host=", "--port=", "--loglevel=",
             "--logfile=", "--user_src=", "--max_sessions=", "--ws_hostname=", "--report_file=",
-            "--ws_interface=", "--ws_port=", "--max_sessions_per_address="], True)
+            "--ws_interface=", "--ws_port=", "--max_sessions_per_address=", "--ws_max_send_buffer=",
+            "--debugger_trace_memory=", "--evaluator_workers="], True)
         _host = arg_parser.get_value_default("--host", "127.0.0.1")
         _port = int(arg_parser.get_value_default("--port", "8080"))
         _loglevel = arg_parser.get_value_default("--loglevel", "INFO")
@@ -34,7 +35,10 @@ if __name__ == '__main__':
         _ws_host = arg_parser.get_value_default("--ws_hostname", None)
         _ws_interface = arg_parser.get_value_default("--ws_interface", "127.0.0.1")
         _ws_port = int(arg_parser.get_value_default("--ws_port", "8081"))
+        _ws_max_send_buffer = int(arg_parser.get_value_default("--ws_max_send_buffer", str(256*1024)))
         _report_file = arg_parser.get_value("--report_file")
+        _debugger_trace_memory = int(arg_parser.get_value_default("--debugger_trace_memory", "0"))
+        _evaluator_workers = int(arg_parser.get_value_default("--evaluator_workers", "0"))
     except Exception as e:
         print("Exception while parsing arguments: " + str(e))
         sys.exit(-1)
@@ -47,6 +51,8 @@ if __name__ == '__main__':
 from Controller import Controller
 from WebSockets import WebSocketsService
 import ReportGenerator
+import Debugger
+import Evaluator
 
 if __name__ == '__main__':
     if _ws_host is not None:
@@ -69,6 +75,13 @@ if __name__ == '__main__':
     # setup ReportGenerator
     ReportGenerator.setup(_report_file)
 
+    try:
+        Debugger.set_trace_memory(_debugger_trace_memory)
+        Evaluator.set_workers(_evaluator_workers)
+    except ValueError as e:
+        logger.critical(e)
+        sys.exit(-1)
+
     # Run server
     config = MinimalApplicationConfigurator()
     config.register(StaticsConfigurationComponent)
@@ -84,7 +97,7 @@ if __name__ == '__main__':
         })
         logger.info("Listening on port " + str(_port) + ", host " + str(_host))
 
-        serv = WebSocketsService(controller._sess_man, _ws_interface, _ws_port)
+        serv = WebSocketsService(controller._sess_man, _ws_interface, _ws_port, _ws_max_send_buffer)
         serv.start()
 
         waitress.serve(config.make_wsgi_app(), host=_host, port=_port)
@@ -104,3 +117,4 @@ if __name__ == '__main__':
             controller.shutdown()
         except Exception as e:
             logger.critical(str(e))
+        Evaluator.shutdown()
@@ -0,0 +1,176 @@
+#  ProgramStructure.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module provides an index of the structure of a Loop/While program,
+#  that is built once per debugger session: the macro table, the loops,
+#  the first line of the root macro and the lines that can hold a breakpoint.
+
+from SourceCodeView import Tokenizer
+
+
+# keywords that begin a statement
+_STATEMENT_KEYWORDS = ("loop", "LOOP", "while", "WHILE", "if")
+# keywords after which a new statement may begin
+_BLOCK_KEYWORDS = ("do", "then", "else", "enddo", "endif")
+# keywords that begin a declaration of variables
+_DECLARATION_KEYWORDS = ("in", "out", "aux")
+
+
+class MacroInfo:
+    def __init__(self, name, def_line):
+        self.name = name
+        # line of the "def" keyword
+        self.def_line = def_line
+        # line of the "enddef" keyword, None if it is missing
+        self.enddef_line = None
+        # first line of the macro body, None if the body is empty
+        self.first_line = None
+        # names of the declared variables
+        self.inputs = []
+        self.outputs = []
+        self.auxiliaries = []
+
+
+class LoopInfo:
+    def __init__(self, head_line, macro):
+        # line of the loop or while statement
+        self.head_line = head_line
+        # name of the macro containing the loop, None for the root macro
+        self.macro = macro
+        # first line of the loop body, None if the body is empty
+        self.first_line = None
+        # line of the "enddo" keyword, None if it is missing
+        self.enddo_line = None
+
+    def contains(self, line_no):
+        return (self.head_line <= line_no and
+                (self.enddo_line is None or line_no <= self.enddo_line))
+
+
+class ProgramStructure:
+    # Raises a LexerError, if source can not be tokenized
+    def __init__(self, source):
+        self.source = source
+        # dict that maps the names of all macros defined in source to MacroInfo objects
+        self.macros = {}
+        # first line of the root macro, -1 if the root macro has no statements
+        self.root_first_line = -1
+        # set of all lines, in which a statement begins
+        self.breakpoint_lines = set()
+        # LoopInfo objects of all loop and while statements, in order of
+        # their appearance in source
+        self.loops = []
+        # number of lines of source
+        self.line_count = 1
+
+        self._parse()
+        self.breakpoint_lines = frozenset(self.breakpoint_lines)
+
+    def is_breakpoint_line(self, line_no):
+        return line_no in self.breakpoint_lines
+
+    # returns the LoopInfo of the innermost loop containing line_no, or None
+    def innermost_loop(self, line_no):
+        innermost = None
+        for loop in self.loops:
+            if loop.contains(line_no) and (innermost is None or loop.head_line > innermost.head_line):
+                innermost = loop
+        return innermost
+
+    def _parse(self):
+        line = 1
+        in_comment = False
+        # True, if the next token may begin a statement
+        expect_statement = True
+        # the macro, whose definition is parsed, or None in the root macro
+        macro = None
+        # True, if the next identifier is the name of a new macro
+        expect_macro_name = False
+        # list the next identifiers of a declaration are added to, or None
+        declaration = None
+        # True, if the next token of a declaration may be a variable name
+        expect_variable = False
+        # loops whose "enddo" has not been reached yet, innermost last
+        open_loops = []
+
+        for token in Tokenizer(self.source):
+            if token.type == "LINEBREAK":
+                line += 1
+                in_comment = False
+                continue
+            if in_comment or token.type in ("SPACE", "TAB"):
+                continue
+            if token.type in ("ENTER_COMMENT", "HASHTAG"):
+                in_comment = True
+                continue
+
+            if expect_macro_name:
+                expect_macro_name = False
+                if token.type == "IDENTIFIER":
+                    macro = MacroInfo(token.val, line)
+                    self.macros[token.val] = macro
+                    expect_statement = True
+                    continue
+
+            if declaration is not None:
+                # the COLON token type covers ":" and ","
+                if token.type == "COLON":
+                    expect_variable = True
+                    continue
+                if token.type == "IDENTIFIER" and expect_variable:
+                    declaration.append(token.val)
+                    expect_variable = False
+                    continue
+                # lwre does not require a ";" after a declaration, so it ends
+                # at any other token, which may begin a statement
+                declaration = None
+                expect_statement = True
+                if token.type == "SEMICOLON":
+                    continue
+
+            if token.type == "KEYWORD" and token.val == "def":
+                expect_macro_name = True
+                expect_statement = False
+            elif token.type == "KEYWORD" and token.val == "enddef":
+                if macro is not None:
+                    macro.enddef_line = line
+                macro = None
+                expect_statement = True
+            elif token.type == "KEYWORD" and token.val in _DECLARATION_KEYWORDS:
+                if macro is None:
+                    # variables of the root macro are not indexed
+                    declaration = []
+                elif token.val == "in":
+                    declaration = macro.inputs
+                elif token.val == "out":
+                    declaration = macro.outputs
+                else:
+                    declaration = macro.auxiliaries
+                expect_variable = True
+            elif token.type == "KEYWORD" and token.val in _BLOCK_KEYWORDS:
+                if token.val == "enddo" and len(open_loops) > 0:
+                    open_loops.pop().enddo_line = line
+                expect_statement = True
+            elif token.type == "SEMICOLON":
+                expect_statement = True
+            elif expect_statement and (token.type == "IDENTIFIER" or
+                    (token.type == "KEYWORD" and token.val in _STATEMENT_KEYWORDS)):
+                self.breakpoint_lines.add(line)
+                if macro is None:
+                    if self.root_first_line == -1:
+                        self.root_first_line = line
+                elif macro.first_line is None:
+                    macro.first_line = line
+                if len(open_loops) > 0 and open_loops[-1].first_line is None:
+                    open_loops[-1].first_line = line
+                if token.type == "KEYWORD" and token.val in ("loop", "LOOP", "while", "WHILE"):
+                    loop = LoopInfo(line, macro.name if macro is not None else None)
+                    self.loops.append(loop)
+                    open_loops.append(loop)
+                expect_statement = False
+            else:
+                expect_statement = False
+
+        self.line_count = line
@@ -37,17 +37,43 @@ def logSessionBegin(client_address, session_id):
 def logSessionEnd(client_address, session_id):
     _report_logger.info("SESSION_END client_address: " + client_address + " session_id: " + session_id)
 
+# Logs the number of hits of conditional breakpoints of a debugger session
+# and the number of those, that have been resumed by the session. Does
+# nothing, if no report file has been set up.
+def logBreakpointHits(session_id, hits, filtered):
+    if _report_logger is not None:
+        _report_logger.info("BREAKPOINT_HITS session_id: " + session_id + " hits: " + str(hits)
+                            + " filtered: " + str(filtered))
+
+# Logs the histograms of the response latencies of a debugger session, see
+# Debugger.get_response_latencies(). Does nothing, if no report file has
+# been set up.
+def logResponseLatencies(session_id, latencies):
+    if _report_logger is not None:
+        message = "RESPONSE_LATENCIES session_id: " + session_id
+        for command, histogram in sorted(latencies.items()):
+            message += " " + command + ": " + ",".join(str(bucket) + "=" + str(count)
+                                                      for bucket, count in sorted(histogram.items()))
+        _report_logger.info(message)
+
+# Logs the occupancy metrics of the debug port range, see
+# SocketManager.get_metrics(). Does nothing, if no report file has been set up.
+def logDebugPorts(metrics):
+    if _report_logger is not None:
+        _report_logger.info("DEBUG_PORTS" + "".join(" " + key + ": " + str(metrics[key]) for key in
+                            ["in_use", "free", "peak_in_use", "allocations", "bind_failures"]))
+
 
 # A class to generate a histogram. Used by different metrics in this file.
 class Histogram:
     def __init__(self):
         self.data_map = {}
 
-    def increment(self, key):
+    def increment(self, key, count=1):
         if key not in self.data_map:
-            self.data_map[key] = 1
+            self.data_map[key] = count
         else:
-            self.data_map[key] += 1
+            self.data_map[key] += count
 
     def printHistogram(self, width, print_sorted=False):
         max_val = max(self.data_map.values())
@@ -172,6 +198,91 @@ class SessionsPerAddress:
         self._histogram.printHistogram(20, True)
 
 
+# This metric evaluates, how many hits of conditional breakpoints have been
+# resumed by the debugger sessions without involving the client
+class FilteredBreakpointHits:
+    def __init__(self):
+        self.sessions = 0
+        self.hits = 0
+        self.filtered = 0
+
+    def reportSessionBegin(self, time, client_address, session_id):
+        pass
+
+    def reportSessionEnd(self, time, client_address, session_id):
+        pass
+
+    def reportBreakpointHits(self, time, session_id, hits, filtered):
+        self.sessions += 1
+        self.hits += hits
+        self.filtered += filtered
+
+    def printReport(self):
+        print("Sessions using conditional breakpoints: " + str(self.sessions))
+        print("Hits of conditional breakpoints: " + str(self.hits) + ", filtered: " + str(self.filtered))
+
+
+# This metric evaluates the response latencies of the debugger processes
+# for each command
+class ResponseLatencies:
+    def __init__(self):
+        # maps commands to histograms of the latencies
+        self._histograms = {}
+
+    def reportSessionBegin(self, time, client_address, session_id):
+        pass
+
+    def reportSessionEnd(self, time, client_address, session_id):
+        pass
+
+    def reportResponseLatencies(self, time, session_id, latencies):
+        for command, histogram in latencies.items():
+            if command not in self._histograms:
+                self._histograms[command] = Histogram()
+            for bucket, count in histogram.items():
+                self._histograms[command].increment(bucket, count)
+
+    def printReport(self):
+        print("Response latencies of the debugger (up to ... ms):")
+        for command, histogram in sorted(self._histograms.items()):
+            print(command + ":")
+            histogram.printHistogram(20, True)
+
+
+# This metric evaluates the occupancy of the debug port range. The counters
+# of the server start at 0 again after each restart.
+class DebugPortUsage:
+    def __init__(self):
+        self.peak_in_use = 0
+        self.min_free = None
+        self.allocations = 0
+        self.bind_failures = 0
+        # last counters of the current server run
+        self._last = {"allocations": 0, "bind_failures": 0}
+
+    def reportSessionBegin(self, time, client_address, session_id):
+        pass
+
+    def reportSessionEnd(self, time, client_address, session_id):
+        pass
+
+    def reportDebugPorts(self, time, metrics):
+        if metrics["allocations"] < self._last["allocations"]:
+            # server has been restarted
+            self.allocations += self._last["allocations"]
+            self.bind_failures += self._last["bind_failures"]
+        self._last = metrics
+        self.peak_in_use = max(self.peak_in_use, metrics["peak_in_use"])
+        if self.min_free is None or metrics["free"] < self.min_free:
+            self.min_free = metrics["free"]
+
+    def printReport(self):
+        print("Maximal number of debug ports in use: " + str(self.peak_in_use))
+        print("Minimal number of free debug ports: " + str(self.min_free))
+        print("Debug port allocations: " + str(self.allocations + self._last["allocations"])
+              + ", bind failures: " + str(self.bind_failures + self._last["bind_failures"]))
+
+
 def consume_token(lexer, type):
     token = lexer.token()
     if token.type != type:
@@ -183,7 +294,11 @@ if __name__ == "__main__":
     filename = arg_parser.get_value("--infile")
 
     lexer = Lexer(_lexer_rules)
-    metrics = [ConcurrentSessionsPerAddress(), SessionDuration(), SessionsPerAddress()]
+    breakpoint_hits = FilteredBreakpointHits()
+    response_latencies = ResponseLatencies()
+    debug_ports = DebugPortUsage()
+    metrics = [ConcurrentSessionsPerAddress(), SessionDuration(), SessionsPerAddress(), breakpoint_hits,
+               response_latencies, debug_ports]
 
     with open(filename, "r") as infile:
         for line in infile:
@@ -206,6 +321,33 @@ if __name__ == "__main__":
                 session_id = consume_token(lexer, "STRING")
                 for metric in metrics:
                     metric.reportSessionEnd(time, client_addr, session_id)
+            elif typestr == "#BREAKPOINT_HITS":
+                consume_token(lexer, "STRING")
+                session_id = consume_token(lexer, "STRING")
+                consume_token(lexer, "STRING")
+                hits = int(consume_token(lexer, "STRING"))
+                consume_token(lexer, "STRING")
+                filtered = int(consume_token(lexer, "STRING"))
+                breakpoint_hits.reportBreakpointHits(time, session_id, hits, filtered)
+            elif typestr == "#RESPONSE_LATENCIES":
+                consume_token(lexer, "STRING")
+                session_id = consume_token(lexer, "STRING")
+                latencies = {}
+                token = lexer.token()
+                while token is not None:
+                    histogram = latencies[token.val[:-1]] = {}
+                    for entry in consume_token(lexer, "STRING").split(","):
+                        bucket, count = entry.split("=")
+                        histogram[int(bucket)] = int(count)
+                    token = lexer.token()
+                response_latencies.reportResponseLatencies(time, session_id, latencies)
+            elif typestr == "#DEBUG_PORTS":
+                port_metrics = {}
+                token = lexer.token()
+                while token is not None:
+                    port_metrics[token.val[:-1]] = int(consume_token(lexer, "STRING"))
+                    token = lexer.token()
+                debug_ports.reportDebugPorts(time, port_metrics)
             else:
                 print("WARN: illegal type: " + typestr)
 
@@ -11,7 +11,8 @@ import threading
 import os, subprocess
 import fcntl
 
-from IOTools import read_timeout
+from IOTools import StreamReader
+from EventLog import EventLog
 
 logger = Logging.get_logger(__name__)
 
@@ -38,8 +39,13 @@ class Session:
         self._sess_id = sess_id
         self._sess_man = sess_manager
         self._proc = None
+        # StreamReader for the output of _proc
+        self._output_reader = None
         self._client_addr = client_addr
         self.timer_task = None
+        # update messages sent to WebSocket clients, used to replay missed
+        # messages after a reconnect
+        self.event_log = EventLog()
 
     def get_client_addr(self):
         return self._client_addr
@@ -53,14 +59,11 @@ class Session:
 
     # poll process output with blocking only a short period of time
     def poll_user_output(self):
-        return read_timeout(self._proc.stdout, timeout=0.15)
+        return self._output_reader.read(timeout=0.15)
 
     # poll process output without blocking at all
     def fast_poll_user_output(self):
-        try:
-            return os.read(self._proc.stdout.fileno(), 512).decode()
-        except BlockingIOError:
-            return ""
+        return self._output_reader.read()
 
     def get_program_code(self):
         input_file_path = self._sess_man.get_input_filename(self._sess_id)
@@ -72,8 +75,9 @@ class Session:
 
 
     # creates a instance of the interpreter process and returns the 
-    # corresponding Popen object
-    def _create_process(self, input_data, debug=False, debug_port=-1, reuse_input_file=False):
+    # corresponding Popen object. If a DebuggerTransport is given, the
+    # process is started in debug mode.
+    def _create_process(self, input_data, transport=None, reuse_input_file=False):
         input_file_path = self._sess_man.get_input_filename(self._sess_id)
         if not reuse_input_file:
             if "#IMPORT" in input_data:
@@ -84,8 +88,8 @@ class Session:
             except FileExistsError as e:
                 raise RuntimeError("Input file for session_id " + str(self._sess_id) + " already exists: " + str(e))
 
-        if debug:
-            callstr = [_executable_path, "-d", "-port", str(debug_port), input_file_path]
+        if transport is not None:
+            callstr = transport.get_command(_executable_path, input_file_path)
         else:
             callstr = [_executable_path, input_file_path]
         logger.debug("create_process(): creating process of session " + str(self._sess_id))
@@ -97,6 +101,7 @@ class Session:
             # use non-blocking IO for process output
             flags = fcntl.fcntl(self._proc.stdout.fileno(), fcntl.F_GETFL)
             fcntl.fcntl(self._proc.stdout.fileno(), fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            self._output_reader = StreamReader(self._proc.stdout)
         except Exception as e:
             try:
                 os.remove(input_file_path)
@@ -111,6 +116,7 @@ class Session:
             # wait to remove zombies
             self._proc.wait(5)
             self._proc = None
+            self._output_reader = None
         except Exception as e:
             logger.error("kill_process(): kill failed: " + str(e))
         try:
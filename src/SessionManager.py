@@ -8,9 +8,13 @@
 
 import threading
 import random
+import traceback
 
 from Timer import Timer
 import ReportGenerator
+import Logging
+
+logger = Logging.get_logger(__name__)
 
 
 class SessionManager:
@@ -34,6 +38,9 @@ class SessionManager:
         self._sessions_per_addr = {}
         self._max_sessions_per_addr = max_sessions_per_addr
 
+        # objects that get notified about changes in the lifecycle of sessions
+        self._listeners = []
+
     #  
     #  name: create_session
     #  @return a new allocated session_id that is valid as long as delete_session
@@ -94,18 +101,63 @@ class SessionManager:
         ReportGenerator.logSessionBegin(client_address, session_id)
         return session
 
+    # Restarts the timeout of session, e.g. if it is reused. Returns False,
+    # if the session has already been shut down.
+    def renew_session(self, session):
+        task = session.timer_task
+        if task is None:
+            return False
+        return self._timer.reschedule(task, session.get_timeout())
+
     def shutdown_session(self, session):
         self._timer.execute_immediately(session.timer_task)
 
     def _shutdown_session_handler(self, session_id):
         with self._lock:
-            session = self._session_map[session_id]
+            session = self._session_map.pop(session_id)
             session.timer_task = None
-            session.close()
-            del self._session_map[session_id]
             client_address = session.get_client_addr()
             self._sessions_per_addr[client_address] -= 1
-            ReportGenerator.logSessionEnd(client_address, session_id)
+        # listeners have to release the file descriptors of the session
+        # before they get closed
+        self._notify_listeners("session_closed", session)
+        session.close()
+        ReportGenerator.logSessionEnd(client_address, session_id)
+
+    #
+    #  Registers a listener for session lifecycle events. A listener has to
+    #  provide the following methods, each receiving the Session object:
+    #    session_closed(session)      the session is about to be closed,
+    #                                 i.e. its file descriptors become invalid
+    #    session_restarting(session)  the session is about to replace its
+    #                                 process, so its file descriptors become invalid
+    #    session_restarted(session)   the session has replaced its process,
+    #                                 get_file_descriptors() returns the new ones
+    #  Listeners are called from the thread that causes the event, without
+    #  holding the lock of the SessionManager.
+    #
+    def add_listener(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def notify_session_restarting(self, session):
+        self._notify_listeners("session_restarting", session)
+
+    def notify_session_restarted(self, session):
+        self._notify_listeners("session_restarted", session)
+
+    def _notify_listeners(self, event, session):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                getattr(listener, event)(session)
+            except Exception:
+                logger.error("Exception in listener for " + event + ": " + traceback.format_exc())
 
 
     # Returns the Session with session_id sess_id.
@@ -3,9 +3,11 @@
 #  Copyright 2019 Johannes Kern <johannes.kern@fau.de>
 #  
 #
-#  TODO: add module description
+#  This module manages a range of TCP ports on which listening sockets
+#  for debugger processes are created.
 
 import threading
+from collections import deque
 from ListeningSocket import ListeningSocket
 import Logging
 
@@ -16,37 +18,45 @@ class SocketManager:
     # Initializes the PSocketManager and assigns it the port range [first, last].
     # Note that the process must have the necessary rights to open a listening
     # socket on each of this ports.
-    def __init__(self, first, last):
+    def __init__(self, first, last, max_bind_attempts=16):
         self._first = first
         self._last = last
         self._ports_in_use = set()
-        self._next_port_no = first
+        # Free list of port numbers. Released ports are appended, so
+        # port numbers are reused as late as possible.
+        self._free_ports = deque(range(first, last+1))
+        self._max_bind_attempts = max_bind_attempts
         self._lock = threading.Lock()
+
+        # occupancy metrics, see get_metrics()
+        self._peak_in_use = 0
+        self._allocations = 0
+        self._bind_failures = 0
     
-    # Returns a tuple (port, sock) with a port and a new socket listening
-    # to this port
+    # Returns a new ListeningSocket listening to a port that is currently
+    # not assigned by this SocketManager
     def create_socket(self):
         with self._lock:
-            while True:
-                # Find port number that is not currently assigned
-                port_no = self._next_port_no
-                while port_no in self._ports_in_use:
-                    port_no += 1
-                    if port_no > self._last:
-                        port_no = self._first
-                    if port_no == self._next_port_no:
-                        raise Exception("All possible ports are in use")
+            attempts = min(self._max_bind_attempts, len(self._free_ports))
+            if attempts == 0:
+                raise Exception("All possible ports are in use")
+            for i in range(attempts):
+                port_no = self._free_ports.popleft()
                 # Check if that port is realy unused (another process
                 # could possibly use that port).
                 logger.debug("create_socket() - using port " + str(port_no))
-                sock = ListeningSocket(_host, port_no)
-                
+                try:
+                    sock = ListeningSocket(_host, port_no)
+                except OSError as e:
+                    logger.info("create_socket() - binding to port " + str(port_no) + " failed: " + str(e))
+                    self._bind_failures += 1
+                    self._free_ports.append(port_no)
+                    continue
                 self._ports_in_use.add(port_no)
-                self._next_port_no = port_no + 1
-                if self._next_port_no > self._last:
-                    self._next_port_no = self._first
+                self._allocations += 1
+                self._peak_in_use = max(self._peak_in_use, len(self._ports_in_use))
                 return sock
-                    
+            raise Exception("Could not bind to any port after " + str(attempts) + " attempts")
 
     #  
     #  name: releasePort()
@@ -58,3 +68,13 @@ class SocketManager:
         with self._lock:
             port_no = listening_socket.get_port_no()
             self._ports_in_use.remove(port_no)
+            self._free_ports.append(port_no)
+
+    # Returns a dict with the current occupancy of the port range
+    def get_metrics(self):
+        with self._lock:
+            return {"in_use": len(self._ports_in_use),
+                    "free": len(self._free_ports),
+                    "peak_in_use": self._peak_in_use,
+                    "allocations": self._allocations,
+                    "bind_failures": self._bind_failures}
@@ -0,0 +1,95 @@
+#  StackDiff.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module computes and applies differences between two stacktraces
+#  sent by the debugger process.
+
+from Stacktrace import binding_value
+
+def _same_frame(old_frame, new_frame):
+    if old_frame["macro"] != new_frame["macro"] or old_frame["file"] != new_frame["file"]:
+        return False
+    old_bindings = old_frame["bindings"]
+    new_bindings = new_frame["bindings"]
+    if len(old_bindings) != len(new_bindings):
+        return False
+    for old_binding, new_binding in zip(old_bindings, new_bindings):
+        if old_binding["Ident"] != new_binding["Ident"] or old_binding["VarType"] != new_binding["VarType"]:
+            return False
+    return True
+
+#
+#  name: diff_stacktraces
+#  @param
+#    old stacktrace the client already knows or None
+#    new current stacktrace
+#  @return dict describing how to transform old into new
+#
+#  Stacktraces are lists of frames as sent by the debugger process, the
+#  innermost frame first, or LazyStacktrace objects. Frames of the latter,
+#  that are equal in old and new, are not decoded. In the returned diff, frames are indexed from
+#  the outermost frame (index 0). The diff contains the entries
+#    "reset"   True, if the client has to discard its stacktrace first
+#    "pop"     number of innermost frames to remove
+#    "update"  list of {"frame": index, "line": line, "bindings": changes} for
+#              each remaining frame that changed, where changes is a list of
+#              [binding_index, new_value] pairs
+#    "push"    list of new frames to append, outermost first
+#
+def diff_stacktraces(old, new):
+    if old is None:
+        return {"reset": True, "pop": 0, "update": [], "push": new[::-1]}
+    update = []
+    for common in range(min(len(old), len(new))):
+        old_index = len(old) - 1 - common
+        new_index = len(new) - 1 - common
+        if _same_encoding(old, old_index, new, new_index):
+            # unchanged, do not decode the frames of lazy stacktraces
+            continue
+        old_frame = old[old_index]
+        new_frame = new[new_index]
+        if not _same_frame(old_frame, new_frame):
+            break
+        changes = [[i, new_binding["Val"]] for i, (old_binding, new_binding)
+                   in enumerate(zip(old_frame["bindings"], new_frame["bindings"]))
+                   if _binding_changed(old, old_index, old_binding, new, new_index, new_binding)]
+        if len(changes) > 0 or old_frame["line"] != new_frame["line"]:
+            update.append({"frame": common, "line": new_frame["line"], "bindings": changes})
+    else:
+        common = min(len(old), len(new))
+    return {"reset": False, "pop": len(old) - common, "update": update,
+            "push": new[:len(new) - common][::-1]}
+
+# True, if both frames are known to be equal without decoding them
+# Big values are replaced by previews, that are equal for values differing
+# only in the middle digits, so their full values are compared
+def _binding_changed(old, old_index, old_binding, new, new_index, new_binding):
+    if not isinstance(old_binding["Val"], str) and not isinstance(new_binding["Val"], str):
+        return old_binding["Val"] != new_binding["Val"]
+    ident = new_binding["Ident"]
+    return binding_value(old, old_index, ident) != binding_value(new, new_index, ident)
+
+def _same_encoding(old, old_index, new, new_index):
+    if not hasattr(old, "encoded_frame") or not hasattr(new, "encoded_frame"):
+        return False
+    return old.encoded_frame(old_index) == new.encoded_frame(new_index)
+
+
+# Applies a diff returned by diff_stacktraces() to stack and returns the
+# resulting stacktrace. stack itself is not modified.
+def apply_stack_diff(stack, diff):
+    if diff["reset"] or stack is None:
+        frames = []
+    else:
+        frames = [dict(frame, bindings=[dict(binding) for binding in frame["bindings"]])
+                  for frame in stack[::-1]]
+    del frames[len(frames) - diff["pop"]:]
+    for update in diff["update"]:
+        frame = frames[update["frame"]]
+        frame["line"] = update["line"]
+        for index, val in update["bindings"]:
+            frame["bindings"][index]["Val"] = val
+    frames += diff["push"]
+    return frames[::-1]
@@ -0,0 +1,140 @@
+#  Stacktrace.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module decodes the stacktraces sent by the debugger process.
+#  A stacktrace is only split into its encoded frames on arrival, each frame
+#  is decoded on first access. For deep call stacks, this avoids decoding
+#  all frames in each step, while usually only the innermost frame is
+#  inspected or has changed.
+
+import re
+import json
+from collections.abc import Sequence
+
+# Values of variables are unbounded naturals. Values with more digits than
+# PREVIEW_DIGITS are not converted to int, since this is quadratic in the
+# number of digits (and fails for more than sys.get_int_max_str_digits()).
+# In stacktraces, they are replaced by a preview string, the full value can
+# be fetched via Debugger.get_binding_value().
+PREVIEW_DIGITS = 40
+_big_int_regex = re.compile(r'"Val":\d{' + str(PREVIEW_DIGITS + 1) + '}')
+
+# The debugger process encodes frames without whitespace and with "file"
+# as first key, so frames are separated by _FRAME_SEPARATOR. The separator
+# can not occur within a file name, since quotes are escaped in strings.
+_FRAME_START = '{"file":'
+_FRAME_SEPARATOR = '},{"file":'
+
+def _parse_int(text):
+    if len(text) > PREVIEW_DIGITS:
+        return text
+    return int(text)
+
+def _preview_value(decimal):
+    return (decimal[:PREVIEW_DIGITS//2] + "..." + decimal[-(PREVIEW_DIGITS//2):]
+            + " (" + str(len(decimal)) + " digits)")
+
+# Returns the value of the variable ident in the frame with the given index
+# of stacktrace, a LazyStacktrace or a list of frames: an int, or the full
+# decimal string of a big value, whose binding only holds a preview.
+# Raises a KeyError, if the frame has no variable ident.
+def binding_value(stacktrace, index, ident):
+    if isinstance(stacktrace, LazyStacktrace):
+        return stacktrace.full_value(index, ident)
+    for binding in stacktrace[index]["bindings"]:
+        if binding["Ident"] == ident:
+            return binding["Val"]
+    raise KeyError(ident)
+
+# Splits the JSON encoding of a list into the encodings of its elements
+def _split_json_list(json_str):
+    if json_str == "[]":
+        return []
+    if json_str.startswith("[" + _FRAME_START) and json_str.endswith("}]"):
+        parts = json_str[1:-2].split(_FRAME_SEPARATOR)
+        return [part + "}" if i == 0 else _FRAME_START + part + "}"
+                for i, part in enumerate(parts)]
+    # other formatting, find the frame boundaries with the JSON decoder
+    decoder = json.JSONDecoder(parse_int=len)
+    texts = []
+    pos = json_str.index("[") + 1
+    while True:
+        while json_str[pos] in " \t\r\n,":
+            pos += 1
+        if json_str[pos] == "]":
+            return texts
+        end = decoder.raw_decode(json_str, pos)[1]
+        texts.append(json_str[pos:end])
+        pos = end
+
+
+#  Stacktrace as list of frames, the innermost frame first. Supports
+#  indexing, slicing, iteration and comparison with lists of frames.
+class LazyStacktrace(Sequence):
+    # json_str is the JSON encoded stacktrace sent by the debugger process
+    def __init__(self, json_str):
+        self._encoded = _split_json_list(json_str)
+        self._frames = [None] * len(self._encoded)
+        # True, if big values are replaced by previews (see PREVIEW_DIGITS)
+        self.has_big_values = _big_int_regex.search(json_str) is not None
+        # dict mapping (frame index, identifier) to the full decimal string
+        # of each big value in the frames decoded so far
+        self.big_values = {}
+
+    def __len__(self):
+        return len(self._encoded)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._encoded)))]
+        if index < 0:
+            index += len(self._encoded)
+        frame = self._frames[index]
+        if frame is None:
+            frame = self._frames[index] = self._decode(index)
+        return frame
+
+    # Returns the JSON encoding of the frame with the given index. Frames
+    # with equal encodings are equal.
+    def encoded_frame(self, index):
+        return self._encoded[index]
+
+    # see binding_value()
+    def full_value(self, index, ident):
+        if index < 0:
+            index += len(self._encoded)
+        for binding in self[index]["bindings"]:
+            if binding["Ident"] == ident:
+                return self.big_values.get((index, ident), binding["Val"])
+        raise KeyError(ident)
+
+    # Number of frames, that have been decoded yet
+    def decoded_count(self):
+        return sum(1 for frame in self._frames if frame is not None)
+
+    def _decode(self, index):
+        encoded = self._encoded[index]
+        if not self.has_big_values or _big_int_regex.search(encoded) is None:
+            return json.loads(encoded)
+        frame = json.loads(encoded, parse_int=_parse_int)
+        for binding in frame["bindings"]:
+            if isinstance(binding["Val"], str):
+                self.big_values[(index, binding["Ident"])] = binding["Val"]
+                binding["Val"] = _preview_value(binding["Val"])
+        return frame
+
+    def __eq__(self, other):
+        if isinstance(other, LazyStacktrace):
+            return (len(self) == len(other) and
+                    all(self._encoded[i] == other._encoded[i] or self[i] == other[i]
+                        for i in range(len(self))))
+        if isinstance(other, list):
+            return len(self) == len(other) and all(self[i] == other[i] for i in range(len(self)))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
@@ -62,6 +62,20 @@ class Timer(threading.Thread):
             self._cond.notify()
             return task
 
+    # Lets task run rel_time seconds from now instead. Returns False, if
+    # task has already been executed.
+    def reschedule(self, task, rel_time):
+        cur_time = time()
+        with self._lock:
+            try:
+                self._queue.remove(task)
+            except ValueError:
+                return False
+            task.timestamp = cur_time + rel_time
+            bisect.insort(self._queue, task)
+            self._cond.notify()
+            return True
+
     def execute_immediately(self, task):
         with self._lock:
             self._queue.remove(task)
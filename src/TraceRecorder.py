@@ -0,0 +1,123 @@
+#  TraceRecorder.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+#  This module records the stacktraces of all steps of a debugged program,
+#  such that previous steps can be displayed without restarting the
+#  debugger process.
+#
+#  Steps are stored in chunks. The first step of a chunk is stored as full
+#  stacktrace, all other steps as diff to the previous step (see StackDiff).
+#  All steps of a chunk are JSON-encoded into one bytearray. If the memory
+#  limit is exceeded, the oldest chunk is discarded.
+
+import json
+from array import array
+from collections import deque
+
+from StackDiff import diff_stacktraces, apply_stack_diff
+
+DEFAULT_MAX_BYTES = 4*1024*1024
+DEFAULT_KEYFRAME_INTERVAL = 32
+
+class _Chunk:
+    def __init__(self, first_step):
+        self.first_step = first_step
+        # line of the innermost frame of each step
+        self.lines = array("i")
+        # start of each encoded step in data
+        self.offsets = array("I")
+        self.data = bytearray()
+
+    def __len__(self):
+        return len(self.lines)
+
+    def append(self, line, encoded):
+        self.lines.append(line)
+        self.offsets.append(len(self.data))
+        self.data += encoded
+
+    def decode(self, index):
+        end = self.offsets[index+1] if index+1 < len(self.offsets) else len(self.data)
+        return json.loads(self.data[self.offsets[index]:end])
+
+    def memory_usage(self):
+        return (len(self.data) + self.lines.itemsize * len(self.lines)
+                + self.offsets.itemsize * len(self.offsets))
+
+
+class TraceRecorder:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self._max_bytes = max_bytes
+        self._keyframe_interval = keyframe_interval
+        self.clear()
+
+    def clear(self):
+        self._chunks = deque()
+        self._step_count = 0
+        self._memory_usage = 0
+        # last recorded stacktrace, needed to compute the next diff
+        self._last_stack = None
+        # last reconstructed step (step, stacktrace), to speed up stepping
+        # backwards and forwards through a chunk
+        self._cached = None
+
+    # Appends stacktrace as next step and returns its step number
+    def record(self, stacktrace):
+        if len(self._chunks) == 0 or len(self._chunks[-1]) >= self._keyframe_interval:
+            self._chunks.append(_Chunk(self._step_count))
+            diff = diff_stacktraces(None, stacktrace)
+        else:
+            diff = diff_stacktraces(self._last_stack, stacktrace)
+        chunk = self._chunks[-1]
+        usage = chunk.memory_usage()
+        line = stacktrace[0]["line"] if len(stacktrace) > 0 else -1
+        chunk.append(line, json.dumps(diff, separators=(",", ":")).encode())
+        self._memory_usage += chunk.memory_usage() - usage
+        self._last_stack = stacktrace
+        self._step_count += 1
+
+        # discard the oldest steps, but always keep the current chunk
+        while self._memory_usage > self._max_bytes and len(self._chunks) > 1:
+            self._memory_usage -= self._chunks.popleft().memory_usage()
+        return self._step_count - 1
+
+    # total number of recorded steps, including discarded ones
+    def __len__(self):
+        return self._step_count
+
+    # number of the oldest step, that has not been discarded
+    def first_step(self):
+        if len(self._chunks) == 0:
+            return 0
+        return self._chunks[0].first_step
+
+    def memory_usage(self):
+        return self._memory_usage
+
+    def _find_chunk(self, step):
+        if step < self.first_step() or step >= self._step_count:
+            raise IndexError("Step " + str(step) + " is not available in the trace.")
+        for chunk in self._chunks:
+            if step < chunk.first_step + len(chunk):
+                return chunk
+
+    # returns the line of the innermost frame of the given step
+    def get_line(self, step):
+        chunk = self._find_chunk(step)
+        return chunk.lines[step - chunk.first_step]
+
+    # returns the stacktrace of the given step, raises an IndexError if
+    # the step has not been recorded or has been discarded
+    def get(self, step):
+        chunk = self._find_chunk(step)
+        if self._cached is not None and chunk.first_step <= self._cached[0] <= step:
+            start, stack = self._cached
+            start += 1
+        else:
+            start, stack = chunk.first_step, None
+        for index in range(start - chunk.first_step, step - chunk.first_step + 1):
+            stack = apply_stack_diff(stack, chunk.decode(index))
+        self._cached = (step, stack)
+        return stack
@@ -13,6 +13,8 @@ from threading import Thread, Lock
 from autobahn.twisted.websocket import WebSocketServerProtocol
 from autobahn.twisted.websocket import WebSocketServerFactory
 from twisted.internet import reactor
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
 from twisted.python import log
 from queue import Queue
 from select import select
@@ -22,15 +24,18 @@ import traceback
 
 
 SELECT_TIMEOUT = 0.10
+# Default upper bound for outgoing data buffered per connection (in bytes)
+MAX_SEND_BUFFER_SIZE = 256*1024
 _logger = Logging.get_logger(__name__)
 _observer = None
 
 class WebSocketsService(Thread):
-    def __init__(self, sess_man, interface, port):
+    def __init__(self, sess_man, interface, port, max_send_buffer=MAX_SEND_BUFFER_SIZE):
         global _observer
         super().__init__()
         self.port = port
         self.interface = interface
+        self.max_send_buffer = max_send_buffer
         _observer = self.Observer(sess_man)
 
     def run(self):
@@ -39,6 +44,7 @@ class WebSocketsService(Thread):
 
             factory = WebSocketServerFactory()
             factory.protocol = LoopWhileWSConnection
+            LoopWhileWSConnection.max_send_buffer = self.max_send_buffer
 
             _observer.start()
 
@@ -58,6 +64,10 @@ class WebSocketsService(Thread):
     # message for the client connection is generated. This update message
     # contains informations about state changes of the session object that
     # are historically obtained by polling /poll_debugger_state, /shell etc.
+    # File descriptors of paused connections (i.e. connections whose send
+    # buffer is full) are temporarily removed from the select set, such that
+    # the output of the child process is not read anymore and the process
+    # gets blocked as soon as its pipe is full.
     class Observer(Thread):
         def __init__(self, sess_man):
             super().__init__()
@@ -71,33 +81,133 @@ class WebSocketsService(Thread):
             # maps file descriptors to owning sessions
             self._conn_map = {}
 
-        def add_connection(self, conn):
+            # maps session ids to the set of connections observing that session
+            self._session_conns = {}
+
+            # The SessionManager informs us about closed and restarted sessions,
+            # so the file descriptors are always released before they get invalid.
+            sess_man.add_listener(self)
+
+        def add_connection(self, conn, last_seq=None):
             try:
-                session = self._sess_man.get_session(conn.session_id)
-                fds = session.get_file_descriptors()
-                conn.fds = fds
                 with(self._lock):
-                    for fd in fds:
-                        self._select_set.add(fd)
-                        self._conn_map[fd] = conn
+                    session = self._sess_man.get_session(conn.session_id)
+                    replay_complete = last_seq is not None and session.event_log.is_complete_since(last_seq)
+                    messages = []
+                    if last_seq is not None:
+                        if not replay_complete:
+                            _logger.info("add_connection(): messages after seq=" + str(last_seq)
+                                         + " of session " + str(conn.session_id) + " are lost")
+                        messages = session.event_log.replay(last_seq)
+                    if not replay_complete and isinstance(session, Debugger):
+                        # The client might not know the current stacktrace, so it is
+                        # sent as soon as the file descriptors are observed.
+                        session.reset_stacktrace_diff()
+                    # The file descriptors are not observed until the missed messages
+                    # have been replayed, such that no live message can overtake them.
+                    conn.replaying = True
+                    self._session_conns.setdefault(conn.session_id, set()).add(conn)
+                    self._register_fds(conn, session)
+                # The lock must not be held while sending, since twisted calls
+                # pauseProducing() from within sendMessage(), if the send buffer is full.
+                for message in messages:
+                    conn.sendMessage(message, False)
+                with(self._lock):
+                    conn.replaying = False
+                    self._observe_fds(conn)
             except Exception:
                 conn.close(self._sess_man)
+                self.remove_connection(conn)
                 _logger.error(traceback.format_exc())
 
         def remove_connection(self, conn):
             try:
                 with(self._lock):
-                    for fd in conn.fds:
-                        self._select_set.remove(fd)
-                        self._conn_map.pop(fd)
+                    self._unregister_fds(conn)
+                    conns = self._session_conns.get(conn.session_id)
+                    if conns is not None:
+                        conns.discard(conn)
+                        if len(conns) == 0:
+                            del self._session_conns[conn.session_id]
             except Exception:
                 _logger.error(traceback.format_exc())
 
+        # must be called with self._lock held
+        def _register_fds(self, conn, session):
+            fds = session.get_file_descriptors()
+            conn.fds = fds
+            for fd in fds:
+                self._conn_map[fd] = conn
+            self._observe_fds(conn)
+
+        # Adds the file descriptors of conn to the select set, unless conn is
+        # paused or replaying missed messages. Must be called with self._lock held
+        def _observe_fds(self, conn):
+            if conn.paused or conn.replaying or conn.fds is None:
+                return
+            for fd in conn.fds:
+                if self._conn_map.get(fd) is conn:
+                    self._select_set.add(fd)
+
+        # must be called with self._lock held
+        def _unregister_fds(self, conn):
+            if conn.fds is not None:
+                for fd in conn.fds:
+                    self._select_set.discard(fd)
+                    if self._conn_map.get(fd) is conn:
+                        del self._conn_map[fd]
+            conn.fds = []
+
+        # Stops observing the file descriptors of conn until resume_connection()
+        # is called. Called by the reactor when the send buffer of conn is full.
+        def pause_connection(self, conn):
+            with(self._lock):
+                conn.paused = True
+                if conn.fds is not None:
+                    for fd in conn.fds:
+                        self._select_set.discard(fd)
+
+        def resume_connection(self, conn):
+            with(self._lock):
+                conn.paused = False
+                self._observe_fds(conn)
+
+        # SessionManager listener: session is about to be closed
+        def session_closed(self, session):
+            with(self._lock):
+                conns = self._session_conns.pop(session.get_id(), set())
+                for conn in conns:
+                    self._unregister_fds(conn)
+            for conn in conns:
+                try:
+                    conn.sendMessage("{\"status\": \"timeout\", \"terminal\": \"\", \"debugger\": \"DIED\"}".encode("UTF8"), False)
+                    conn.close(self._sess_man)
+                except Exception:
+                    _logger.debug(traceback.format_exc())
+
+        # SessionManager listener: session is about to replace its process
+        def session_restarting(self, session):
+            with(self._lock):
+                for conn in self._session_conns.get(session.get_id(), ()):
+                    self._unregister_fds(conn)
+
+        # SessionManager listener: session has new file descriptors
+        def session_restarted(self, session):
+            with(self._lock):
+                for conn in self._session_conns.get(session.get_id(), ()):
+                    try:
+                        self._register_fds(conn, session)
+                    except Exception:
+                        # process could not be restarted, e.g. due to a timeout
+                        _logger.debug("session_restarted(): no file descriptors for session "
+                                      + str(session.get_id()))
+
         def _handle_event(self, fd):
-            try:
-                conn = self._conn_map[fd]
-            except KeyError:
-                _logger.warn(traceback.format_exc())
+            with self._lock:
+                conn = self._conn_map.get(fd)
+                shared = conn is not None and len(self._session_conns.get(conn.session_id, ())) > 1
+            if conn is None:
+                # fd has been released by a session event after select() returned
                 return
 
             try:
@@ -108,16 +218,24 @@ class WebSocketsService(Thread):
                             "debugger": ""
                            }
                 if isinstance(session, Debugger):
+                    session.acknowledge_notifications()
                     state = session.poll_state()
                     if state is DebuggerState.DIED:
                         response["debugger"] = "DIED"
                     elif state is DebuggerState.NOTSTARTED:
                         response["debugger"] = "RESTARTED"
                     else:
-                        response["debugger"] = str(session.pop_last_stacktrace(False)).replace("\'", "\"")
+                        # other connections of the session might not know the
+                        # stacktrace the diff is based on
+                        diff = session.pop_stacktrace_diff(shared)
+                        if diff is None:
+                            response["debugger"] = "None"
+                        else:
+                            response["debugger"] = "DIFF"
+                            response["stack_diff"] = diff
                 message = json.dumps(response)
                 if message != conn.last_msg:
-                    conn.sendMessage(message.encode("UTF8"), False)
+                    conn.sendMessage(session.event_log.append_encoded(message), False)
                     if response["status"] != "running" or response["debugger"] == "RESTARTED":
                         conn.close(self._sess_man)
                         self.remove_connection(conn)
@@ -149,47 +267,48 @@ class WebSocketsService(Thread):
                     for fd in result[2]:
                         self._handle_event(fd)
                 except OSError:
-                    # Bad file descriptor in self._select_set
-                    self._repair()
+                    # A file descriptor has been released by a session event
+                    # while select() was called with an outdated list of fds.
+                    # The select set is already up to date, so just try again.
+                    _logger.debug("run(): select() failed: " + traceback.format_exc())
                 except Exception:
                     _logger.error(traceback.format_exc())
 
-        def _repair(self):
-            _logger.debug("_repair(): begin")
-            with self._lock:
-                self._select_set = set()
-                connections = self._conn_map.values()
-                self._conn_map = {}
-                for conn in connections:
-                    try:
-                        session = self._sess_man.get_session(conn.session_id)
-                        fds = session.get_file_descriptors()
-                        conn.fds = fds
-                        for fd in fds:
-                            self._select_set.add(fd)
-                            self._conn_map[fd] = conn
-                    except KeyError:
-                        _logger.debug("_repair(): invalid session: " + str(conn.session_id))
-                    except Exception:
-                        _logger.info(traceback.format_exc())
-                        try:
-                            conn.close(self._sess_man)
-                        except Exception:
-                            _logger.debug(traceback.format_exc())
-
-            _logger.debug("_repair() finished")
-
         def stop(self):
             self.stopped = True
 
 
+# Each connection acts as a streaming producer for its own transport:
+# twisted calls pauseProducing() as soon as more than max_send_buffer bytes
+# are waiting to be sent to the client, and resumeProducing() after the
+# buffer has been flushed.
+@implementer(IPushProducer)
 class LoopWhileWSConnection(WebSocketServerProtocol):
+    max_send_buffer = MAX_SEND_BUFFER_SIZE
+
     def __init__(self):
         super().__init__()
         self.session_id = None
         self.last_msg = ""
         self.fds = None
         self.closed = False
+        self.paused = False
+        # True, while missed messages are replayed to the client
+        self.replaying = False
+
+    def onOpen(self):
+        self.transport.bufferSize = self.max_send_buffer
+        self.registerProducer(self, True)
+
+    def pauseProducing(self):
+        _logger.debug("Send buffer of connection (session_id=" + str(self.session_id) + ") is full")
+        _observer.pause_connection(self)
+
+    def resumeProducing(self):
+        _observer.resume_connection(self)
+
+    def stopProducing(self):
+        pass
 
     def onMessage(self, payload, isBinary):
         if self.session_id is not None:
@@ -197,8 +316,19 @@ class LoopWhileWSConnection(WebSocketServerProtocol):
             # In this case, we close the connection immediately.
             self.sendClose()
         else:
-            self.session_id = payload.decode()
-            _observer.add_connection(self)
+            # The client sends either "<session_id>" or "<session_id>,<last_seq>",
+            # where last_seq is the sequence number of the last message the
+            # client received on a previous connection to the same session.
+            fields = payload.decode().split(",")
+            self.session_id = fields[0]
+            last_seq = None
+            if len(fields) > 1:
+                try:
+                    last_seq = int(fields[1])
+                except ValueError:
+                    self.sendClose()
+                    return
+            _observer.add_connection(self, last_seq)
 
     def close(self, sess_man):
         if not self.closed:
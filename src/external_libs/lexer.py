@@ -10,12 +10,15 @@
 #-------------------------------------------------------------------------------
 import re
 import sys
+from itertools import starmap
 
 
 class Token(object):
     """ A simple Token structure.
         Contains the token type, value and position.
     """
+    __slots__ = ('type', 'val', 'pos')
+
     def __init__(self, type, val, pos):
         self.type = type
         self.val = val
@@ -34,6 +37,64 @@ class LexerError(Exception):
         self.pos = pos
 
 
+# Name of the group, that matches skipped whitespace
+_SKIP_GROUP = 'SKIP'
+
+# Compiled rule sets, keyed by (rules, skip_whitespace)
+_rule_cache = {}
+
+def _compile_rules(rules, skip_whitespace):
+    """ Returns a tuple (regex, group_type, types) for the given
+        rules. The result is computed once per rule set.
+            regex:
+                All rules concatenated into a single regex with named
+                groups, preceded by a group for whitespace, if
+                skip_whitespace is set.
+            group_type:
+                Maps group names to token types.
+            types:
+                Maps group indices to token types, None for skipped
+                whitespace.
+    """
+    key = (tuple(tuple(rule) for rule in rules), skip_whitespace)
+    compiled = _rule_cache.get(key)
+    if compiled is not None:
+        return compiled
+
+    # All the regexes are concatenated into a single one
+    # with named groups. Since the group names must be valid
+    # Python identifiers, but the token types used by the
+    # user are arbitrary strings, we auto-generate the group
+    # names and map them to token types.
+    #
+    # Whitespace is skipped by matching it as the first
+    # alternative, which is equivalent to skipping it before
+    # matching the rules.
+    #
+    regex_parts = []
+    group_type = {}
+    if skip_whitespace:
+        regex_parts.append('(?P<%s>\\s+)' % _SKIP_GROUP)
+        group_type[_SKIP_GROUP] = None
+
+    for idx, (regex, type) in enumerate(rules, 1):
+        groupname = 'GROUP%s' % idx
+        regex_parts.append('(?P<%s>%s)' % (groupname, regex))
+        group_type[groupname] = type
+
+    regex = re.compile('|'.join(regex_parts))
+    # lastindex of a match is the index of the outermost group
+    # of the matching rule, so it is used instead of lastgroup
+    types = [None] * (regex.groups + 1)
+    for groupname, idx in regex.groupindex.items():
+        if groupname in group_type:
+            types[idx] = group_type[groupname]
+
+    compiled = (regex, group_type, types)
+    _rule_cache[key] = compiled
+    return compiled
+
+
 class Lexer(object):
     """ A simple regex-based lexer/tokenizer.
         See below for an example of usage.
@@ -50,26 +111,13 @@ class Lexer(object):
                 reported by the lexer. Otherwise, you have to
                 specify your rules for whitespace, or it will be
                 flagged as an error.
+            The rules are compiled only once for all lexers with
+            the same rules.
         """
-        # All the regexes are concatenated into a single one
-        # with named groups. Since the group names must be valid
-        # Python identifiers, but the token types used by the
-        # user are arbitrary strings, we auto-generate the group
-        # names and map them to token types.
-        #
-        idx = 1
-        regex_parts = []
-        self.group_type = {}
-
-        for regex, type in rules:
-            groupname = 'GROUP%s' % idx
-            regex_parts.append('(?P<%s>%s)' % (groupname, regex))
-            self.group_type[groupname] = type
-            idx += 1
-
-        self.regex = re.compile('|'.join(regex_parts))
+        self.regex, self.group_type, self._types = _compile_rules(rules, skip_whitespace)
         self.skip_whitespace = skip_whitespace
-        self.re_ws_skip = re.compile('\S')
+        self.buf = ''
+        self.pos = 0
 
     def input(self, buf):
         """ Initialize the lexer with a buffer as input.
@@ -82,35 +130,46 @@ class Lexer(object):
             input buffer. None is returned if the end of the
             buffer was reached.
             In case of a lexing error (the current chunk of the
-            buffer matches no rule), a LexerError is raised with
-            the position of the error.
+            buffer matches no rule or only the empty string), a
+            LexerError is raised with the position of the error.
+        """
+        buf = self.buf
+        pos = self.pos
+        while pos < len(buf):
+            m = self.regex.match(buf, pos)
+            if m is None or m.end() == pos:
+                self.pos = pos
+                raise LexerError(pos)
+            tok_type = self._types[m.lastindex]
+            self.pos = m.end()
+            if tok_type is not None:
+                return Token(tok_type, m.group(), pos)
+            # skipped whitespace
+            pos = self.pos
+        self.pos = pos
+        return None
+
+    def tuples(self):
+        """ Returns an iterator to the tokens found in the buffer
+            as tuples (type, val, pos). This avoids creating a
+            Token object per token.
         """
-        if self.pos >= len(self.buf):
-            return None
-        else:
-            if self.skip_whitespace:
-                m = self.re_ws_skip.search(self.buf, self.pos)
-
-                if m:
-                    self.pos = m.start()
-                else:
-                    return None
-
-            m = self.regex.match(self.buf, self.pos)
-            if m:
-                groupname = m.lastgroup
-                tok_type = self.group_type[groupname]
-                tok = Token(tok_type, m.group(groupname), self.pos)
-                self.pos = m.end()
-                return tok
-
-            # if we're here, no rule matched
-            raise LexerError(self.pos)
+        buf = self.buf
+        pos = self.pos
+        types = self._types
+        for m in self.regex.finditer(buf, pos):
+            start, end = m.span()
+            if start != pos or start == end:
+                # no rule matches at pos, or only the empty string
+                break
+            pos = self.pos = end
+            tok_type = types[m.lastindex]
+            if tok_type is not None:
+                yield (tok_type, m.group(), start)
+        if pos < len(buf):
+            raise LexerError(pos)
 
     def tokens(self):
         """ Returns an iterator to the tokens found in the buffer.
         """
-        while 1:
-            tok = self.token()
-            if tok is None: break
-            yield tok
+        return starmap(Token, self.tuples())
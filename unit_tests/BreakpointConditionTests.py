@@ -0,0 +1,48 @@
+#  BreakpointConditionTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest
+import tests_common
+from BreakpointCondition import BreakpointCondition
+from DebuggerExceptions import DebuggingException
+
+class BreakpointConditionTests(unittest.TestCase):
+    @staticmethod
+    def _stack(**bindings):
+        return [{"file": "/f.lw", "line": 3, "macro": "root",
+                 "bindings": [{"VarType": "auxiliary", "Ident": k, "Val": v} for k, v in bindings.items()]}]
+
+    def test_condition(self):
+        condition = BreakpointCondition("i0 == 37")
+        self.assertFalse(condition.hit(self._stack(i0=36)))
+        self.assertTrue(condition.hit(self._stack(i0=37)))
+        self.assertEqual((condition.hits, condition.filtered), (2, 1))
+
+        condition = BreakpointCondition("a < b and b<=10 or a >= 100")
+        self.assertTrue(condition.hit(self._stack(a=1, b=10)))
+        self.assertFalse(condition.hit(self._stack(a=1, b=11)))
+        self.assertFalse(condition.hit(self._stack(a=10, b=10)))
+        self.assertTrue(condition.hit(self._stack(a=10**40, b=0)))
+        # unknown variables never filter a hit
+        self.assertTrue(condition.hit(self._stack(x=0)))
+
+        for invalid in ["", "i0 = 1", "i0 == -1", "i0 == 1 and", "(i0 == 1)"]:
+            self.assertRaises(DebuggingException, BreakpointCondition, invalid)
+
+    def test_hit_count(self):
+        condition = BreakpointCondition(hit_count=3)
+        self.assertEqual([condition.hit(self._stack()) for i in range(5)],
+                         [False, False, True, True, True])
+        self.assertEqual(condition.filtered, 2)
+        condition.reset_counters()
+        self.assertEqual((condition.hits, condition.filtered), (0, 0))
+
+        condition = BreakpointCondition("a != 0", 2)
+        self.assertEqual([condition.hit(self._stack(a=a)) for a in [1, 0, 1]], [False, False, True])
+        self.assertRaises(DebuggingException, BreakpointCondition, None, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,12 +5,15 @@
 #
 
 import sys, unittest
-import time, os
+import time, os, select, json, threading
 
 import tests_common
-from Debugger import Debugger, DebuggerTelegram, TelegramType, DebuggerState
+from Debugger import Debugger, DebuggerTelegram, TelegramType, DebuggerState, diff_stacktraces
+import Debugger as DebuggerModule
+from Stacktrace import LazyStacktrace
 from DebuggerExceptions import DebuggerErrorMessage, CompilerErrorMessage, DebuggingException
 from SessionManager import SessionManager
+import DebuggerTransport
 
 class DebuggerTests(unittest.TestCase):
     _next_session = 0
@@ -28,7 +31,7 @@ class DebuggerTests(unittest.TestCase):
 
     @staticmethod
     def setUpClass():
-        DebuggerTests._session_manager = SessionManager("user_src", 20)
+        DebuggerTests._session_manager = SessionManager("user_src", 20, 20)
 
     @staticmethod
     def tearDownClass():
@@ -179,6 +182,118 @@ class DebuggerTests(unittest.TestCase):
 
         # TODO: test parse errors
 
+    # The fast path and the lexer based parser must produce the same telegrams
+    def test_parse_debugger_output_fast_path(self):
+        for telegram in ["""2 6 -1 [{"file":"/somefolder/test#123.lw","line":6,"macro":"root","bindings":[{"VarType":"input","Ident":"x","Val":5}]}]# Stepped.""",
+                         """0 7 1 [{"file":"/somefolder/test123.lw","line":7,"macro":"root","bindings":[]}]# Breakpoint 1 reached.""",
+                         """1 7 1# Breakpoint 1 set."""]:
+            fast = Debugger.parse_debugger_output(telegram)
+            slow = Debugger._parse_debugger_output_lexer(telegram)
+            self.assertEqual((fast.ttype, fast.line_no, fast.breakpoint_no, fast.data, fast.raw_data),
+                             (slow.ttype, slow.line_no, slow.breakpoint_no, slow.data, slow.raw_data))
+            if fast.data is not None:
+                self.assertEqual(json.loads(fast.raw_data), fast.data)
+
+        # malformed telegrams are handled by the lexer based parser
+        self.assertRaises(DebuggerErrorMessage, Debugger.parse_debugger_output, "Statement x in line 3 has no breakpoint.")
+
+    def test_parse_big_values(self):
+        value = "12345678901234567890" + 10000 * "5" + "09876543210987654321"
+        telegram = ('2 6 -1 [{"file":"/tmp/f.lw","line":6,"macro":"root","bindings":'
+                    + '[{"VarType":"input","Ident":"x","Val":5},{"VarType":"output","Ident":"y","Val":'
+                    + value + '}]}]# Stepped.')
+        resp = Debugger.parse_debugger_output(telegram)
+        self.assertEqual(resp.data[0]["bindings"][0]["Val"], 5)
+        self.assertEqual(resp.data[0]["bindings"][1]["Val"],
+                         "12345678901234567890...09876543210987654321 (10040 digits)")
+        self.assertEqual(resp.big_values, {(0, "y"): value})
+        # the raw JSON contains the full values, so it can not be served
+        self.assertEqual(resp.raw_data, None)
+
+        # values differing only in the middle digits have equal previews, but
+        # are compared by their full values
+        changed = Debugger.parse_debugger_output(telegram.replace(value, value[:100] + "6" + value[101:]))
+        preview = changed.data[0]["bindings"][1]["Val"]
+        self.assertEqual(preview, resp.data[0]["bindings"][1]["Val"])
+        self.assertEqual(diff_stacktraces(resp.data, changed.data)["update"],
+                         [{"frame": 0, "line": 6, "bindings": [[1, preview]]}])
+        self.assertNotEqual(Debugger._binding_value(changed.data, 0, "y"),
+                            Debugger._binding_value(resp.data, 0, "y"))
+        self.assertEqual(Debugger._binding_value(resp.data, 0, "y"), value)
+
+        resp = Debugger.parse_debugger_output(telegram.replace(value, "1" + 39 * "0"))
+        self.assertEqual(resp.data[0]["bindings"][1]["Val"], 10**39)
+        self.assertEqual(resp.big_values, {})
+        self.assertNotEqual(resp.raw_data, None)
+
+    @staticmethod
+    def _deep_telegram(depth, top_line):
+        frames = ['{"file":"/tmp/f.lw","line":' + str(top_line) + ',"macro":"rec","bindings":'
+                  + '[{"VarType":"input","Ident":"n","Val":0}]}']
+        frames += ['{"file":"/tmp/f.lw","line":4,"macro":"rec","bindings":'
+                   + '[{"VarType":"input","Ident":"n","Val":' + str(n) + '}]}' for n in range(1, depth)]
+        return "2 " + str(top_line) + " -1 [" + ",".join(frames) + "]# Stepped."
+
+    def test_lazy_stacktrace(self):
+        resp = Debugger.parse_debugger_output(self._deep_telegram(500, 3))
+        stacktrace = resp.data
+        self.assertEqual(len(stacktrace), 500)
+        self.assertEqual(stacktrace.decoded_count(), 0)
+        self.assertEqual(stacktrace[0]["line"], 3)
+        self.assertEqual(stacktrace[-1]["bindings"][0]["Val"], 499)
+        self.assertEqual(stacktrace.decoded_count(), 2)
+        self.assertEqual(stacktrace, json.loads(resp.raw_data))
+
+        # unchanged frames are not decoded to compute a diff
+        next_stacktrace = Debugger.parse_debugger_output(self._deep_telegram(500, 2)).data
+        diff = diff_stacktraces(stacktrace, next_stacktrace)
+        self.assertEqual(diff, {"reset": False, "pop": 0, "push": [],
+                                "update": [{"frame": 499, "line": 2, "bindings": []}]})
+        self.assertEqual(next_stacktrace.decoded_count(), 1)
+
+        # other formatting is decoded, too
+        formatted = json.dumps(json.loads(resp.raw_data), indent=1)
+        self.assertEqual(LazyStacktrace(formatted), stacktrace)
+        self.assertEqual(len(LazyStacktrace("[]")), 0)
+
+    # Applies a diff generated by diff_stacktraces() like the client does
+    @staticmethod
+    def _apply_stack_diff(stack, diff):
+        frames = [] if diff["reset"] else [dict(f, bindings=[dict(b) for b in f["bindings"]]) for f in stack[::-1]]
+        del frames[len(frames) - diff["pop"]:]
+        for update in diff["update"]:
+            frames[update["frame"]]["line"] = update["line"]
+            for index, val in update["bindings"]:
+                frames[update["frame"]]["bindings"][index]["Val"] = val
+        frames += diff["push"]
+        return frames[::-1]
+
+    def test_diff_stacktraces(self):
+        def frame(macro, line, **bindings):
+            return {"file": "/f.lw", "line": line, "macro": macro,
+                    "bindings": [{"VarType": "input", "Ident": k, "Val": v} for k, v in bindings.items()]}
+        stacks = [[frame("root", 3, i0=1, o0=0)],
+                  [frame("root", 4, i0=1, o0=0)],
+                  [frame("mul", 7, x=1, y=2), frame("root", 4, i0=1, o0=0)],
+                  [frame("mul", 8, x=1, y=3), frame("root", 4, i0=1, o0=0)],
+                  [frame("add", 12, a=3), frame("mul", 8, x=1, y=3), frame("root", 4, i0=1, o0=0)],
+                  [frame("root", 5, i0=1, o0=3)],
+                  [frame("mul", 7, x=5, z=0), frame("root", 5, i0=1, o0=3)]]
+        client = None
+        for stack in stacks:
+            diff = diff_stacktraces(client, stack)
+            client = self._apply_stack_diff(client, diff)
+            self.assertEqual(client, stack)
+
+        # binding changes only contain the changed values
+        diff = diff_stacktraces(stacks[2], stacks[3])
+        self.assertEqual(diff, {"reset": False, "pop": 0, "push": [],
+                                "update": [{"frame": 1, "line": 8, "bindings": [[1, 3]]}]})
+        # frames with other variables are replaced
+        diff = diff_stacktraces(stacks[5], stacks[6])
+        self.assertEqual(diff["pop"], 0)
+        self.assertEqual(diff["push"], [stacks[6][0]])
+
     # Test debugging of test program simple.lw
     def test_program_simple1(self):
         print("\n== start test_program_simple1 ==")
@@ -446,6 +561,385 @@ class DebuggerTests(unittest.TestCase):
         d.close()
 
 
+    # The port of a debugger session must be released in every teardown path
+    def test_port_release(self):
+        in_use = DebuggerTransport.get_port_metrics()["in_use"]
+        with open("test_programs/simple.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        self.assertEqual(DebuggerTransport.get_port_metrics()["in_use"], in_use + 1)
+        d.kill()
+        self.assertEqual(DebuggerTransport.get_port_metrics()["in_use"], in_use)
+
+        # failed start due to a syntax error
+        d = Debugger("in: x;\nout: y;\ny := x +;\n", self._next_session_id(), DebuggerTests._session_manager)
+        self.assertTrue(d.is_failed())
+        d.close()
+        self.assertEqual(DebuggerTransport.get_port_metrics()["in_use"], in_use)
+
+    # A syntax error is reported as soon as the debugger process terminates
+    def test_failed_start_latency(self):
+        start = time.perf_counter()
+        d = Debugger("in: x;\nout: y;\ny := x +;\n", self._next_session_id(), DebuggerTests._session_manager)
+        self.assertLess(time.perf_counter() - start, DebuggerModule.DEBUGGER_ACCEPT_TIMEOUT / 2)
+        self.assertTrue(d.is_failed())
+        self.assertIn("unexpected", d.poll_user_output())
+        d.close()
+
+    def test_response_latencies(self):
+        with open("test_programs/simple.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.set_breakpoint(6)
+        self.assertRaises(DebuggerErrorMessage, d.set_breakpoint, 2)
+        latencies = d.get_response_latencies()
+        # line 2 is rejected by the session without a command
+        self.assertEqual(sum(latencies["setbreakpoint"].values()), 1)
+
+        # the reader thread wakes up observers via the notify pipe
+        notify_fd = d.get_file_descriptors()[0]
+        d.acknowledge_notifications()
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        r, _, _ = select.select([notify_fd], [], [], 2.0)
+        self.assertEqual(r, [notify_fd])
+        time.sleep(0.1)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        d.acknowledge_notifications()
+        r, _, _ = select.select([notify_fd], [], [], 0)
+        self.assertEqual(r, [])
+
+        d.step_over()
+        time.sleep(0.2)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(sum(d.get_response_latencies()["step"].values()), 1)
+        d.kill()
+
+    def test_set_breakpoints(self):
+        with open("test_programs/simple.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        result = d.set_breakpoints([6, 2, 8, 9])
+        self.assertEqual(result[6], None)
+        self.assertIsInstance(result[2], DebuggerErrorMessage)
+        self.assertEqual(result[8], None)
+        self.assertEqual(result[9], None)
+        self.assertEqual(d.get_breakpoints(), {6, 8, 9})
+
+        result = d.sync_breakpoints([6, 7])
+        self.assertEqual(result, {7: None})
+        self.assertEqual(d.get_breakpoints(), {6, 7})
+
+        # breakpoints are transferred to the restarted debugger process
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        time.sleep(0.2)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 6)
+        d.sync_breakpoints([6])
+        d.resume()
+        time.sleep(0.3)
+        self.assertEqual(d.poll_state(), DebuggerState.NOTSTARTED)
+        self.assertEqual(d.get_breakpoints(), {6})
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        time.sleep(0.2)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 6)
+        d.kill()
+
+    # A session is reset in place to debug the same program again
+    def test_reset(self):
+        with open("test_programs/simple.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        self.assertEqual(d.get_program_hash(), Debugger.program_hash(code))
+        self.assertNotEqual(d.get_program_hash(), Debugger.program_hash(code + "\n"))
+        d.set_breakpoint(6)
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        time.sleep(0.2)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+
+        self.assertTrue(d.reset())
+        self.assertEqual(d.poll_state(), DebuggerState.NOTSTARTED)
+        self.assertEqual(d.get_breakpoints(), {6})
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        time.sleep(0.2)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 6)
+        d.kill()
+        self.assertFalse(d.reset())
+
+    def test_breakpoint_validation(self):
+        with open("test_programs/structure.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        # the structure index agrees with the debugger process on every line
+        structure = d.get_program_structure()
+        d._structure = None
+        result = d.set_breakpoints(range(1, structure.line_count + 1))
+        self.assertEqual({line_no for line_no, error in result.items() if error is None},
+                         structure.breakpoint_lines)
+        d.sync_breakpoints([])
+        d._structure = structure
+
+        # invalid lines are rejected without a debugger round trip
+        d.kill()
+        self.assertRaises(DebuggerErrorMessage, d.set_breakpoint, 2)
+
+    def test_big_values(self):
+        with open("test_programs/bignum.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.set_breakpoint(9)
+        d.run()
+        d.process_user_input("17")
+        time.sleep(0.5)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        bindings = d.last_stacktrace()[0]["bindings"]
+        # 2^(2^17) has 39457 digits
+        self.assertEqual(bindings[1]["Ident"], "x")
+        self.assertTrue(bindings[1]["Val"].endswith("(39457 digits)"))
+        x = d.get_binding_value(0, "x")
+        self.assertEqual(len(x), 39457)
+        self.assertEqual(int(x[-20:]), 2**(2**17) % 10**20)
+        self.assertEqual(d.get_binding_value(0, "n"), "17")
+        self.assertRaises(DebuggingException, d.get_binding_value, 1, "x")
+
+        d.step_over()
+        self.assertEqual(d.last_stacktrace()[0]["line"], 10)
+        y = d.get_binding_value(0, "y")
+        self.assertEqual(y[:-1], x[:-1])
+        self.assertEqual(int(y[-1]), int(x[-1]) + 1)
+        self.assertEqual(json.loads(d.last_stacktrace_json())[0]["bindings"][2]["Val"],
+                         d.last_stacktrace()[0]["bindings"][2]["Val"])
+        d.kill()
+
+    def test_stacktrace_json(self):
+        with open("test_programs/simple.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.enable_trace_recording()
+        self.assertEqual(d.last_stacktrace_json(), None)
+        d.set_breakpoint(6)
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        time.sleep(0.2)
+        stacktrace = d.last_stacktrace()
+        encoded = d.last_stacktrace_json()
+        self.assertEqual(json.loads(encoded), stacktrace)
+        # the JSON text of the telegram is served without encoding it again
+        self.assertIs(d.last_stacktrace_json(), encoded)
+
+        d.step_over()
+        d.last_stacktrace()
+        self.assertTrue(d.step_back())
+        # stacktraces from the trace are encoded on demand, at most once
+        encoded = d.pop_last_stacktrace_json()
+        self.assertEqual(json.loads(encoded), stacktrace)
+        self.assertEqual(d.pop_last_stacktrace_json(), None)
+        d.kill()
+
+    def test_pop_stacktrace_diff(self):
+        with open("test_programs/simple.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.set_breakpoint(6)
+        d.run()
+        d.process_user_input("2")
+        d.process_user_input("3")
+        time.sleep(0.2)
+        stacktrace = d.last_stacktrace()
+        self.assertEqual(d.pop_stacktrace_diff(), diff_stacktraces(None, stacktrace))
+        self.assertEqual(d.pop_stacktrace_diff(), None)
+
+        d.step_over()
+        next_stacktrace = d.last_stacktrace()
+        diff = diff_stacktraces(stacktrace, next_stacktrace)
+        self.assertFalse(diff["reset"])
+        self.assertEqual(d.pop_stacktrace_diff(), diff)
+        # a full diff does not depend on the stacktrace of the previous diff
+        d.reset_stacktrace_diff()
+        self.assertEqual(d.pop_stacktrace_diff(True), diff_stacktraces(None, next_stacktrace))
+
+        # observers are notified to send the stacktrace again after a reset
+        notify_fd = d.get_file_descriptors()[0]
+        d.acknowledge_notifications()
+        d.reset_stacktrace_diff()
+        r, _, _ = select.select([notify_fd], [], [], 0)
+        self.assertEqual(r, [notify_fd])
+        self.assertEqual(d.pop_stacktrace_diff(), diff_stacktraces(None, next_stacktrace))
+        d.kill()
+
+    def test_step_back(self):
+        with open("test_programs/loop.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.enable_trace_recording()
+        d.set_breakpoint(4)
+        d.run()
+        d.process_user_input("3")
+        time.sleep(0.2)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        stacks = [d.last_stacktrace()]
+        for i in range(4):
+            d.step_over()
+            stacks.append(d.last_stacktrace())
+        self.assertEqual([st[0]["line"] for st in stacks], [4, 5, 6, 5, 6])
+        self.assertEqual(d.get_trace_position(), (4, 0, 5))
+
+        # previous steps are served from the trace
+        self.assertTrue(d.step_back())
+        self.assertEqual(d.last_stacktrace(), stacks[3])
+        self.assertTrue(d.jump_to_step(1))
+        self.assertEqual(d.last_stacktrace(), stacks[1])
+        self.assertEqual(d.get_trace_position(), (1, 0, 5))
+        self.assertTrue(d.step_back())
+        self.assertFalse(d.step_back())
+        self.assertEqual(d.last_stacktrace(), stacks[0])
+
+        # stepping forwards replays the trace up to the current step
+        for i in range(1, 5):
+            d.step_over()
+            self.assertEqual(d.last_stacktrace(), stacks[i])
+        self.assertEqual(d.get_trace_position(), (4, 0, 5))
+        d.step_over()
+        self.assertEqual(d.last_stacktrace()[0]["line"], 5)
+        self.assertEqual(d.get_trace_position(), (5, 0, 6))
+        d.kill()
+
+    def test_multi_step(self):
+        with open("test_programs/iterations.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.run_and_stop_at_first_line()
+        d.process_user_input("1000")
+        time.sleep(0.2)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 5)
+
+        def value(ident):
+            return DebuggerModule.Debugger._binding_value(d.last_stacktrace(), 0, ident)
+
+        # iteration 500 of the loop
+        self.assertTrue(d.run_until_iteration(500))
+        self.assertTrue(d.wait_for_multi_step(10))
+        self.assertEqual(d.last_stacktrace()[0]["line"], 6)
+        self.assertEqual(value("i"), 499)
+
+        self.assertTrue(d.step_n(3))
+        self.assertTrue(d.wait_for_multi_step(10))
+        self.assertEqual(d.last_stacktrace()[0]["line"], 6)
+        self.assertEqual(value("i"), 500)
+
+        self.assertTrue(d.run_until_variable_changes("sum"))
+        self.assertTrue(d.wait_for_multi_step(10))
+        self.assertEqual(d.last_stacktrace()[0]["line"], 5)
+        self.assertEqual(value("sum"), sum(range(502)))
+        self.assertRaises(DebuggingException, d.run_until_variable_changes, "x")
+
+        d.run_to_line(9)
+        time.sleep(0.3)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 9)
+        self.assertEqual(value("i"), 1000)
+        self.assertEqual(d.get_breakpoints(), set())
+        self.assertRaises(DebuggingException, d.run_until_iteration, 1)
+        self.assertRaises(DebuggerErrorMessage, d.run_to_line, 3)
+        d.kill()
+
+    # A second run_to_line() before the first one pauses replaces its
+    # temporary breakpoint
+    def test_run_to_line_twice(self):
+        with open("test_programs/iterations.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.run_and_stop_at_first_line()
+        d.process_user_input("1000000")
+        time.sleep(0.2)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 5)
+        d.run_to_line(9)
+        d.run_to_line(7)
+        time.sleep(0.3)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 7)
+        self.assertEqual(d.get_breakpoints(), set())
+        d.kill()
+
+    # Commands of concurrent threads are executed one after another by the
+    # session thread, so no response is assigned to the wrong command
+    def test_concurrent_commands(self):
+        with open("test_programs/iterations.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        lines = sorted(d.get_program_structure().breakpoint_lines)
+        errors = []
+
+        def toggle_breakpoints(line_no):
+            for i in range(20):
+                try:
+                    d.set_breakpoint(line_no)
+                    d.remove_breakpoint(line_no)
+                except Exception as e:
+                    errors.append(e)
+        threads = [threading.Thread(target=toggle_breakpoints, args=(line_no,)) for line_no in lines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(d.get_breakpoints(), set())
+
+        d.run_and_stop_at_first_line()
+        d.process_user_input("100")
+        time.sleep(0.2)
+        self.assertTrue(d.step_n(50))
+        # commands posted during a multi-step command are executed in order
+        d.set_breakpoint(lines[-1])
+        self.assertEqual(d.get_breakpoints(), {lines[-1]})
+        self.assertTrue(d.wait_for_multi_step(10))
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        d.kill()
+
+    def test_conditional_breakpoint(self):
+        with open("test_programs/iterations.lw", "r") as input_file:
+            code = input_file.read()
+        d = Debugger(code, self._next_session_id(), DebuggerTests._session_manager)
+        d.set_conditional_breakpoint(7, "i == 37")
+        d.set_conditional_breakpoint(6, hit_count=50)
+        self.assertRaises(DebuggingException, d.set_conditional_breakpoint, 9, "i =")
+        self.assertEqual(d.get_breakpoints(), {6, 7})
+        d.run()
+        d.process_user_input("100")
+        time.sleep(0.3)
+        self.assertEqual(d.poll_state(), DebuggerState.PAUSED)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 7)
+        self.assertEqual(d.last_stacktrace()[0]["bindings"][2]["Val"], 37)
+        self.assertEqual(d.get_breakpoint_statistics(), {"hits": 74, "filtered": 73})
+
+        d.resume()
+        time.sleep(0.3)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 6)
+        self.assertEqual(d.last_stacktrace()[0]["bindings"][2]["Val"], 49)
+        self.assertEqual(d.get_breakpoint_statistics(), {"hits": 99, "filtered": 97})
+
+        # an unconditional breakpoint pauses at every hit again
+        d.set_conditional_breakpoint(7)
+        d.resume()
+        time.sleep(0.3)
+        self.assertEqual(d.last_stacktrace()[0]["line"], 7)
+        self.assertEqual(d.last_stacktrace()[0]["bindings"][2]["Val"], 50)
+        d.remove_breakpoint(6)
+        self.assertEqual(d.get_breakpoint_statistics(), {"hits": 99, "filtered": 97})
+        d.kill()
+
     # Test debugging of test program multiply.lw
     def test_program_multiply(self):
         pass
@@ -0,0 +1,100 @@
+#  EvaluatorTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest, os, subprocess, tempfile
+import tests_common
+import Session
+import Evaluator
+from Evaluator import CompiledProgram, BudgetExceeded, evaluate
+
+# programs without input variables, that cover the semantics of lwre
+_PROGRAMS = [
+    "out: y; y := 5",
+    "out: y; aux: a; a := 7; y := a - 9",
+    "out: y; aux: a, b; a := 17; b := 5; a := a div b; y := 17 mod b; y := y * 10; y := y + a",
+    "out: y; aux: a; a := 3; y := a div 0; a := a mod 0; y := y + a",
+    "out: y; aux: a; a := 3; a := a == 3; y := 4 < 2; y := y + a; y := y >= 1",
+    "out: y; aux: a; a := succ(a); y := pred(a); y := pred(y)",
+    "out: y; aux: x; x := 3; loop x do x := x + 1; y := y + 1 enddo",
+    "out: y; aux: x; x := 10; while x != 0 do x := x - 1; y := y + 2 enddo",
+    "out: y; aux: x; x := 1; if x != 0 then y := 7 else y := 8 endif; if y != 0 then y := y + 1 endif",
+    "out: y; aux: x; if x != 0 then y := 7 else y := 8 endif",
+    "def m in: a; out: b; a := a + 1; b := a enddef\nout: y; aux: x; x := 4; y := m(x); y := y + x",
+    "def m in: a; out: b; aux: c; c := c + a; b := c enddef\nout: y; y := m(2); y := m(y)",
+    "def m in: a, b; out: c; c := n(a); c := c * b enddef\ndef n in: a; out: b; b := a + 1 enddef\n"
+    "def n in: a; out: b; b := a enddef\nout: y; y := m(2, 5)",
+    "#LOOP\nout: y; aux: a; a := 3; loop a do loop a do y := y + a enddo; a := pred(a) enddo",
+]
+
+class EvaluatorTests(unittest.TestCase):
+    @staticmethod
+    def _load(file_name):
+        with open("test_programs/" + file_name, "r") as input_file:
+            return input_file.read()
+
+    # runs lwre with source and the given input values, returns its output
+    @staticmethod
+    def _run_lwre(source, inputs=()):
+        with tempfile.NamedTemporaryFile("w", suffix=".lw") as program_file:
+            program_file.write(source)
+            program_file.flush()
+            proc = subprocess.run([Session._executable_path, program_file.name],
+                                  input="".join(str(value) + "\n" for value in inputs).encode(),
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=10)
+        return proc.stdout.decode()
+
+    # the results are the same as those of lwre for the test programs
+    def test_lwre_results(self):
+        inputs = {"bignum.lw": [(0,), (3,), (8,)], "iterations.lw": [(0,), (100,)],
+                  "loop.lw": [(0,), (25,)], "multiply.lw": [(0, 5), (6, 7)],
+                  "simple.lw": [(2, 3), (5, 6)], "structure.lw": [(0, 4), (3, 4), (5, 0)]}
+        for file_name in os.listdir("test_programs"):
+            if not file_name.endswith(".lw"):
+                continue
+            source = self._load(file_name)
+            program = CompiledProgram(source)
+            for values in inputs[file_name]:
+                output = self._run_lwre(source, values)
+                value = program.execute(values)
+                self.assertTrue(output.endswith(": " + program.format_output(value)),
+                                file_name + " " + str(values) + ": " + output)
+        for source in _PROGRAMS:
+            self.assertEqual(evaluate(source), self._run_lwre(source), source)
+
+    def test_fallback(self):
+        # input variables are read interactively by lwre
+        self.assertIsNone(evaluate(self._load("simple.lw")))
+        self.assertIsNone(evaluate("out: y; y := z"))
+        self.assertIsNone(evaluate(""))
+        # lwre panics when calling a macro without output variable
+        self.assertIsNone(evaluate("def m enddef\nout: y; y := m()"))
+        self.assertIsNone(evaluate("out: y; y := 1; while y != 0 do y := 1 enddo"))
+        self.assertIsNone(evaluate("out: y; y := 2; loop y do loop y do loop y do y := y * y enddo enddo enddo"))
+
+        program = CompiledProgram(self._load("bignum.lw"))
+        with self.assertRaises(BudgetExceeded):
+            program.execute((13,))
+        with self.assertRaises(BudgetExceeded):
+            program.execute((4,), max_bits=16)
+        with self.assertRaises(BudgetExceeded):
+            CompiledProgram(self._load("loop.lw")).execute((1000,), max_steps=1000)
+        self.assertEqual(program.execute((4,), max_bits=17), 2**16)
+
+    def test_workers(self):
+        source = "out: y; y := 6 * 7"
+        self.assertIsNone(Evaluator.run(source))
+        Evaluator.set_workers(1)
+        try:
+            self.assertEqual(Evaluator.run(source), "y: 42\n")
+            self.assertIsNone(Evaluator.run(self._load("simple.lw")))
+        finally:
+            Evaluator.set_workers(0)
+        self.assertIsNone(Evaluator.run(source))
+        with self.assertRaises(ValueError):
+            Evaluator.set_workers(-1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#  EventLogTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest, json
+import tests_common
+from EventLog import EventLog
+
+class EventLogTests(unittest.TestCase):
+    def test_sequence_numbers(self):
+        log = EventLog()
+        self.assertEqual(log.last_seq(), -1)
+        msg = log.append({"terminal": "a"})
+        self.assertEqual(json.loads(msg.decode()), {"terminal": "a", "seq": 0})
+        log.append({"terminal": "b"})
+        log.append({"terminal": "c"})
+        self.assertEqual(log.last_seq(), 2)
+
+        replayed = [json.loads(m.decode())["terminal"] for m in log.replay(0)]
+        self.assertEqual(replayed, ["b", "c"])
+        self.assertEqual(len(log.replay(-1)), 3)
+        self.assertEqual(log.replay(2), [])
+        self.assertTrue(log.is_complete_since(-1))
+        self.assertTrue(log.is_complete_since(2))
+
+    def test_bounds(self):
+        log = EventLog(max_events=3)
+        for i in range(5):
+            log.append({"terminal": str(i)})
+        replayed = [json.loads(m.decode())["terminal"] for m in log.replay(-1)]
+        self.assertEqual(replayed, ["2", "3", "4"])
+        self.assertFalse(log.is_complete_since(0))
+        self.assertTrue(log.is_complete_since(1))
+
+        log = EventLog(max_bytes=100)
+        for i in range(10):
+            log.append({"terminal": 20*str(i)})
+        self.assertTrue(sum(len(m) for m in log.replay(-1)) <= 100)
+
+        # the most recent message is always kept
+        log.append({"terminal": 200*"x"})
+        self.assertEqual(len(log.replay(-1)), 1)
+
+    def test_append_encoded(self):
+        log = EventLog()
+        msg = log.append_encoded(json.dumps({"terminal": "it's \"quoted\"", "debugger": ""}))
+        self.assertEqual(json.loads(msg.decode()), {"terminal": "it's \"quoted\"", "debugger": "", "seq": 0})
+        msg = log.append_encoded("{}")
+        self.assertEqual(json.loads(msg.decode()), {"seq": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,9 @@
 #
 
 import sys, unittest
+import socket, threading, os, time, fcntl
 import tests_common
-from IOTools import read_timeout
+from IOTools import LineBuffer, ConnectionClosed, LineTooLong, StreamReader
 
 class IOToolsTests(unittest.TestCase):
     def test_read(self):
@@ -17,3 +18,97 @@ class IOToolsTests(unittest.TestCase):
 
     def test_eof(self):
         pass
+
+    def test_line_buffer(self):
+        sock, peer = socket.socketpair()
+        line_buffer = LineBuffer(sock)
+        self.assertIsNone(line_buffer.poll_line())
+        peer.sendall(b"first\nsecond\nthi")
+        self.assertEqual(line_buffer.poll_line(), "first")
+        self.assertEqual(line_buffer.poll_line(), "second")
+        self.assertIsNone(line_buffer.poll_line())
+        peer.sendall(b"rd\n\n")
+        self.assertEqual(line_buffer.poll_line(), "third")
+        self.assertEqual(line_buffer.poll_line(), "")
+
+        # multi-byte characters split across several chunks
+        encoded = "ä€\U0001F600\n".encode()
+        for i in range(len(encoded)):
+            peer.sendall(encoded[i:i+1])
+            line = line_buffer.poll_line()
+        self.assertEqual(line, "ä€\U0001F600")
+
+        # a long line received in many chunks
+        long_line = "x" * (5 * LineBuffer.RECV_SIZE)
+        sender = threading.Thread(target=peer.sendall, args=(long_line.encode() + b"\nlast\nincomplete",))
+        sender.start()
+        received = None
+        while received is None:
+            received = line_buffer.poll_line()
+        sender.join()
+        self.assertEqual(received, long_line)
+        self.assertEqual(line_buffer.poll_line(), "last")
+
+        # incomplete lines are dropped, if the connection is closed
+        peer.close()
+        self.assertRaises(ConnectionClosed, line_buffer.poll_line)
+        sock.close()
+
+    def test_line_buffer_limit(self):
+        sock, peer = socket.socketpair()
+        line_buffer = LineBuffer(sock, "\r\n", max_line_size=10)
+        peer.sendall(b"0123456789\r\n0123456789A\r\nok\r\n")
+        self.assertEqual(line_buffer.poll_line(), "0123456789")
+        self.assertRaises(LineTooLong, line_buffer.poll_line)
+        self.assertEqual(line_buffer.poll_line(), "ok")
+
+        # lines without delimiter are skipped as soon as they exceed the limit
+        peer.sendall(b"0123456789ABCDEF")
+        self.assertRaises(LineTooLong, line_buffer.poll_line)
+        peer.sendall(b"GHIJKLMNOPQRSTUVWXYZ\r")
+        self.assertIsNone(line_buffer.poll_line())
+        peer.sendall(b"\nok\r\n")
+        self.assertEqual(line_buffer.poll_line(), "ok")
+        self.assertIsNone(line_buffer.poll_line())
+        peer.close()
+        sock.close()
+
+    def test_stream_reader(self):
+        r, w = os.pipe()
+        os.set_blocking(r, False)
+        # room for more data, than the reader reads per call
+        fcntl.fcntl(w, fcntl.F_SETPIPE_SZ, 2 * StreamReader.MAX_READ_SIZE)
+        with os.fdopen(r, "rb") as stream:
+            reader = StreamReader(stream)
+            self.assertEqual(reader.read(), "")
+            start = time.monotonic()
+            self.assertEqual(reader.read(timeout=0.1), "")
+            self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+            # multi-byte characters split across several reads
+            encoded = "ä€\U0001F600".encode()
+            os.write(w, encoded[:1])
+            self.assertEqual(reader.read(), "")
+            os.write(w, encoded[1:4])
+            self.assertEqual(reader.read(), "ä")
+            os.write(w, encoded[4:])
+            self.assertEqual(reader.read(), "€\U0001F600")
+
+            # all available data is read at once
+            os.write(w, b"x" * (3 * StreamReader.BUFFER_SIZE // 2))
+            self.assertEqual(reader.read(), "x" * (3 * StreamReader.BUFFER_SIZE // 2))
+
+            # but not more than MAX_READ_SIZE bytes
+            os.write(w, b"y" * (3 * StreamReader.MAX_READ_SIZE // 2))
+            self.assertEqual(reader.read(), "y" * StreamReader.MAX_READ_SIZE)
+            self.assertEqual(reader.read(), "y" * (StreamReader.MAX_READ_SIZE // 2))
+
+            # waits for data until the timeout expires
+            threading.Timer(0.05, os.write, args=(w, b"late")).start()
+            self.assertEqual(reader.read(timeout=2), "late")
+
+            os.write(w, b"end\xc3")
+            os.close(w)
+            self.assertEqual(reader.read(timeout=2), "end\ufffd")
+            self.assertTrue(reader.eof)
+            self.assertEqual(reader.read(timeout=2), "")
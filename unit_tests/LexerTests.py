@@ -5,7 +5,7 @@
 #
 
 import sys, unittest
-from external_libs.lexer import Lexer, LexerError
+from external_libs.lexer import Lexer, LexerError, Token
 
 class LexerTests(unittest.TestCase):
     def test_simple(self):
@@ -76,3 +76,51 @@ class LexerTests(unittest.TestCase):
             self.assertEqual(err.pos, 3)
         self.assertTrue(error_occurred)
 
+    def test_tuples(self):
+        rules = [
+            ('\d+',             'NUMBER'),
+            ('[a-zA-Z_](\w)*',  'IDENTIFIER'),
+            (':=',              'ASSIGNMENT'),
+            (';',               'SEMICOLON'),
+        ]
+
+        l = Lexer(rules, skip_whitespace=True)
+        l.input(' x0 := 12;\n ')
+        expected = [('IDENTIFIER', 'x0', 1), ('ASSIGNMENT', ':=', 4), ('NUMBER', '12', 7),
+                    ('SEMICOLON', ';', 9)]
+        self.assertEqual(list(l.tuples()), expected)
+        l.input(' x0 := 12;\n ')
+        self.assertEqual([(token.type, token.val, token.pos) for token in l.tokens()], expected)
+
+        l = Lexer(rules, skip_whitespace=False)
+        l.input('x0:=12 ;')
+        with self.assertRaises(LexerError) as cm:
+            list(l.tuples())
+        self.assertEqual(cm.exception.pos, 6)
+        self.assertEqual(l.pos, 6)
+
+    def test_shared_rules(self):
+        rules = [('\d+', 'NUMBER'), ('\+', 'PLUS')]
+        # the rules are compiled only once
+        self.assertIs(Lexer(rules).regex, Lexer(list(rules)).regex)
+        self.assertIsNot(Lexer(rules, True).regex, Lexer(rules, False).regex)
+
+        token = Token('NUMBER', '1', 0)
+        with self.assertRaises(AttributeError):
+            token.line = 1
+
+    def test_empty_match(self):
+        # a rule, that matches the empty string, does not produce tokens
+        rules = [('\+', 'PLUS'), ('\d*', 'NUMBER')]
+        l = Lexer(rules, skip_whitespace=False)
+        l.input('1+ 2')
+        with self.assertRaises(LexerError) as cm:
+            list(l.tokens())
+        self.assertEqual(cm.exception.pos, 2)
+
+        l.input('1+ 2')
+        self.assertEqual(l.token().val, '1')
+        self.assertEqual(l.token().val, '+')
+        with self.assertRaises(LexerError) as cm:
+            l.token()
+        self.assertEqual(cm.exception.pos, 2)
@@ -0,0 +1,121 @@
+#  LoopWhileParserTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest, os, re, subprocess, tempfile
+import tests_common
+import Session
+from LoopWhileParser import parse, check_program, ParserError, Assignment, Loop, If, MacroCall
+
+# invalid programs and the first line of the messages of lwre
+_INVALID_PROGRAMS = [
+    ("in: x; out: y; y := 1 1;",
+     "unexpected integer, expected ';' in line 1, pos 23."),
+    ("in: x; out: y;\nloop 1 do y := x enddo",
+     "unexpected integer, expected <identifier> as loop condition in line 2, pos 6."),
+    ("in: x; out: y;\nwhile x != y do y := x enddo",
+     "unexpected identifier, expected condition '<identifier> != 0' in line 2, pos 12."),
+    ("in: x; out: y;\nif x != 0 y := 1 endif",
+     "unexpected identifier, expected then in line 2, pos 11."),
+    ("in: x y; out: y;",
+     "unexpected identifier, expected ',' in line 1, pos 7."),
+    ("in: x; out: y, z;",
+     "unexpected ,, only one output variable is allowed in line 1, pos 14."),
+    ("def m in: a; out: b; b := 1\n\nin: x; out: y;",
+     "unexpected in:, missing enddef? in line 3, pos 1."),
+    ("in: x; out: y;\ny := x +\n",
+     "unexpected $end in line 3, pos 10."),
+    ("in: x; out: y;\ny := x # 1",
+     "Unrecognised token in line 2, pos 8."),
+    ("in: x; out: y;\nif x != 1 then y := 1 endif",
+     "'if' condition must be of the form '<variable> != 0' in line 2."),
+    ("#LOOP\nin: x; out: y;\nwhile x != 0 do x := x - 1 enddo",
+     "LOOP program contains 'while' statement, aborting."),
+    ("in: x; out: y;\ny := z",
+     "Undeclared variable 'z' in line 2."),
+    ("in: x; out: y; aux: x;",
+     "Variable 'x' redeclared, first as \"input\" in line 1 and again as \"auxiliary\" in line 1"),
+    ("def m in: a, b; out: c; c := a enddef\nin: x; out: y;\ny := m(x)",
+     "Too few arguments to macro 'm' in line 3"),
+    ("def m in: a; out: b; b := n(a) enddef\ndef n in: a; out: b; b := m(a) enddef\nin: x; out: y;",
+     "Found cyclic dependency in macro definitions, aborting:"),
+]
+
+class LoopWhileParserTests(unittest.TestCase):
+    @staticmethod
+    def _program_files():
+        return [file_name for file_name in os.listdir("test_programs") if file_name.endswith(".lw")]
+
+    @staticmethod
+    def _load(file_name):
+        with open("test_programs/" + file_name, "r") as input_file:
+            return input_file.read()
+
+    # runs lwre with source, returns its output without time stamps
+    @staticmethod
+    def _run_lwre(source):
+        with tempfile.NamedTemporaryFile("w", suffix=".lw") as program_file:
+            program_file.write(source)
+            program_file.flush()
+            proc = subprocess.run([Session._executable_path, program_file.name], input=b"1\n1\n",
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=10)
+        return re.sub(r"(?m)^\d{4}/\d\d/\d\d \d\d:\d\d:\d\d ", "", proc.stdout.decode())
+
+    def test_parse(self):
+        program = parse(self._load("structure.lw"))
+        self.assertEqual([macro.name for macro in program.macros], ["multiply"])
+        macro = program.macros[0]
+        self.assertEqual([declaration.name for declaration in macro.declarations()], ["x", "y", "z", "t"])
+        self.assertIsInstance(macro.body[1], Loop)
+        self.assertEqual(macro.body[1].line, 7)
+
+        root = program.root
+        self.assertEqual([declaration.kind for declaration in root.declarations()],
+                         ["input", "input", "output", "auxiliary"])
+        self.assertIsInstance(root.body[0].expression, MacroCall)
+        self.assertEqual([argument.name for argument in root.body[0].expression.arguments], ["i0", "i1"])
+        self.assertIsInstance(root.body[1], If)
+        self.assertEqual(len(root.body[1].else_body), 1)
+        self.assertIsInstance(root.body[3], Assignment)
+        self.assertEqual(root.body[3].expression.operator, "+")
+
+    def test_errors(self):
+        for source, message in _INVALID_PROGRAMS:
+            with self.assertRaises(ParserError) as cm:
+                parse(source)
+            self.assertEqual(cm.exception.get_lines()[0], message)
+
+        with self.assertRaises(ParserError) as cm:
+            parse("in: x; out: y;\n\ty := x + ;")
+        self.assertEqual(cm.exception.get_lines(), ["unexpected ; in line 2, pos 11.",
+                                                    "\ty := x + ;",
+                                                    "          ^ unexpected token"])
+        output = check_program("in: x; out: y;\ny := z")
+        self.assertTrue(re.match(r"^\d{4}/\d\d/\d\d \d\d:\d\d:\d\d Undeclared variable 'z' in line 2.\n$",
+                                 output))
+
+    def test_valid_programs(self):
+        for file_name in self._program_files():
+            self.assertIsNone(check_program(self._load(file_name)), file_name)
+        # lwre fails on programs without root macro itself
+        self.assertIsNone(check_program(""))
+        self.assertIsNone(check_program("def m enddef"))
+
+    # the messages are the same as those of lwre, apart from the time stamps
+    def test_lwre_messages(self):
+        for source, message in _INVALID_PROGRAMS:
+            lines = self._run_lwre(source).splitlines()
+            self.assertEqual(lines[0], message)
+            with self.assertRaises(ParserError) as cm:
+                parse(source)
+            if cm.exception.pos is not None:
+                # lwre may show a garbled source line at the end of a program
+                self.assertEqual(lines[2], cm.exception.get_lines()[2])
+        for file_name in self._program_files():
+            self.assertTrue(self._run_lwre(self._load(file_name)).startswith(
+                            "Please type in values for global input variables:"), file_name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#  ProgramStructureTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest
+import tests_common
+from ProgramStructure import ProgramStructure
+
+class ProgramStructureTests(unittest.TestCase):
+    @staticmethod
+    def _load(file_name):
+        with open("test_programs/" + file_name, "r") as input_file:
+            return ProgramStructure(input_file.read())
+
+    def test_simple(self):
+        structure = self._load("simple.lw")
+        self.assertEqual(structure.breakpoint_lines, {6, 7, 8, 9, 10, 12})
+        self.assertEqual(structure.root_first_line, 6)
+        self.assertEqual(structure.macros, {})
+        self.assertTrue(structure.is_breakpoint_line(12))
+        self.assertFalse(structure.is_breakpoint_line(11))
+
+    def test_macros(self):
+        structure = self._load("multiply.lw")
+        self.assertEqual(structure.breakpoint_lines, {5, 6, 7, 13})
+        self.assertEqual(structure.root_first_line, 13)
+        macro = structure.macros["multiply"]
+        self.assertEqual((macro.def_line, macro.enddef_line, macro.first_line), (1, 9, 5))
+        self.assertEqual(macro.inputs, ["x", "y"])
+        self.assertEqual(macro.outputs, ["z"])
+
+    # lwre accepts declarations without a trailing ";"
+    def test_declaration_without_semicolon(self):
+        structure = ProgramStructure("def multiply\n  in: x, y\n  out: z\n  z := 0;\n  loop x do\n"
+                                     "    z := z + y;\n  enddo\nenddef\nin: i0, i1\nout: o0\n"
+                                     "o0 := multiply(i0, i1);\n")
+        self.assertEqual(structure.breakpoint_lines, {4, 5, 6, 11})
+        self.assertEqual(structure.root_first_line, 11)
+        macro = structure.macros["multiply"]
+        self.assertEqual((macro.inputs, macro.outputs, macro.first_line), (["x", "y"], ["z"], 4))
+        self.assertEqual([(loop.head_line, loop.first_line) for loop in structure.loops], [(5, 6)])
+
+    # comments, if-then-else, while and statements spanning several lines;
+    # the breakpoint lines have been determined with lwre
+    def test_control_structures(self):
+        structure = self._load("structure.lw")
+        self.assertEqual(structure.breakpoint_lines, {6, 7, 8, 15, 16, 17, 19, 21, 22, 24})
+        self.assertEqual(structure.root_first_line, 15)
+        self.assertEqual(structure.macros["multiply"].auxiliaries, ["t"])
+        self.assertEqual(structure.line_count, 26)
+
+    def test_loops(self):
+        structure = self._load("structure.lw")
+        self.assertEqual([(loop.head_line, loop.first_line, loop.enddo_line, loop.macro)
+                          for loop in structure.loops], [(7, 8, 9, "multiply"), (21, 22, 23, None)])
+        self.assertEqual(structure.innermost_loop(8).head_line, 7)
+        self.assertEqual(structure.innermost_loop(21).head_line, 21)
+        self.assertEqual(structure.innermost_loop(24), None)
+
+if __name__ == '__main__':
+    unittest.main()
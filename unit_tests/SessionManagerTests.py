@@ -5,12 +5,47 @@
 #
 
 import tests_common
-import sys, unittest
+import sys, unittest, tempfile, os
 from SessionManager import SessionManager
+import ReportGenerator
+
+class DummySession:
+    def __init__(self, code, sess_id, sess_man, client_addr):
+        self._sess_id = sess_id
+        self._client_addr = client_addr
+        self.timer_task = None
+        self.closed = False
+
+    def get_id(self):
+        return self._sess_id
+
+    def get_client_addr(self):
+        return self._client_addr
+
+    def close(self):
+        self.closed = True
+
+    @staticmethod
+    def get_timeout():
+        return 60
+
+class RecordingListener:
+    def __init__(self):
+        self.events = []
+
+    def session_closed(self, session):
+        # the session must be closed after its listeners got notified
+        self.events.append(("closed", session.get_id(), session.closed))
+
+    def session_restarting(self, session):
+        self.events.append(("restarting", session.get_id()))
+
+    def session_restarted(self, session):
+        self.events.append(("restarted", session.get_id()))
 
 class SessionManagerTests(unittest.TestCase):
     def test_create_check_delete(self):
-        sess_man = SessionManager("/dev/null", 20)
+        sess_man = SessionManager("/dev/null", 20, 20)
         sess_0 = sess_man._create_session_id()
         sess_1 = sess_man._create_session_id()
         self.assertTrue(sess_man.check_session_id(sess_0))
@@ -23,7 +58,7 @@ class SessionManagerTests(unittest.TestCase):
         self.assertFalse(sess_man.check_session_id(sess_0))
         sess_man.shutdown();
     def test_delete_exceptions(self):
-        sess_man = SessionManager("/dev/null", 20)
+        sess_man = SessionManager("/dev/null", 20, 20)
         passed = False
         try:
             sess_man._delete_session_id("1245241425215214");
@@ -34,7 +69,7 @@ class SessionManagerTests(unittest.TestCase):
         self.assertTrue(passed)
         sess_man.shutdown();
 
-        sess_man = SessionManager("/dev/null", 20)
+        sess_man = SessionManager("/dev/null", 20, 20)
         sess_id = sess_man._create_session_id()
         passed = False
         try:
@@ -46,5 +81,43 @@ class SessionManagerTests(unittest.TestCase):
         self.assertTrue(passed)
         sess_man.shutdown();
 
+    def test_listener(self):
+        report_file = tempfile.NamedTemporaryFile(delete=False)
+        report_file.close()
+        ReportGenerator.setup(report_file.name)
+        sess_man = SessionManager("/dev/null", 20, 20)
+        listener = RecordingListener()
+        sess_man.add_listener(listener)
+
+        session = sess_man.create(DummySession, "", "127.0.0.1")
+        sess_id = session.get_id()
+        sess_man.notify_session_restarting(session)
+        sess_man.notify_session_restarted(session)
+        sess_man.shutdown_session(session)
+        self.assertTrue(session.closed)
+        self.assertEqual(listener.events, [("restarting", sess_id), ("restarted", sess_id),
+                                           ("closed", sess_id, False)])
+        self.assertRaises(KeyError, sess_man.get_session, sess_id)
+
+        sess_man.remove_listener(listener)
+        session = sess_man.create(DummySession, "", "127.0.0.1")
+        sess_man.shutdown_session(session)
+        self.assertEqual(len(listener.events), 3)
+        sess_man.shutdown()
+        os.remove(report_file.name)
+
+    def test_renew_session(self):
+        report_file = tempfile.NamedTemporaryFile(delete=False)
+        report_file.close()
+        ReportGenerator.setup(report_file.name)
+        sess_man = SessionManager("/dev/null", 20, 20)
+        session_a = sess_man.create(DummySession, "", "127.0.0.1")
+
+        self.assertTrue(sess_man.renew_session(session_a))
+        sess_man.shutdown_session(session_a)
+        self.assertFalse(sess_man.renew_session(session_a))
+        sess_man.shutdown()
+        os.remove(report_file.name)
+
 if __name__ == '__main__':
     unittest.main()
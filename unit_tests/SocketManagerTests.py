@@ -7,6 +7,7 @@
 import sys, unittest
 import tests_common
 from SocketManager import SocketManager
+from ListeningSocket import ListeningSocket
 
 class SocketManagerTests(unittest.TestCase):
     def test_getters(self):
@@ -47,5 +48,37 @@ class SocketManagerTests(unittest.TestCase):
         m.release_socket(s2)
         m.release_socket(s3)
 
+    def test_release_and_metrics(self):
+        m = SocketManager(9995, 9996)
+        # allocate much more sockets than ports available to detect leaks
+        for i in range(50):
+            s = m.create_socket()
+            m.release_socket(s)
+        metrics = m.get_metrics()
+        self.assertEqual(metrics["in_use"], 0)
+        self.assertEqual(metrics["free"], 2)
+        self.assertEqual(metrics["peak_in_use"], 1)
+        self.assertEqual(metrics["allocations"], 50)
+
+        # double release is an error
+        self.assertRaises(KeyError, m.release_socket, s)
+
+    def test_bind_failure(self):
+        # occupy a port from outside of the SocketManager
+        blocker = ListeningSocket("127.0.0.1", 9995)
+        m = SocketManager(9995, 9996)
+        s = m.create_socket()
+        self.assertEqual(s.get_port_no(), 9996)
+        self.assertEqual(m.get_metrics()["bind_failures"], 1)
+        self.assertRaises(Exception, m.create_socket)
+        m.release_socket(s)
+        blocker.close()
+        # the port is available again
+        s1 = m.create_socket()
+        s2 = m.create_socket()
+        self.assertEqual({s1.get_port_no(), s2.get_port_no()}, {9995, 9996})
+        m.release_socket(s1)
+        m.release_socket(s2)
+
 if __name__ == '__main__':
     unittest.main()
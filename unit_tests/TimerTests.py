@@ -131,6 +131,21 @@ class TimerTests(unittest.TestCase):
         self.assertFalse(self.t.is_alive())
         self.assertEqual(counter.get(), 9)
 
+    def test_reschedule(self):
+        print("== test_reschedule ==")
+        counter = TimerTests.Counter()
+        self.t.start()
+        task = self.t.add_task(lambda : counter.add(2), 0.1)
+        self.t.add_task(lambda : counter.add(3), 0.2)
+        self.assertTrue(self.t.reschedule(task, 0.4))
+        time.sleep(0.3)
+        self.assertEqual(counter.get(), 3)
+        time.sleep(0.2)
+        self.assertEqual(counter.get(), 5)
+        # the task has already been executed
+        self.assertFalse(self.t.reschedule(task, 0.1))
+        self.t.close_and_flush()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,53 @@
+#  TraceRecorderTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest
+import tests_common
+from TraceRecorder import TraceRecorder
+
+class TraceRecorderTests(unittest.TestCase):
+    @staticmethod
+    def _stack(step):
+        root = {"file": "/f.lw", "line": 4 + step % 3, "macro": "root",
+                "bindings": [{"VarType": "input", "Ident": "i0", "Val": 10**30},
+                             {"VarType": "output", "Ident": "o0", "Val": step}]}
+        if step % 5 == 0:
+            return [{"file": "/f.lw", "line": 1, "macro": "m",
+                     "bindings": [{"VarType": "input", "Ident": "x", "Val": step}]}, root]
+        return [root]
+
+    def test_record_and_get(self):
+        trace = TraceRecorder(keyframe_interval=4)
+        for step in range(20):
+            self.assertEqual(trace.record(self._stack(step)), step)
+        self.assertEqual(len(trace), 20)
+        self.assertEqual(trace.first_step(), 0)
+        # backwards, forwards and random access
+        for step in list(range(19, -1, -1)) + list(range(20)) + [7, 2, 13]:
+            self.assertEqual(trace.get(step), self._stack(step))
+            self.assertEqual(trace.get_line(step), self._stack(step)[0]["line"])
+        self.assertRaises(IndexError, trace.get, 20)
+        self.assertRaises(IndexError, trace.get, -1)
+
+    def test_memory_limit(self):
+        trace = TraceRecorder(max_bytes=2000, keyframe_interval=4)
+        for step in range(200):
+            trace.record(self._stack(step))
+        self.assertEqual(len(trace), 200)
+        self.assertTrue(trace.memory_usage() <= 2000)
+        first = trace.first_step()
+        self.assertTrue(0 < first < 200)
+        self.assertEqual(first % 4, 0)
+        self.assertRaises(IndexError, trace.get, first - 1)
+        self.assertEqual(trace.get(first), self._stack(first))
+        self.assertEqual(trace.get(199), self._stack(199))
+
+        trace.clear()
+        self.assertEqual(len(trace), 0)
+        self.assertEqual(trace.memory_usage(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#  WebSocketsTests.py
+#
+#  Copyright 2020 Johannes Kern <johannes.kern@fau.de>
+#
+#
+
+import sys, unittest, os, threading
+import tests_common
+from EventLog import EventLog
+
+try:
+    import WebSockets
+except ImportError:
+    # autobahn and twisted are not installed
+    WebSockets = None
+
+MAX_SEND_BUFFER = 64*1024
+
+class _Session:
+    def __init__(self, fds):
+        self.event_log = EventLog()
+        self._fds = fds
+
+    def get_file_descriptors(self):
+        return self._fds
+
+    def reuse_session(self):
+        return True
+
+class _SessionManager:
+    def __init__(self, session):
+        self._session = session
+
+    def add_listener(self, listener):
+        pass
+
+    def get_session(self, sess_id):
+        return self._session
+
+# Connection, that pauses itself from within sendMessage() as soon as more
+# than MAX_SEND_BUFFER bytes are buffered, like the transports of twisted
+class _Connection:
+    def __init__(self, observer, session_id):
+        self._observer = observer
+        self.session_id = session_id
+        self.fds = None
+        self.closed = False
+        self.paused = False
+        self.replaying = False
+        self.messages = []
+        self._buffered = 0
+
+    def sendMessage(self, message, isBinary):
+        self.messages.append(message)
+        self._buffered += len(message)
+        if self._buffered > MAX_SEND_BUFFER and not self.paused:
+            self._observer.pause_connection(self)
+
+    def flush(self):
+        self._buffered = 0
+        self._observer.resume_connection(self)
+
+    def close(self, sess_man):
+        self.closed = True
+
+@unittest.skipIf(WebSockets is None, "autobahn and twisted are required")
+class WebSocketsTests(unittest.TestCase):
+    def test_replay_exceeding_send_buffer(self):
+        read_fd, write_fd = os.pipe()
+        try:
+            session = _Session([read_fd])
+            observer = WebSockets.WebSocketsService.Observer(_SessionManager(session))
+            for i in range(64):
+                session.event_log.append({"terminal": "x" * 4096})
+
+            conn = _Connection(observer, "1")
+            thread = threading.Thread(target=observer.add_connection, args=(conn, 7), daemon=True)
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive(), "add_connection() deadlocked")
+
+            self.assertFalse(conn.closed)
+            self.assertEqual(conn.messages, session.event_log.replay(7))
+            # the connection is paused, its output is not read until the buffer is flushed
+            self.assertTrue(conn.paused)
+            self.assertNotIn(read_fd, observer._select_set)
+            conn.flush()
+            self.assertIn(read_fd, observer._select_set)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,13 @@ from ArgParserTests import ArgParserTests
 from SocketManagerTests import SocketManagerTests
 from DebuggerTests import DebuggerTests
 from TimerTests import TimerTests
+from EventLogTests import EventLogTests
+from ProgramStructureTests import ProgramStructureTests
+from TraceRecorderTests import TraceRecorderTests
+from BreakpointConditionTests import BreakpointConditionTests
+from LoopWhileParserTests import LoopWhileParserTests
+from EvaluatorTests import EvaluatorTests
+from WebSocketsTests import WebSocketsTests
 
 if __name__ == '__main__':
     unittest.main()